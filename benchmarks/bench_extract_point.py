@@ -0,0 +1,68 @@
+"""
+Microbenchmark for coordinate extraction on large page sources
+
+Run from the repo root: python -m benchmarks.bench_extract_point
+"""
+import logging
+import timeit
+from geo_point import find_point, find_points
+
+PLACE = (
+    "https://www.google.com/maps/place/Boba+ChaCha+-+Cafe+Pasadena/"
+    "@34.1462975,-118.1509386,17z/data=!4m15!1m8!3m7!1s0x80c2c30ae6ef6ccd:"
+    "0x41844db7e8510569!2sBoba+ChaCha+-+Cafe+Pasadena!8m2!3d34.1462975"
+    "!4d-118.1487499!10e1!16s%2Fg%2F11rv2sqk_2"
+)
+
+
+def legacy_extract_point(page_source):
+    """extract_point as it was implemented in GMS/TMS before geo_point"""
+    idx = page_source.find("https://www.google.com/maps/place/")
+    test = page_source[idx:]
+    lat = test.split("!3d")
+    lat = lat[1].split("!4d")
+    long = lat[1].split("!16")[0]
+    if len(long) > 20:
+        long = lat[1].split("\\u00")[0]
+    lat = lat[0]
+    try:
+        lat = float(lat)
+        long = float(long)
+    except Exception:
+        long = long[:12]
+        long = long.replace("!", "")
+        long = long.replace(r"\\", "")
+    return (lat, long)
+
+
+def make_page(size_mb=4):
+    """Synthetic page source with the place url in the middle and !3d noise after it"""
+    filler = "<div class='x'>" + "a" * 200 + "</div>"
+    half = filler * int(size_mb * 1024 * 1024 / len(filler) / 2)
+    noise = "!3d1.0!4d2.0" * 2000
+    return half + PLACE + half + noise
+
+
+def main(number=20):
+    logging.disable(logging.WARNING)
+    page = make_page()
+    # the legacy version returns long as a trimmed string when "!10e1" follows it
+    assert find_point(page) == tuple(map(float, legacy_extract_point(page)))
+    print(f"page size: {len(page) / 1024 / 1024:.1f} MB")
+    results = {}
+    for name, func in (
+        ("legacy_extract_point", legacy_extract_point),
+        ("find_point", find_point),
+    ):
+        seconds = min(timeit.repeat(lambda: func(page), number=number, repeat=3))
+        results[name] = seconds / number
+        print(f"{name:>22}: {results[name] * 1000:8.3f} ms/page")
+    print(f"speedup: {results['legacy_extract_point'] / results['find_point']:.1f}x")
+
+    urls = [PLACE] * 10000
+    seconds = min(timeit.repeat(lambda: find_points(urls), number=1, repeat=3))
+    print(f"{'find_points (urls)':>22}: {len(urls) / seconds:,.0f} urls/s")
+
+
+if __name__ == "__main__":
+    main()
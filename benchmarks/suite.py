@@ -0,0 +1,191 @@
+"""
+Benchmark suite for the CPU-side parsing and url generation hot paths
+
+Run from the repo root:
+    python -m benchmarks.suite              compare against benchmarks/baseline.json
+    python -m benchmarks.suite --update     record a new baseline on this machine
+
+Page inputs are the recorded place in tests/fixtures/replay. Speed is compared
+as a ratio to a fixed calibration op timed in the same run, so a baseline from
+one machine holds on another of similar Python and library versions. After
+upgrading either, run --update locally before comparing.
+"""
+import argparse
+import json
+import logging
+import sqlite3
+import sys
+import tempfile
+import timeit
+import tracemalloc
+from pathlib import Path
+import pandas as pd
+from lxml import html
+from busy_times import busy_array, encode_busy, mean_busy, parse_busy_labels
+from geo_point import find_point
+from gms import GMS
+from place_parser import parse_open_hours, parse_place
+from replay_driver import Recording, ReplayDriver
+from search_planner import place_search_urls, zip_search_urls
+from zip_lookup import find_zipcodes
+
+FIXTURES = Path(__file__).parent / "fixtures"
+BASELINE = Path(__file__).parent / "baseline.json"
+REPLAY = Path(__file__).parents[1] / "tests" / "fixtures" / "replay"
+CITIES = 30000
+CALIBRATION = "calibration"
+# plain Python parsing work, the same on every run
+CALIBRATION_TEXT = json.dumps(
+    [
+        {"city": f"City {i}", "zip": f"{i:05d}", "busy": list(range(24))}
+        for i in range(200)
+    ]
+)
+
+
+def scaled_places(path, columns, size=CITIES):
+    """(city, region) pairs from a fixture csv, repeated with numbered cities to size"""
+    places = pd.read_csv(path)[columns].values.tolist()
+    return [
+        (f"{city} {i // len(places)}" if i >= len(places) else city, region)
+        for i, (city, region) in enumerate(places * (size // len(places) + 1))
+    ][:size]
+
+
+def zip_db(directory):
+    """simple_zipcode table built from the zip code fixture"""
+    path = Path(directory) / "simple_db.sqlite"
+    con = sqlite3.connect(path)
+    pd.read_csv(FIXTURES / "zipcodes.csv", dtype={"zipcode": str}).to_sql(
+        "simple_zipcode", con, index=False
+    )
+    con.close()
+    return str(path)
+
+
+def recorded_inputs(recording, url):
+    """(page source, busy labels, open hours label) of a recorded place"""
+    entry = recording.pages[url]
+    tree = html.fromstring(entry["page"])
+    bars = tree.xpath('//div[@aria-label="Popular times"]//div[@role="img"]')
+    hours = html.fromstring(entry["panes"]["hours"]).xpath(
+        '//div[contains(@aria-label, "Hide open hours")]/@aria-label'
+    )
+    return entry["page"], [bar.get("aria-label") for bar in bars], hours[0]
+
+
+def cases(directory):
+    """Benchmark name -> zero argument callable, fixtures loaded once"""
+    recording = Recording.load(REPLAY)
+    place_url = next(iter(recording.pages))
+    page, labels, hours = recorded_inputs(recording, place_url)
+    us = scaled_places(FIXTURES / "uscities.csv", ["city", "state_name"])
+    world = scaled_places(FIXTURES / "worldcities.csv", ["city", "country"])
+    encoded = [encode_busy(busy_array(labels))] * 10000
+    categories = ["cafe", "bar", "restaurant", "bakery"] * 2500
+    db = zip_db(directory)
+    replay = ReplayDriver(recording)
+    replay.get(place_url)
+    gms = GMS("women owned business")
+    # find_zipcodes is lru_cached, the unwrapped query is what a cold lookup costs
+    lookup = find_zipcodes.__wrapped__
+    return {
+        CALIBRATION: lambda: json.loads(CALIBRATION_TEXT),
+        "find_point": lambda: find_point(page),
+        "parse_place": lambda: parse_place(page),
+        "replay_snapshot_place": lambda: gms.snapshot_place(replay),
+        "parse_busy_labels": lambda: parse_busy_labels(labels),
+        "busy_array": lambda: encode_busy(busy_array(labels)),
+        "mean_busy_10k": lambda: mean_busy(encoded, by=categories),
+        "parse_open_hours": lambda: parse_open_hours(hours),
+        "us_search_urls_30k": lambda: place_search_urls(us, "restaurants"),
+        "world_search_urls_30k": lambda: place_search_urls(world, "restaurants"),
+        "find_zipcodes": lambda: lookup(db, "Pasadena", "CA"),
+        "create_zip_list": lambda: zip_search_urls(
+            lookup(db, "Pasadena", "CA", "prefix"), "women_owned_business"
+        ),
+    }
+
+
+def measure(func, repeat=5):
+    """Best-of-repeat ops/sec and peak bytes allocated by one call"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+    tracemalloc.start()
+    try:
+        func()
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"ops_per_sec": 1 / best, "peak_bytes": max(0, peak - before)}
+
+
+def relative(results):
+    """Add each result's speed as a multiple of the calibration op's"""
+    calibration = results[CALIBRATION]["ops_per_sec"]
+    for result in results.values():
+        result["relative"] = result["ops_per_sec"] / calibration
+    return results
+
+
+def regressions(results, baseline, tolerance):
+    """Messages for every result slower or hungrier than the baseline allows"""
+    failures = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None or name == CALIBRATION:
+            continue
+        if result["relative"] < base["relative"] * (1 - tolerance):
+            failures.append(
+                f"{name}: {result['relative']:,.4f}x calibration, "
+                f"baseline {base['relative']:,.4f}x"
+            )
+        # 4KB of slack so tiny allocations do not flap
+        if result["peak_bytes"] > base["peak_bytes"] * (1 + tolerance) + 4096:
+            failures.append(
+                f"{name}: {result['peak_bytes'] / 1024:,.1f} KB peak, "
+                f"baseline {base['peak_bytes'] / 1024:,.1f} KB"
+            )
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--update", action="store_true", help="write the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    parser.add_argument("--only", nargs="*", help="benchmark names to run")
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING)
+
+    baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, func in cases(directory).items():
+            if args.only and name not in args.only and name != CALIBRATION:
+                continue
+            results[name] = measure(func)
+    for name, result in relative(results).items():
+        base = baseline.get(name, {}).get("relative")
+        change = f"{result['relative'] / base - 1:+7.1%}" if base else ""
+        print(
+            f"{name:>22}: {result['ops_per_sec']:12,.1f} ops/s "
+            f"{result['relative']:10,.4f}x "
+            f"{result['peak_bytes'] / 1024:10,.1f} KB peak {change}"
+        )
+
+    if args.update:
+        BASELINE.write_text(json.dumps({**baseline, **results}, indent=2) + "\n")
+        print(f"baseline written to {BASELINE}")
+        return 0
+    failures = regressions(results, baseline, args.tolerance)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
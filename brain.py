@@ -1,9 +1,13 @@
 import logging
-from multiprocessing import Pool, Manager, cpu_count
-import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Pool, cpu_count
 import time
 import pandas as pd
 from tms import TMS
+from pipeline import Pipeline
+from scheduler import Scheduler
+from search_planner import place_search_urls
+from concurrency import ConcurrencyController
 import random
 
 
@@ -25,22 +29,21 @@ class Brain(TMS):
         cities_df = pd.read_csv(
             "https://raw.githubusercontent.com/joseph-davis-trufl/files/main/uscities.csv"
         )
-        searches = []
-        for city, state in cities_df[["city", "state_name"]].values:
-            city = city.replace(" ", "+")
-            state = state.replace(" ", "+")
-            search = f"https://www.google.com/maps/search/{city}+{state}+{search_term}"
-            search = search.replace(" ", "+")
-            searches.append(search)
-        search_list = np.unique(searches)
+        search_list = place_search_urls(
+            cities_df[["city", "state_name"]].values, search_term
+        )
         random.shuffle(search_list)
         return search_list
 
-    def add_tasks(self, search, task_queue):
+    def collect_tasks(self, search):
+        """(search, link) detail tasks for links no earlier search has queued"""
         links = self.get_web_results(search)
+        return [(search, link) for link in self.seen_links().filter_new(search, links)]
+
+    def add_tasks(self, search, task_queue):
         try:
-            for i in links:
-                task_queue.put((i, search))
+            for search, link in self.collect_tasks(search):
+                task_queue.put((link, search))
         except Exception as excep:
             logging.warning("Failed to add to queue %s", excep)
         # return task_queue
@@ -48,7 +51,7 @@ class Brain(TMS):
     def process_tasks(self, func, task_queue, search_list=None):
         if func == self.add_tasks:
             print("add tasks")
-            with Pool(5) as p:
+            with Pool(self.num_bots) as p:
                 for i in search_list:
                     print(i)
                     p.apply_async(
@@ -62,7 +65,7 @@ class Brain(TMS):
                 p.join()
         elif func == self.add_table_data:
             print("process locations")
-            with Pool(5) as p:
+            with Pool(self.num_bots) as p:
                 while not task_queue.empty():
                     new_search = task_queue.get()
                     link = new_search[0]
@@ -77,19 +80,68 @@ class Brain(TMS):
                 p.close()
                 p.join()
 
-    def main(self, task_queue):
-        while True:
-            search
-            if len(search) == 0:
-                break
-            if task_queue.empty():
-                self.process_tasks(self.add_tasks, task_queue, search_list=search)
-            if not task_queue.empty():
-                self.process_tasks(self.add_table_data, task_queue)
+    def process_pipelined(
+        self, search_list, link_bots=2, detail_bots=5, queue_size=100
+    ):
+        """Stream links from link_bots searches straight into detail_bots scrapers"""
+        pipeline = Pipeline(
+            self.collect_tasks,
+            self.add_table_data,
+            producers=link_bots,
+            consumers=detail_bots,
+            maxsize=queue_size,
+            initializer=self.warm_drivers,
+            producer_initargs=(True,),
+            consumer_initargs=(True,),
+        )
+        return pipeline.run(search_list)
+
+    def schedule(
+        self, search_list, rate=0.5, burst=2, max_in_flight=None, controller=None
+    ):
+        """Run searches and their places through the rate limited Scheduler.
+
+        With a ConcurrencyController the pool is sized to its max_workers and
+        the controller decides how many of them are busy. Workers then start
+        their browsers on first use and quit them after driver_idle_timeout
+        seconds without a task, so workers held back by the controller do not
+        keep a browser's memory.
+        """
+        initializer, initargs = self.warm_drivers, (True,)
+        if controller is not None:
+            self.num_bots = controller.max_workers
+            initializer, initargs = None, ()
+            if self.driver_idle_timeout is None:
+                self.driver_idle_timeout = 120.0
+        make_executor = lambda: ProcessPoolExecutor(
+            self.num_bots, initializer=initializer, initargs=initargs
+        )
+        with make_executor() as executor:
+            scheduler = Scheduler(
+                executor,
+                self.collect_tasks,
+                self.add_table_data,
+                rate=rate,
+                burst=burst,
+                max_in_flight=max_in_flight or 2 * self.num_bots,
+                controller=controller,
+                executor_factory=make_executor,
+            )
+            scheduler.add_searches(search_list)
+            return scheduler.run()
+
+    def main(self, search_list=None):
+        if search_list is None:
+            search_list = self.us_loop_searches(self.search_term)
+        # loaded and checked against the table once, workers inherit it
+        self.known_links()
+        self.reset_seen_links()
+        self.schedule(
+            search_list,
+            controller=ConcurrencyController(max_workers=self.num_bots, start=5),
+        )
 
 
 if __name__ == "__main__":
     t = Brain()
-    manager = Manager()
-    loc_queue = manager.Queue()
-    t.main(loc_queue)
+    t.main()
@@ -0,0 +1,151 @@
+"""
+Buffered batch writes shared by the SQL and Parquet result sinks
+"""
+import logging
+import os
+import threading
+import time
+from multiprocessing.util import Finalize
+from pathlib import Path
+import pandas as pd
+from db_writer import append_dead_letters
+
+_sinks = {}
+
+
+class BufferedSink:
+    """Collects rows and writes them in batches through write(df).
+
+    A daemon thread flushes rows older than flush_interval even when no new rows
+    arrive. After max_attempts failed flushes in a row the buffered rows go to a
+    dead letter jsonl file instead of being retried forever.
+    """
+
+    def __init__(
+        self,
+        name,
+        columns=None,
+        max_buffer=200,
+        flush_interval=30.0,
+        transform=None,
+        max_attempts=3,
+        dead_letter_path=None,
+        on_flush=None,
+    ):
+        """transform(df) -> df runs once per batch just before the write and
+        on_flush(df) once the batch is written"""
+        self.name = name
+        self.transform = transform
+        self.on_flush = on_flush
+        self.columns = columns
+        self.max_buffer = max_buffer
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.dead_letter_path = (
+            Path.cwd() / "db" / f"{name}.failed.jsonl"
+            if dead_letter_path is None
+            else Path(dead_letter_path)
+        )
+        self.rows = []
+        self.failures = 0
+        self.last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._timer = None
+
+    def add(self, df):
+        """Buffer the rows of a DataFrame, flushing when the buffer or interval is full"""
+        if self.columns is not None:
+            df = df.reindex(columns=self.columns)
+        with self._lock:
+            self.rows.extend(df.to_dict("records"))
+            due = (
+                len(self.rows) >= self.max_buffer
+                or time.monotonic() - self.last_flush >= self.flush_interval
+            )
+            if self._timer is None:
+                # started on first use so it runs in the worker that owns the rows
+                self._timer = threading.Thread(target=self._flush_loop, daemon=True)
+                self._timer.start()
+        if due:
+            self.flush()
+
+    def _flush_loop(self):
+        """Flush rows left waiting longer than flush_interval by an idle worker"""
+        while not self._stopped.wait(self.flush_interval / 2):
+            if self.rows and time.monotonic() - self.last_flush >= self.flush_interval:
+                try:
+                    self.flush()
+                except Exception as exc:
+                    logging.warning("Timed flush to %s failed: %s", self.name, exc)
+
+    def write(self, df):
+        """Write one batch, raising on failure"""
+        raise NotImplementedError
+
+    def flush(self):
+        """Write every buffered row as one batch"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self.rows = self.rows, []
+                self.last_flush = time.monotonic()
+            if not rows:
+                return 0
+            df = pd.DataFrame(rows, columns=self.columns)
+            if self.transform is not None:
+                try:
+                    df = self.transform(df)
+                except Exception as exc:
+                    logging.warning(
+                        "Batch transform failed, writing rows as is: %s", exc
+                    )
+            try:
+                self.write(df)
+                logging.warning("Wrote %s rows to %s", len(df), self.name)
+            except Exception as exc:
+                self.failures += 1
+                if self.failures >= self.max_attempts:
+                    logging.warning(
+                        "Write to %s failed %s times, giving up on %s rows: %s",
+                        self.name,
+                        self.failures,
+                        len(rows),
+                        exc,
+                    )
+                    append_dead_letters(self.dead_letter_path, {self.name: rows})
+                    self.failures = 0
+                    return 0
+                logging.warning(
+                    "Write to %s failed, keeping %s rows: %s", self.name, len(rows), exc
+                )
+                with self._lock:
+                    self.rows[:0] = rows
+                raise
+            self.failures = 0
+            if self.on_flush is not None:
+                try:
+                    self.on_flush(df)
+                except Exception as exc:
+                    logging.warning("After flush to %s failed: %s", self.name, exc)
+            return len(df)
+
+    def close(self):
+        """Flush what is left, logging instead of raising during shutdown"""
+        self._stopped.set()
+        try:
+            self.flush()
+        except Exception as exc:
+            logging.warning("Final flush to %s failed: %s", self.name, exc)
+
+
+def owned_sink(key, factory):
+    """Sink made by factory once per process and key, flushed by a finalizer when
+    the worker exits"""
+    key = (os.getpid(), *key)
+    sink = _sinks.get(key)
+    if sink is None:
+        sink = factory()
+        Finalize(sink, sink.close, exitpriority=20)
+        _sinks[key] = sink
+    return sink
@@ -0,0 +1,155 @@
+"""
+Parsing of Google Maps popular times labels and their compact 7x24 form
+"""
+import base64
+import binascii
+import re
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+from enrichment import CURRENT_HOUR, DAYS
+
+# Busy percent 0-100 per weekday (Sunday first) and hour, UNKNOWN where the
+# place is closed or Google shows no bar. Stored as 224 base64 characters.
+UNKNOWN = 255
+SHAPE = (7, 24)
+UNKNOWN_BYTES = bytes([UNKNOWN]) * (SHAPE[0] * SHAPE[1])
+UNKNOWN_BUSY = base64.b64encode(UNKNOWN_BYTES).decode("ascii")
+HOUR_PATTERN = re.compile(r"(\d{1,2})(AM|PM)")
+PERCENT_PATTERN = re.compile(r"(\d{1,3})%")
+
+
+def parse_busy_labels(labels, hour=CURRENT_HOUR):
+    """{day: [{hour: busy}, ...]} from the aria-labels of a place's busy bars.
+
+    Labels run Sunday to Saturday, each day starting at its 6AM bar or a
+    "closed" bar. The live "Currently x% busy" bar is keyed by hour, the
+    placeholder enrich_places fills with the place's local hour.
+    """
+    hours = []
+    tod = []
+    for x in labels:
+        idx = x.find("at")
+        if idx == -1:
+            idx2 = x.find("usually")
+            x = x.replace("usually", "")
+            t1 = x[idx2:]
+            t2 = x[:idx2]
+            t2 = t2.replace("Currently ", "")
+            final = t2 + t1
+            final = final.replace(" busy", "")
+            final = final.replace(", ", ":")
+            final = final.replace(".", "")
+            final = final.replace(" ", "")
+            hour = hour.replace(".", "")
+            hours.append(hour)
+            tod.append(final)
+        else:
+            busy = x[:idx]
+            busy = busy.replace("busy", "")
+            busy = busy.strip()
+            if busy == "%":
+                busy = None
+            t = x[idx:]
+            t = t.replace("at", "")
+            t = t.replace(" ", "")
+            t = t.replace(".", "")
+            if t == "":
+                t = "closed"
+            hours.append(t)
+            tod.append(busy)
+    indexes = []
+    for idx, x in enumerate(hours):
+        if x == "closed":
+            indexes.append(idx)
+        i = x.find("6AM")
+        if i != -1:
+            indexes.append(idx)
+    data = defaultdict(list)
+    for num, day in enumerate(DAYS):
+        # the last day runs to the end of the labels
+        if indexes[num] == indexes[-1]:
+            h = hours[indexes[num] :]
+            busy_times = tod[indexes[num] :]
+        else:
+            h = hours[indexes[num] : indexes[num + 1]]
+            busy_times = tod[indexes[num] : indexes[num + 1]]
+        for i, x in enumerate(h):
+            data[day].append({h[i]: busy_times[i]})
+    return dict(data)
+
+
+def label_hour(hour):
+    """0-23 from an hour key such as 6AM or 12PM, None if it is not one"""
+    match = HOUR_PATTERN.fullmatch(hour)
+    if match is None:
+        return None
+    return int(match.group(1)) % 12 + (12 if match.group(2) == "PM" else 0)
+
+
+def busy_array(labels):
+    """7x24 uint8 busy percents from the aria-labels of a place's busy bars.
+
+    The live bar ("Currently x% busy, usually y% busy") has no hour in its
+    label; it takes the hour after the bar before it and stores the usual y, so
+    the array describes a typical week.
+    """
+    array = np.full(SHAPE, UNKNOWN, dtype=np.uint8)
+    for day, bars in parse_busy_labels(labels).items():
+        previous = None
+        for bar in bars:
+            ((hour, busy),) = bar.items()
+            hour = label_hour(hour)
+            if hour is None and previous is not None:
+                hour = (previous + 1) % 24
+            previous = hour
+            percents = PERCENT_PATTERN.findall(busy or "")
+            if hour is not None and percents:
+                array[DAYS.index(day), hour] = min(100, int(percents[-1]))
+    return array
+
+
+def encode_busy(array):
+    """Fixed-width base64 text of a 7x24 busy array"""
+    return base64.b64encode(np.asarray(array, dtype=np.uint8).tobytes()).decode("ascii")
+
+
+def _busy_bytes(value):
+    """Raw 168 bytes of an encoded array, all UNKNOWN for missing or bad values"""
+    try:
+        raw = base64.b64decode(value, validate=True)
+    except (binascii.Error, TypeError, ValueError):
+        return UNKNOWN_BYTES
+    return raw if len(raw) == len(UNKNOWN_BYTES) else UNKNOWN_BYTES
+
+
+def decode_busy(value):
+    """7x24 uint8 array from encode_busy text"""
+    return np.frombuffer(_busy_bytes(value), dtype=np.uint8).reshape(SHAPE)
+
+
+def busy_matrix(values):
+    """(places, 7, 24) uint8 array from a column of encoded busy arrays"""
+    raw = b"".join(_busy_bytes(value) for value in values)
+    return np.frombuffer(raw, dtype=np.uint8).reshape((-1,) + SHAPE)
+
+
+def busy_frame(values, index=None):
+    """One row per place, a (day, hour) column per bar, NaN where UNKNOWN"""
+    matrix = busy_matrix(values).reshape(-1, SHAPE[0] * SHAPE[1]).astype(float)
+    matrix[matrix == UNKNOWN] = np.nan
+    columns = pd.MultiIndex.from_product([DAYS, range(24)], names=["day", "hour"])
+    return pd.DataFrame(matrix, index=index, columns=columns)
+
+
+def mean_busy(values, by=None):
+    """Average busy percent by day and hour, ignoring unknown bars.
+
+    Without by the result is a days x hours frame over every place; with by
+    (e.g. a category column) it is one row per group and a (day, hour) column
+    per bar.
+    """
+    frame = busy_frame(values)
+    if by is None:
+        return frame.mean().unstack("hour").reindex(DAYS)
+    return frame.groupby(np.asarray(by)).mean()
@@ -0,0 +1,131 @@
+"""
+Adaptive worker concurrency from page latency, failures, memory and CPU
+"""
+import logging
+import math
+import time
+from collections import deque
+import psutil
+
+
+def system_load():
+    """(available memory fraction, CPU percent) of this machine"""
+    memory = psutil.virtual_memory()
+    return memory.available / memory.total, psutil.cpu_percent(interval=None)
+
+
+class ConcurrencyController:
+    """AIMD limit on active browser workers.
+
+    Each adjust looks at the last window pages. Slow pages, failures, low free
+    memory or a busy CPU cut the limit by decrease (multiplicative); otherwise a
+    full window of healthy pages adds increase (additive). Decisions are at
+    least cooldown seconds apart so a change is measured before the next one.
+    """
+
+    def __init__(
+        self,
+        min_workers=1,
+        max_workers=16,
+        start=None,
+        target_latency=60.0,
+        max_failure_rate=0.2,
+        min_free_memory=0.15,
+        max_cpu=90.0,
+        window=20,
+        increase=1,
+        decrease=0.5,
+        cooldown=30.0,
+        clock=time.monotonic,
+        probe=system_load,
+    ):
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.limit = min(max_workers, max(min_workers, start or min_workers))
+        self.target_latency = target_latency
+        self.max_failure_rate = max_failure_rate
+        self.min_free_memory = min_free_memory
+        self.max_cpu = max_cpu
+        self.window = window
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.clock = clock
+        self.probe = probe
+        self.samples = deque(maxlen=window)
+        self.last_change = clock()
+
+    def record(self, latency, ok=True):
+        """Add one page's latency in seconds and whether it succeeded"""
+        self.samples.append((latency, ok))
+
+    def sample(self):
+        """Median latency, failure rate, free memory fraction and CPU percent now"""
+        latencies = sorted(latency for latency, _ in self.samples)
+        free_memory, cpu = self.probe()
+        return {
+            "pages": len(self.samples),
+            "median_latency": latencies[len(latencies) // 2] if latencies else None,
+            "failure_rate": (
+                sum(not ok for _, ok in self.samples) / len(self.samples)
+                if self.samples
+                else None
+            ),
+            "free_memory": free_memory,
+            "cpu": cpu,
+        }
+
+    def pressure(self, sample=None):
+        """Reasons to back off, empty when the workers are healthy"""
+        sample = sample or self.sample()
+        reasons = []
+        if sample["pages"]:
+            if sample["median_latency"] > self.target_latency:
+                reasons.append(f"median latency {sample['median_latency']:.1f}s")
+            if sample["failure_rate"] > self.max_failure_rate:
+                reasons.append(f"failure rate {sample['failure_rate']:.0%}")
+        if sample["free_memory"] < self.min_free_memory:
+            reasons.append(f"free memory {sample['free_memory']:.0%}")
+        if sample["cpu"] > self.max_cpu:
+            reasons.append(f"cpu {sample['cpu']:.0f}%")
+        return reasons
+
+    def adjust(self):
+        """Update and return the worker limit, logging the sample and decision.
+
+        Changes are logged as warnings, every other decision at debug level.
+        """
+        if self.clock() - self.last_change < self.cooldown:
+            logging.debug("Concurrency %s kept (cooldown)", self.limit)
+            return self.limit
+        sample = self.sample()
+        reasons = self.pressure(sample)
+        if reasons:
+            limit = max(self.min_workers, math.floor(self.limit * self.decrease))
+            decision = "decrease"
+        elif len(self.samples) >= self.window:
+            limit = min(self.max_workers, self.limit + self.increase)
+            decision = "increase"
+        else:
+            logging.debug(
+                "Concurrency %s kept (%s of %s pages sampled) %s",
+                self.limit,
+                len(self.samples),
+                self.window,
+                sample,
+            )
+            return self.limit
+        log = logging.warning if limit != self.limit else logging.debug
+        log(
+            "Concurrency %s -> %s %s (%s) %s",
+            self.limit,
+            limit,
+            decision,
+            ", ".join(reasons) or "healthy",
+            sample,
+        )
+        if limit != self.limit:
+            self.limit = limit
+            self.samples.clear()
+        self.last_change = self.clock()
+        return self.limit
@@ -0,0 +1,132 @@
+"""
+Per-link crawl state for resumable Finder runs
+"""
+import time
+from db_writer import connect_sqlite
+
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+FAILED = "failed"
+INTERRUPTED = "interrupted before finishing"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS link_state (
+    link TEXT PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL,
+    updated_at REAL
+)
+"""
+COLUMNS_SQL = "PRAGMA table_info(link_state)"
+# state tables created before attempts were counted
+ATTEMPTS_COLUMN = "ALTER TABLE link_state ADD attempts INTEGER NOT NULL DEFAULT 0"
+STATUS_INDEX = "CREATE INDEX IF NOT EXISTS link_state_status ON link_state (status)"
+LINKS_INDEX = "CREATE INDEX IF NOT EXISTS links_link ON links (link)"
+
+ADD_SQL = (
+    "INSERT OR IGNORE INTO link_state (link, status, created_at, updated_at) "
+    "VALUES (?, 'pending', ?, ?)"
+)
+MARK_SQL = (
+    "UPDATE link_state SET status = ?, last_error = ?, updated_at = ? WHERE link = ?"
+)
+
+
+def add_links(links):
+    """Statement registering newly collected links as pending"""
+    now = time.time()
+    return ADD_SQL, [(link, now, now) for link in links]
+
+
+def mark_link(link, status, error=None):
+    """Statement recording the outcome of a link, error is kept for failed links"""
+    if error is not None:
+        error = str(error)[:1000]
+    return MARK_SQL, [(status, error, time.time(), link)]
+
+
+class CrawlState:
+    """Tracks pending, in progress, done and failed links next to the links table"""
+
+    def __init__(self, db_path, max_attempts=3):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+
+    def sync(self):
+        """Create the state table, index links, and pick up links without a state row.
+
+        Links left in progress by a crash or restart are returned to pending,
+        or marked failed once they have been claimed max_attempts times.
+        """
+        con = connect_sqlite(self.db_path)
+        try:
+            with con:
+                con.execute(SCHEMA)
+                columns = [row[1] for row in con.execute(COLUMNS_SQL)]
+                if "attempts" not in columns:
+                    con.execute(ATTEMPTS_COLUMN)
+                con.execute(STATUS_INDEX)
+                has_links = con.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'links'"
+                ).fetchone()
+                if has_links:
+                    con.execute(LINKS_INDEX)
+                    now = time.time()
+                    con.execute(
+                        "INSERT OR IGNORE INTO link_state "
+                        "(link, status, created_at, updated_at) "
+                        "SELECT DISTINCT link, 'pending', ?, ? FROM links "
+                        "WHERE link IS NOT NULL",
+                        (now, now),
+                    )
+                # each claim counted an attempt, so a link that keeps taking its
+                # worker down stops being retried after max_attempts
+                now = time.time()
+                con.execute(
+                    "UPDATE link_state SET status = ?, last_error = ?, updated_at = ? "
+                    "WHERE status = ? AND attempts >= ?",
+                    (FAILED, INTERRUPTED, now, IN_PROGRESS, self.max_attempts),
+                )
+                con.execute(
+                    "UPDATE link_state SET status = ?, updated_at = ? WHERE status = ?",
+                    (PENDING, now, IN_PROGRESS),
+                )
+        finally:
+            con.close()
+        return self
+
+    def claim(self, limit=None):
+        """Mark unfinished links in progress, counting an attempt, and return them"""
+        con = connect_sqlite(self.db_path)
+        try:
+            with con:
+                sql = (
+                    "SELECT link FROM link_state WHERE status = ? "
+                    "OR (status = ? AND attempts < ?) ORDER BY created_at"
+                )
+                params = [PENDING, FAILED, self.max_attempts]
+                if limit is not None:
+                    sql += " LIMIT ?"
+                    params.append(limit)
+                links = [row[0] for row in con.execute(sql, params)]
+                con.executemany(
+                    "UPDATE link_state SET status = ?, attempts = attempts + 1, "
+                    "updated_at = ? WHERE link = ?",
+                    [(IN_PROGRESS, time.time(), link) for link in links],
+                )
+        finally:
+            con.close()
+        return links
+
+    def counts(self):
+        """Number of links in each status"""
+        con = connect_sqlite(self.db_path)
+        try:
+            return dict(
+                con.execute("SELECT status, COUNT(*) FROM link_state GROUP BY status")
+            )
+        finally:
+            con.close()
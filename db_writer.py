@@ -0,0 +1,187 @@
+"""
+Batched SQLite writer process for Finder results
+"""
+import json
+import logging
+import queue
+import sqlite3
+import time
+from multiprocessing import Manager, Process
+from pathlib import Path
+
+SQLITE_TYPES = (str, int, float, bytes, type(None))
+
+
+def connect_sqlite(db_path, timeout=30):
+    """Open a connection in WAL mode so readers do not block the writer"""
+    con = sqlite3.connect(db_path, timeout=timeout)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    return con
+
+
+def quote(name):
+    """Quote a table or column name for SQLite"""
+    return '"{}"'.format(str(name).replace('"', '""'))
+
+
+def ensure_table(con, table, columns, known):
+    """Create the table or add any columns it is missing, caching the column set"""
+    if table not in known:
+        known[table] = {
+            row[1] for row in con.execute(f"PRAGMA table_info({quote(table)})")
+        }
+    existing = known[table]
+    if not existing:
+        cols = ", ".join(f"{quote(c)} TEXT" for c in columns)
+        con.execute(f"CREATE TABLE IF NOT EXISTS {quote(table)} ({cols})")
+        existing.update(columns)
+        return
+    for column in columns:
+        if column not in existing:
+            con.execute(f"ALTER TABLE {quote(table)} ADD COLUMN {quote(column)} TEXT")
+            existing.add(column)
+
+
+def write_rows(con, rows_by_table, known, statements=()):
+    """Insert every buffered row in a single transaction with one executemany per shape.
+
+    statements are (sql, params_list) pairs such as crawl state updates, committed
+    in the same transaction as the rows they describe.
+    """
+    with con:
+        for table, rows in rows_by_table.items():
+            shapes = {}
+            for row in rows:
+                shapes.setdefault(tuple(row), []).append(row)
+            for columns, shaped in shapes.items():
+                ensure_table(con, table, columns, known)
+                sql = "INSERT INTO {} ({}) VALUES ({})".format(
+                    quote(table),
+                    ", ".join(quote(c) for c in columns),
+                    ", ".join("?" * len(columns)),
+                )
+                con.executemany(
+                    sql,
+                    [
+                        [
+                            v if isinstance(v, SQLITE_TYPES) else str(v)
+                            for v in r.values()
+                        ]
+                        for r in shaped
+                    ],
+                )
+        for sql, params in statements:
+            con.executemany(sql, params)
+
+
+def dead_letter(db_path, rows_by_table, statements=()):
+    """Append rows that could not be committed to a jsonl file next to the database"""
+    append_dead_letters(
+        Path(db_path).with_suffix(".failed.jsonl"), rows_by_table, statements
+    )
+
+
+def append_dead_letters(path, rows_by_table, statements=()):
+    """Append rows and statements that could not be committed to a jsonl file"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for table, rows in rows_by_table.items():
+            for row in rows:
+                f.write(json.dumps({"table": table, "row": row}, default=str) + "\n")
+        for sql, params in statements:
+            f.write(json.dumps({"sql": sql, "params": params}, default=str) + "\n")
+    logging.warning(
+        "Saved %s unwritten rows to %s", sum(map(len, rows_by_table.values())), path
+    )
+
+
+def writer_loop(db_path, write_queue, batch_size, flush_interval, retries=3):
+    """Drain (table, rows, statements) messages and commit them in bounded batches"""
+    con = connect_sqlite(db_path)
+    known = {}
+    buffer = {}
+    statements = []
+    buffered = 0
+    deadline = time.monotonic() + flush_interval
+    running = True
+    while running:
+        try:
+            message = write_queue.get(timeout=max(deadline - time.monotonic(), 0.01))
+            if message is None:
+                running = False
+            else:
+                table, rows, sql = message
+                if rows:
+                    buffer.setdefault(table, []).extend(rows)
+                statements.extend(sql)
+                buffered += len(rows) + len(sql)
+        except queue.Empty:
+            pass
+        if buffered and (
+            buffered >= batch_size or time.monotonic() >= deadline or not running
+        ):
+            for attempt in range(retries):
+                try:
+                    write_rows(con, buffer, known, statements)
+                    logging.info("Committed %s rows to %s", buffered, db_path)
+                    break
+                except sqlite3.Error as exc:
+                    logging.warning(
+                        "Batch write failed (attempt %s): %s", attempt + 1, exc
+                    )
+                    known.clear()
+                    time.sleep(0.5 * (attempt + 1))
+            else:
+                dead_letter(db_path, buffer, statements)
+            buffer = {}
+            statements = []
+            buffered = 0
+        if time.monotonic() >= deadline:
+            deadline = time.monotonic() + flush_interval
+    con.close()
+
+
+class SQLiteWriter:
+    """Single writer process that receives records from workers through a queue"""
+
+    def __init__(self, db_path, batch_size=500, flush_interval=2.0):
+        self.db_path = str(db_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.manager = None
+        self.queue = None
+        self.process = None
+
+    def start(self):
+        """Start the writer process, the queue proxy can be pickled into pool workers"""
+        self.manager = Manager()
+        self.queue = self.manager.Queue()
+        self.process = Process(
+            target=writer_loop,
+            args=(self.db_path, self.queue, self.batch_size, self.flush_interval),
+            daemon=True,
+        )
+        self.process.start()
+        return self
+
+    def put(self, table, rows, statements=()):
+        """Queue row dicts for the table plus (sql, params_list) statements"""
+        if rows or statements:
+            self.queue.put((table, rows, list(statements)))
+
+    def close(self):
+        """Flush everything still queued and stop the writer"""
+        if self.process is None:
+            return
+        self.queue.put(None)
+        self.process.join()
+        self.manager.shutdown()
+        self.process = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
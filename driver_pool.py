@@ -0,0 +1,225 @@
+"""
+Reusable WebDriver pool shared by GMS/TMS scraping workers
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing.util import Finalize
+from selenium.common.exceptions import WebDriverException
+
+ACQUIRE_POLL = 0.5
+
+
+class DriverPool:
+    """Pre-warmed Chrome sessions kept per image profile, borrowed and returned by workers"""
+
+    def __init__(
+        self, factory, size=1, profiles=(True, False), max_uses=200, idle_timeout=None
+    ):
+        """factory(images=bool) builds a driver, size is the number of sessions per
+        profile. Sessions left idle for idle_timeout seconds are quit, so a worker
+        that gets no tasks does not hold a browser's memory."""
+        self.factory = factory
+        self.size = size
+        self.max_uses = max_uses
+        self.idle_timeout = idle_timeout
+        self._idle_since = {}
+        self._reaper = None
+        self.profiles = tuple(profiles)
+        self._idle = {images: queue.LifoQueue() for images in self.profiles}
+        self._created = {images: 0 for images in self.profiles}
+        self._uses = {}
+        self._all = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def warm(self, images=None):
+        """Start sessions up front so the first borrow does not pay for a cold start.
+
+        Best effort: a session that fails to start is logged and left for borrow
+        to launch, so the failure reaches the task instead of a pool initializer,
+        where multiprocessing would respawn the worker forever.
+        """
+        profiles = self.profiles if images is None else (images,)
+        for images in profiles:
+            while self._created[images] < self.size:
+                try:
+                    driver = self._create(images)
+                except Exception as exc:
+                    logging.warning("Driver warm-up failed: %s", exc)
+                    break
+                if driver is None:
+                    break
+                self._idle_since[id(driver)] = time.monotonic()
+                self._idle[images].put(driver)
+        return self
+
+    def _create(self, images):
+        """Launch a new session for the profile if the profile is under its size cap"""
+        with self._lock:
+            if self._closed or self._created[images] >= self.size:
+                return None
+            self._created[images] += 1
+        try:
+            driver = self.factory(images=images)
+        except Exception:
+            with self._lock:
+                self._created[images] -= 1
+            raise
+        with self._lock:
+            self._all.append(driver)
+            self._uses[id(driver)] = 0
+        return driver
+
+    def _discard(self, driver, images):
+        """Quit a session and free its slot in the profile"""
+        with self._lock:
+            if driver in self._all:
+                self._all.remove(driver)
+                self._created[images] -= 1
+            self._uses.pop(id(driver), None)
+            self._idle_since.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as exc:
+            logging.warning("Driver quit failed: %s", exc)
+
+    def _reset(self, driver):
+        """Clear cookies, storage and navigation so the next borrower starts clean"""
+        try:
+            driver.execute_script(
+                "window.localStorage.clear(); window.sessionStorage.clear();"
+            )
+        except WebDriverException as exc:
+            logging.info("Driver storage reset skipped: %s", exc)
+        driver.delete_all_cookies()
+        driver.get("about:blank")
+
+    def acquire(self, images=True, timeout=None):
+        """Take an idle session for the profile, launching one if the pool has room"""
+        if self._closed:
+            raise RuntimeError("Driver pool is closed")
+        if images not in self._idle:
+            raise ValueError(f"Profile images={images} is not part of this pool")
+        # reap() or a failed reset can free a slot while this waits on the queue,
+        # so the wait is polled and the launch retried rather than blocking once
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                return self._idle[images].get_nowait()
+            except queue.Empty:
+                pass
+            driver = self._create(images)
+            if driver is not None:
+                return driver
+            wait = ACQUIRE_POLL
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    raise queue.Empty
+            try:
+                return self._idle[images].get(timeout=wait)
+            except queue.Empty:
+                if self._closed:
+                    raise RuntimeError("Driver pool is closed")
+
+    def reap(self):
+        """Quit sessions idle for longer than idle_timeout, returning how many"""
+        reaped = 0
+        now = time.monotonic()
+        for images, idle in self._idle.items():
+            keep = []
+            while True:
+                try:
+                    driver = idle.get_nowait()
+                except queue.Empty:
+                    break
+                if now - self._idle_since.get(id(driver), now) >= self.idle_timeout:
+                    self._discard(driver, images)
+                    reaped += 1
+                else:
+                    keep.append(driver)
+            # oldest first so the LIFO order of the rest is unchanged
+            for driver in keep[::-1]:
+                idle.put(driver)
+        if reaped:
+            logging.info("Quit %s idle drivers", reaped)
+        return reaped
+
+    def _reap_loop(self):
+        while not self._closed:
+            time.sleep(self.idle_timeout / 2)
+            self.reap()
+
+    def release(self, driver, images=True):
+        """Reset a session and put it back, replacing it if it is worn out or broken"""
+        if self._closed:
+            self._discard(driver, images)
+            return
+        self._uses[id(driver)] = self._uses.get(id(driver), 0) + 1
+        if self._uses[id(driver)] >= self.max_uses:
+            self._discard(driver, images)
+            return
+        try:
+            self._reset(driver)
+        except WebDriverException as exc:
+            logging.warning("Driver reset failed, replacing session: %s", exc)
+            self._discard(driver, images)
+            return
+        self._idle_since[id(driver)] = time.monotonic()
+        self._idle[images].put(driver)
+        if self.idle_timeout and self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap_loop, daemon=True)
+            self._reaper.start()
+
+    @contextmanager
+    def borrow(self, images=True, timeout=None):
+        """Context manager that acquires a session and always returns it to the pool"""
+        driver = self.acquire(images=images, timeout=timeout)
+        try:
+            yield driver
+        finally:
+            self.release(driver, images=images)
+
+    def close(self):
+        """Quit every session owned by the pool"""
+        with self._lock:
+            self._closed = True
+            drivers = list(self._all)
+            self._all.clear()
+            self._uses.clear()
+            for images in self.profiles:
+                self._created[images] = 0
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception as exc:
+                logging.warning("Driver quit failed: %s", exc)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_process_pools = {}
+
+
+def process_pool(factory, size=1, idle_timeout=None):
+    """Return the DriverPool owned by this process, creating it on first use.
+
+    Drivers cannot be pickled into multiprocessing workers, so each worker
+    process keeps its own pool. The pool is closed by a multiprocessing
+    finalizer when the worker exits, which runs even where atexit does not.
+    """
+    pid = os.getpid()
+    pool = _process_pools.get(pid)
+    if pool is None:
+        pool = DriverPool(factory, size=size, idle_timeout=idle_timeout)
+        Finalize(pool, pool.close, exitpriority=10)
+        _process_pools[pid] = pool
+    return pool
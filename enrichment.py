@@ -0,0 +1,134 @@
+"""
+Batch enrichment of scraped places: timezone, week number and busy-time hour alignment
+"""
+import logging
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from timezonefinder import TimezoneFinder
+
+CURRENT_HOUR = "{current_hour}"
+UNKNOWN_HOUR = "unknown"
+DAYS = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+
+
+class TimezoneIndex:
+    """One TimezoneFinder per process with a grid cache of resolved cells"""
+
+    def __init__(self, grid=0.01):
+        """grid is the cell size in degrees, 0.01 is roughly 1km"""
+        self.grid = grid
+        self.finder = TimezoneFinder()
+        self.cells = {}
+
+    def timezones(self, lat, long):
+        """Timezone names for lat/long arrays, None where the point is missing or at sea"""
+        lat = pd.to_numeric(pd.Series(lat), errors="coerce").to_numpy(dtype=float)
+        long = pd.to_numeric(pd.Series(long), errors="coerce").to_numpy(dtype=float)
+        result = np.full(len(lat), None, dtype=object)
+        valid = np.isfinite(lat) & np.isfinite(long)
+        if not valid.any():
+            return result
+        cells = np.round(np.column_stack((lat[valid], long[valid])) / self.grid)
+        unique, inverse = np.unique(cells, axis=0, return_inverse=True)
+        names = np.empty(len(unique), dtype=object)
+        for i, (lat_cell, long_cell) in enumerate(map(tuple, unique)):
+            key = (int(lat_cell), int(long_cell))
+            if key not in self.cells:
+                self.cells[key] = self.finder.timezone_at(
+                    lng=long_cell * self.grid, lat=lat_cell * self.grid
+                )
+            names[i] = self.cells[key]
+        result[valid] = names[np.ravel(inverse)]
+        return result
+
+
+def hour_label(hours):
+    """Google busy-time style labels (3AM, 12PM) for an array of 0-23 hours"""
+    hours = np.asarray(hours)
+    twelve = np.where(hours % 12 == 0, 12, hours % 12)
+    suffix = np.where(hours < 12, "AM", "PM")
+    return np.char.add(twelve.astype(str), suffix.astype(str))
+
+
+def local_times(scraped_dt, timezones):
+    """Local wall clock time of each scrape, converted once per distinct timezone.
+
+    Naive timestamps are taken as this machine's local time, which is how
+    add_table_data records scraped_dt.
+    """
+    scraped = pd.Series(pd.to_datetime(scraped_dt, errors="coerce"))
+    if scraped.dt.tz is None:
+        scraped = scraped.dt.tz_localize(datetime.now().astimezone().tzinfo)
+    zones = pd.Series(timezones, index=scraped.index)
+    local = pd.Series(pd.NaT, index=scraped.index, dtype="datetime64[ns]")
+    for zone, idx in zones.groupby(zones).groups.items():
+        local[idx] = scraped[idx].dt.tz_convert(zone).dt.tz_localize(None)
+    return local
+
+
+_timezone_index = None
+
+
+def timezone_index():
+    """TimezoneIndex shared by every batch in this process"""
+    global _timezone_index
+    if _timezone_index is None:
+        _timezone_index = TimezoneIndex()
+    return _timezone_index
+
+
+def clear_current_hour(df, rows=None):
+    """Replace the current-hour placeholder with UNKNOWN_HOUR in rows (all by
+    default) whose local hour cannot be found, so it is never stored"""
+    for day in DAYS:
+        if day not in df.columns:
+            continue
+        column = df[day] if rows is None else df.loc[rows, day]
+        has_hour = column.map(
+            lambda text: isinstance(text, str) and CURRENT_HOUR in text
+        )
+        if has_hour.any():
+            df[day] = df[day].astype(object)
+            df.loc[has_hour[has_hour].index, day] = [
+                text.replace(CURRENT_HOUR, UNKNOWN_HOUR) for text in column[has_hour]
+            ]
+    return df
+
+
+def enrich_places(df, timestamp_column="scraped_dt"):
+    """Fill week_num and the current busy-time hour for a batch of stored place rows.
+
+    Rows without coordinates or a timezone keep no week number and get
+    UNKNOWN_HOUR in place of the current hour.
+    """
+    if df.empty:
+        return df
+    df = df.copy()
+    if timestamp_column not in df.columns:
+        return clear_current_hour(df)
+    zones = timezone_index().timezones(df["lat"].values, df["long"].values)
+    local = local_times(df[timestamp_column].values, zones)
+    local.index = df.index
+    found = local.notna()
+    if not found.any():
+        return clear_current_hour(df)
+    week = local[found].dt.isocalendar().week.astype(int).astype(str)
+    # the column is all NaN (float) or str before the first week is filled
+    df["week_num"] = df.get("week_num", pd.Series(None, index=df.index)).astype(object)
+    df.loc[found, "week_num"] = week.astype(object)
+    labels = pd.Series(hour_label(local[found].dt.hour.values), index=week.index)
+    for day in DAYS:
+        if day not in df.columns:
+            continue
+        column = df.loc[found, day].astype(str)
+        has_hour = column.str.contains(CURRENT_HOUR, regex=False)
+        if has_hour.any():
+            df[day] = df[day].astype(object)
+            df.loc[has_hour[has_hour].index, day] = [
+                text.replace(CURRENT_HOUR, label)
+                for text, label in zip(column[has_hour], labels[has_hour])
+            ]
+    clear_current_hour(df, ~found)
+    logging.info("Enriched %s of %s rows", int(found.sum()), len(df))
+    return df
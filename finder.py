@@ -1,11 +1,16 @@
 from multiprocessing import Pool, cpu_count
 import pandas as pd
-import numpy as np
-import sqlite3
 from pathlib import Path
 from uszipcode import SearchEngine
 import logging
 from gms import GMS
+from db_writer import SQLiteWriter, connect_sqlite, write_rows
+from zip_lookup import find_zipcodes
+from search_planner import SearchPlanner, zip_search_urls
+from seen_links import seen_links
+from pipeline import Pipeline
+from parquet_sink import process_parquet_sink
+from crawl_state import CrawlState, DONE, FAILED, add_links, mark_link
 
 
 class Finder(GMS):
@@ -18,14 +23,26 @@ class Finder(GMS):
         state,
         num_bots=cpu_count(),
         headless=True,
+        city_match="exact",
+        radius_miles=None,
+        center=None,
+        polygon=None,
+        fetch=False,
+        parquet_path=None,
     ):
         """Create the headless information and initialize states data from csv"""
-        super().__init__(search_term=search_term, headless=headless)
+        super().__init__(search_term=search_term, headless=headless, fetch=fetch)
 
         self.search_term = search_term.replace(" ", "_")
         self.city = city
         self.state = state
         self.num_bots = num_bots
+        self.city_match = city_match
+        self.radius_miles = radius_miles
+        self.center = center
+        self.polygon = polygon
+        self.parquet_path = parquet_path
+        self.write_queue = None
         ### Create SearchEngine Connection and Class Instance
         self.db_file_path = Path.cwd() / "db" / "simple_db.sqlite"
         self.search_file_path = Path.cwd() / "db" / f"{self.search_term}.sqlite"
@@ -33,25 +50,20 @@ class Finder(GMS):
             print("Downloading USZIPCODE DB")
             _ = self.create_search_engine()
         # self.engine = sqlite3.connect(self.search_file_path)
-        self.zdf = pd.read_sql_query(
-            "select  * from simple_zipcode",
-            sqlite3.connect(self.db_file_path),
-        )
         self.zip_list = self.create_zip_list()
 
     def create_zip_list(self):
-        """Create list of zip codes"""
-        df = self.zdf[
-            (self.zdf.post_office_city.str.contains(self.city, na=False))
-            & (self.zdf.state.str.contains(self.state, na=False))
-        ]
-        zlist = df.zipcode.values.tolist()
-        searches = []
-        for z in zlist:
-            search = f"https://www.google.com/maps/search/{z}+{self.search_term.replace('_', '+')}"
-            searches.append(search)
-        search_list = np.unique(searches)
-        return search_list
+        """Create list of zip code searches, by polygon or radius when one is given"""
+        if self.polygon is not None or self.radius_miles is not None:
+            planner = SearchPlanner(self.db_file_path, self.search_term)
+            if self.polygon is not None:
+                return planner.polygon_searches(self.polygon)
+            lat, lng = self.center or planner.city_center(self.city, self.state)
+            return planner.radius_searches(lat, lng, self.radius_miles)
+        zlist = find_zipcodes(
+            str(self.db_file_path), self.city, self.state, match=self.city_match
+        )
+        return zip_search_urls(zlist, self.search_term)
 
     def create_search_engine(self):
         """Create Search Engine Attribute"""
@@ -64,59 +76,118 @@ class Finder(GMS):
         """Bot Error Callback"""
         logging.warning("Error Handler %s", e)
 
+    def write_records(self, table, df, statements=()):
+        """Send rows to the batched writer, or write them directly outside a pool run"""
+        rows = df.to_dict("records") if df is not None else []
+        if self.write_queue is not None:
+            self.write_queue.put((table, rows, list(statements)))
+            return
+        con = connect_sqlite(self.search_file_path)
+        try:
+            write_rows(con, {table: rows} if rows else {}, {}, statements)
+        finally:
+            con.close()
+
+    def seen_links(self):
+        """Links any search has queued, kept apart from the results database so
+        producers never write to it outside the SQLiteWriter"""
+        return seen_links(Path.cwd() / "db" / f"{self.search_term}_seen.sqlite")
+
     def add_tasks(self, search):
+        new_links = self.collect_links(search)
+        print(f"Added {len(new_links)} tasks")
+
+    def collect_links(self, search):
+        """Scrape and store a search's links, returning those not seen before"""
         links = self.scrape_links(search)
         df = pd.DataFrame(columns=["link"], data=links)
-        df.to_sql(
-            "links", if_exists="append", con=sqlite3.connect(self.search_file_path)
-        )
-        print(f"Added {len(df)} tasks")
+        new_links = self.seen_links().filter_new(search, links)
+        self.write_records("links", df, [add_links(new_links)])
+        return new_links
 
     def process_tasks(self):
         search_list = self.create_zip_list()
-        with Pool(processes=cpu_count()) as pool:
-            for i, _ in enumerate(search_list):
-                pool.apply_async(
-                    self.add_tasks,
-                    args={search_list[i]},
-                    error_callback=self.error_handler,
-                )
-            pool.close()
-            pool.join()
+        CrawlState(self.search_file_path).sync()
+        with SQLiteWriter(self.search_file_path) as writer:
+            self.write_queue = writer.queue
+            with Pool(
+                processes=self.num_bots,
+                initializer=self.warm_drivers,
+                initargs=(False,),
+            ) as pool:
+                for i, _ in enumerate(search_list):
+                    pool.apply_async(
+                        self.add_tasks,
+                        args={search_list[i]},
+                        error_callback=self.error_handler,
+                    )
+                pool.close()
+                pool.join()
+        self.write_queue = None
 
     def add_locations(self, link: str) -> None:
-        driver = self.get_driver(images=True)
-        df = self.extract_restaurant_data(driver, link)
         try:
-            df.to_sql(
-                self.search_term,
-                sqlite3.connect(self.search_file_path),
-                if_exists="append",
-                index=False,
-            )
-            logging.warning("Wrote to DB: %s", df)
+            df = self.scrape_place(link)
         except Exception as exc:
-            logging.warning("Write to DB failed: %s", exc)
+            self.write_records(None, None, [mark_link(link, FAILED, exc)])
+            raise
+        self.write_records(self.search_term, df.astype(str), [mark_link(link, DONE)])
+        if self.parquet_path is not None:
+            process_parquet_sink(self.parquet_path).add(df)
+        logging.info("Queued for DB: %s", link)
 
     def process_locations(self):
-        loc_list = pd.read_sql_query(
-            "SELECT DISTINCT LINK FROM links",
-            sqlite3.connect(f.search_file_path),
-        )["link"].values.tolist()
-        with Pool(cpu_count()) as p:
-            for i, _ in enumerate(loc_list):
-                p.apply_async(
-                    self.add_locations,
-                    args={loc_list[i]},
-                    error_callback=self.error_handler,
-                )
-            p.close()
-            p.join()
+        state = CrawlState(self.search_file_path).sync()
+        loc_list = state.claim()
+        logging.warning("Resuming %s links, state: %s", len(loc_list), state.counts())
+        with SQLiteWriter(self.search_file_path) as writer:
+            self.write_queue = writer.queue
+            with Pool(
+                self.num_bots, initializer=self.warm_drivers, initargs=(True,)
+            ) as p:
+                for i, _ in enumerate(loc_list):
+                    p.apply_async(
+                        self.add_locations,
+                        args={loc_list[i]},
+                        error_callback=self.error_handler,
+                    )
+                p.close()
+                p.join()
+        self.write_queue = None
+
+    def process_pipelined(self, link_bots=None, queue_size=100):
+        """Collect links and scrape their details at the same time.
+
+        link_bots workers scroll searches while the rest of num_bots scrape
+        details from a bounded queue, so link collection waits whenever it is
+        queue_size links ahead. Links left unfinished by an earlier run are
+        queued too.
+        """
+        link_bots = link_bots or max(1, self.num_bots // 4)
+        search_list = self.create_zip_list()
+        state = CrawlState(self.search_file_path).sync()
+        loc_list = state.claim()
+        pipeline = Pipeline(
+            self.collect_links,
+            self.add_locations,
+            producers=link_bots,
+            consumers=max(1, self.num_bots - link_bots),
+            maxsize=queue_size,
+            initializer=self.warm_drivers,
+            producer_initargs=(False,),
+            consumer_initargs=(True,),
+        )
+        with SQLiteWriter(self.search_file_path) as writer:
+            self.write_queue = writer.queue
+            try:
+                pipeline.run(search_list, tasks=loc_list)
+            finally:
+                self.write_queue = None
+        logging.warning("Crawl state: %s", CrawlState(self.search_file_path).counts())
 
 
 if __name__ == "__main__":
     f = Finder(
         search_term="women owned business", city="Pasadena", state="CA", headless=False
     )
-    f.process_tasks()
-    f.process_locations()
+    f.process_pipelined()
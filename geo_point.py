@@ -0,0 +1,25 @@
+"""
+Coordinate extraction from Google Maps place urls and page sources
+"""
+import re
+
+PLACE_URL = "https://www.google.com/maps/place/"
+POINT_PATTERN = re.compile(r"!3d(-?\d+(?:\.\d+)?)!4d(-?\d+(?:\.\d+)?)")
+
+
+def find_point(source):
+    """(lat, long) floats from the first !3d...!4d pair at or after the place url.
+
+    The search starts at the place url offset without slicing the source, so a
+    multi-MB page_source is scanned once and never copied. Returns None on a miss.
+    """
+    start = source.find(PLACE_URL)
+    match = POINT_PATTERN.search(source, start if start != -1 else 0)
+    if match is None:
+        return None
+    return float(match.group(1)), float(match.group(2))
+
+
+def find_points(sources):
+    """find_point over many page sources or place urls, None for each miss"""
+    return [find_point(source) for source in sources]
@@ -0,0 +1,235 @@
+"""
+Reverse geocode cache and offline US resolver for TMS
+"""
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from geopy.geocoders import Nominatim
+from db_writer import connect_sqlite
+from zip_index import zip_index
+
+US_STATES = {
+    "AL": "Alabama",
+    "AK": "Alaska",
+    "AZ": "Arizona",
+    "AR": "Arkansas",
+    "CA": "California",
+    "CO": "Colorado",
+    "CT": "Connecticut",
+    "DE": "Delaware",
+    "DC": "District of Columbia",
+    "FL": "Florida",
+    "GA": "Georgia",
+    "HI": "Hawaii",
+    "ID": "Idaho",
+    "IL": "Illinois",
+    "IN": "Indiana",
+    "IA": "Iowa",
+    "KS": "Kansas",
+    "KY": "Kentucky",
+    "LA": "Louisiana",
+    "ME": "Maine",
+    "MD": "Maryland",
+    "MA": "Massachusetts",
+    "MI": "Michigan",
+    "MN": "Minnesota",
+    "MS": "Mississippi",
+    "MO": "Missouri",
+    "MT": "Montana",
+    "NE": "Nebraska",
+    "NV": "Nevada",
+    "NH": "New Hampshire",
+    "NJ": "New Jersey",
+    "NM": "New Mexico",
+    "NY": "New York",
+    "NC": "North Carolina",
+    "ND": "North Dakota",
+    "OH": "Ohio",
+    "OK": "Oklahoma",
+    "OR": "Oregon",
+    "PA": "Pennsylvania",
+    "RI": "Rhode Island",
+    "SC": "South Carolina",
+    "SD": "South Dakota",
+    "TN": "Tennessee",
+    "TX": "Texas",
+    "UT": "Utah",
+    "VT": "Vermont",
+    "VA": "Virginia",
+    "WA": "Washington",
+    "WV": "West Virginia",
+    "WI": "Wisconsin",
+    "WY": "Wyoming",
+    "PR": "Puerto Rico",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reverse_geocode (
+    lat REAL NOT NULL,
+    long REAL NOT NULL,
+    raw TEXT NOT NULL,
+    source TEXT,
+    used_at REAL,
+    PRIMARY KEY (lat, long)
+)
+"""
+USED_INDEX = (
+    "CREATE INDEX IF NOT EXISTS reverse_geocode_used ON reverse_geocode (used_at)"
+)
+
+
+class GeocodeCache:
+    """Persistent reverse geocode results keyed on rounded coordinates with LRU eviction"""
+
+    def __init__(self, db_path=None, precision=3, max_entries=500000, memory_size=5000):
+        """precision=3 decimals groups places within roughly 100m of each other"""
+        self.db_path = Path(db_path or Path.cwd() / "db" / "geocode_cache.sqlite")
+        self.precision = precision
+        self.max_entries = max_entries
+        self.memory_size = memory_size
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.puts = 0
+        self._con = None
+        self._pid = None
+
+    @property
+    def con(self):
+        """SQLite connection opened lazily, and again in a forked child"""
+        if self._con is None or self._pid != os.getpid():
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._con = connect_sqlite(self.db_path)
+            self._pid = os.getpid()
+            with self._con:
+                self._con.execute(SCHEMA)
+                self._con.execute(USED_INDEX)
+        return self._con
+
+    def key(self, lat, long):
+        return (round(float(lat), self.precision), round(float(long), self.precision))
+
+    def remember(self, key, raw):
+        """Keep a bounded in-process copy in front of SQLite"""
+        self.memory[key] = raw
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def get(self, lat, long):
+        """Cached raw location dict for the coordinates, or None"""
+        key = self.key(lat, long)
+        if key in self.memory:
+            self.hits += 1
+            self.memory.move_to_end(key)
+            return self.memory[key]
+        row = self.con.execute(
+            "SELECT raw FROM reverse_geocode WHERE lat = ? AND long = ?", key
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self.con:
+            self.con.execute(
+                "UPDATE reverse_geocode SET used_at = ? WHERE lat = ? AND long = ?",
+                (time.time(), *key),
+            )
+        raw = json.loads(row[0])
+        self.remember(key, raw)
+        return raw
+
+    def put(self, lat, long, raw, source="nominatim"):
+        """Store a raw location dict, evicting the least recently used rows if full"""
+        key = self.key(lat, long)
+        self.remember(key, raw)
+        with self.con:
+            self.con.execute(
+                "INSERT OR REPLACE INTO reverse_geocode VALUES (?, ?, ?, ?, ?)",
+                (*key, json.dumps(raw), source, time.time()),
+            )
+        self.puts += 1
+        if self.puts % 1000 == 0:
+            self.evict()
+
+    def evict(self):
+        """Drop the least recently used rows above max_entries"""
+        with self.con:
+            (count,) = self.con.execute(
+                "SELECT COUNT(*) FROM reverse_geocode"
+            ).fetchone()
+            extra = count - self.max_entries
+            if extra > 0:
+                self.con.execute(
+                    "DELETE FROM reverse_geocode WHERE rowid IN ("
+                    "SELECT rowid FROM reverse_geocode ORDER BY used_at LIMIT ?)",
+                    (extra,),
+                )
+                logging.info("Evicted %s reverse geocode rows", extra)
+
+
+class OfflineResolver:
+    """Answers US city, state and postcode from the nearest zip code centroid"""
+
+    def __init__(self, index, max_miles=10):
+        self.index = index
+        self.max_miles = max_miles
+
+    def resolve(self, lat, long):
+        """Nominatim shaped raw dict for the coordinates, or None if no zip is close"""
+        row = self.index.nearest(lat, long, max_miles=self.max_miles)
+        if row is None:
+            return None
+        city = row["major_city"] or row["post_office_city"]
+        state = US_STATES.get(row["state"], row["state"])
+        address = {
+            "city": city,
+            "county": row["county"],
+            "state": state,
+            "postcode": row["zipcode"],
+            "country": "United States",
+            "country_code": "us",
+        }
+        parts = (city, row["county"], state, row["zipcode"], "United States")
+        return {
+            "lat": str(lat),
+            "lon": str(long),
+            "display_name": ", ".join(str(part) for part in parts if part),
+            "address": address,
+        }
+
+
+_geocode_cache = None
+_offline_resolver = None
+_geolocator = None
+
+
+def geocode_cache():
+    """GeocodeCache shared by every lookup in this process"""
+    global _geocode_cache
+    if _geocode_cache is None:
+        _geocode_cache = GeocodeCache()
+    return _geocode_cache
+
+
+def offline_resolver(db_file_path=None):
+    """OfflineResolver over the uszipcode DB, None if the DB has not been downloaded"""
+    global _offline_resolver
+    if _offline_resolver is None:
+        db_file_path = Path(db_file_path or Path.cwd() / "db" / "simple_db.sqlite")
+        if not db_file_path.exists():
+            logging.warning("No zip code DB at %s, offline geocoding off", db_file_path)
+            return None
+        _offline_resolver = OfflineResolver(zip_index(db_file_path))
+    return _offline_resolver
+
+
+def geolocator(user_agent):
+    """One Nominatim client per process so its HTTP session is reused"""
+    global _geolocator
+    if _geolocator is None:
+        _geolocator = Nominatim(user_agent=user_agent)
+    return _geolocator
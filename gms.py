@@ -1,6 +1,5 @@
 import pandas as pd
 import numpy as np
-from selenium import webdriver
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
@@ -9,91 +8,96 @@ from selenium.common.exceptions import (
     NoSuchElementException,
     TimeoutException,
 )
-from webdriver_manager.chrome import ChromeDriverManager
+from driver_pool import process_pool
+from launch_config import launch_config
+from geo_point import find_point
+from place_parser import (
+    parse_open_hours,
+    attributes_frame,
+    parse_place,
+    parse_snapshot,
+    snapshot_script,
+)
+from scroll_engine import ScrollEngine
+from resource_policy import resource_policy
+from place_fetch import place_fetcher, required_fields
 import logging
 import time
 
+GMS_ARGUMENTS = (
+    "--no-default-browser-check",
+    "--disable-extensions",
+    "--disable-default-apps",
+)
+
 
 class GMS:
     """Google Based Frontend Selenium Process and WebDriver Managagement"""
 
-    def __init__(self, search_term, headless=True):
+    def __init__(
+        self,
+        search_term,
+        headless=True,
+        drivers_per_profile=1,
+        extraction="script",
+        block_resources=True,
+        fetch=False,
+        fetch_required=None,
+    ):
+        """fetch_required are the fields a fetched place page must have to skip the
+        browser, by default the women-owned badge only for searches about it"""
         self.headless = headless
         self.search_term = search_term
+        self.drivers_per_profile = drivers_per_profile
+        self.extraction = extraction
+        self.block_resources = block_resources
+        self.fetch = fetch
+        self.fetch_required = fetch_required or required_fields(search_term)
+        self.scroller = ScrollEngine()
 
     def get_driver(self, images=False):
         """Get the driver with parameters"""
-        options = webdriver.ChromeOptions()
-        if self.headless:
-            options.add_argument("--headless")
-        options.add_argument("--start-maximized")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--no-default-browser-check")
-        options.add_argument("--disable-extensions")
-        options.add_argument("--disable-default-apps")
-        # added extra chrome options
-        options.add_argument("disable-infobars")
-
-        if not images:
-            prefs = {
-                "profile.default_content_settings.popups": 0,
-                "profile.default_content_setting_values": {"images": 2},
-                "profile.managed_default_content_setting_values": {"images": 2},
-            }
-            options.add_experimental_option("prefs", prefs)
-
-        options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        options.add_experimental_option("useAutomationExtension", False)
-        driver = webdriver.Chrome(ChromeDriverManager().install(), options=options)
-
-        driver.implicitly_wait(3)
-        return driver
+        return launch_config().launch(
+            images=images,
+            headless=self.headless,
+            arguments=GMS_ARGUMENTS,
+            network_log=self.block_resources,
+        )
+
+    def block(self, driver, profile):
+        """Switch the driver to a resource blocking profile before loading a page"""
+        if self.block_resources:
+            resource_policy().apply(driver, profile)
+
+    def report_resources(self, driver, page):
+        """Log requests and bytes loaded and saved on the page just scraped"""
+        if self.block_resources:
+            resource_policy().report(driver, page)
 
     def tear_down(self, driver):
         """Exit the browser and end the session"""
         driver.quit()
 
-    def extract_point(self, page_source):
-        """Extracts latitude and longitude from Google source html code on a location page"""
-        idx = page_source.find("https://www.google.com/maps/place/")
-        test = page_source[idx:]
-        lat = test.split("!3d")
-        lat = lat[1].split("!4d")
-        long = lat[1].split("!16")[0]
-        if len(long) > 20:
-            long = lat[1].split("\\u00")[0]
-        lat = lat[0]
-        try:
-            lat = float(lat)
-            long = float(long)
-        except Exception as exc:
-            logging.warning("lat float conversion failed, descend to step 2: %s", exc)
-            long = long[:12]
-            long = long.replace("!", "")
-            long = long.replace(r"\\", "")
-        if lat is None or lat == "":
-            lat = "need lat"
-        if long is None or long == "":
-            long = "need long"
-        return (lat, long)
-
-    def scroll_results(self, driver):
-        """Find all locations in search page, scroll to last listing"""
-        try:
-            results = driver.find_elements(
-                By.XPATH, '//div[contains(@aria-label, "Results for")]/div/div[./a]'
-            )
-            option = results[-1]
+    def driver_pool(self):
+        """Per-process pool of reusable drivers shared by every task in this worker"""
+        return process_pool(self.get_driver, size=self.drivers_per_profile)
 
-            clickable = EC.element_to_be_clickable(option)
-            presence = EC.presence_of_element_located(option)
+    def warm_drivers(self, images=None):
+        """Pool initializer that starts this worker's drivers before tasks arrive.
 
-            if clickable and presence:
-                driver.execute_script("arguments[0].scrollIntoView(true);", option)
-                time.sleep(2)
-            return results
-        except Exception as exc:
-            logging.warning("Scroll results exception: %s", exc)
+        In fetch mode place drivers are only needed for fallbacks, so they start
+        on first use instead.
+        """
+        if self.fetch and images:
+            return
+        self.driver_pool().warm(images=images)
+
+    def extract_point(self, page_source):
+        """Extracts latitude and longitude from Google source html code on a location page"""
+        point = find_point(page_source)
+        if point is None:
+            raise ValueError("No !3d/!4d coordinates found in page source")
+        return point
 
     def extract_times(self, driver):
         """Find all locations in search page, scroll to last listing"""
@@ -144,29 +148,7 @@ class GMS:
             )
             open_hours = divs.get_attribute("aria-label")
 
-            open_hours = " ".join(open_hours.replace(".", "").split()[:-6])
-            hours_dict = dict(hours.split(", ", 1) for hours in open_hours.split("; "))
-
-            for i in list(hours_dict.keys()):
-                hours_dict[i] = [hours_dict[i]]
-
-            hours_df = pd.DataFrame(hours_dict)
-
-            hours_df.columns = [day.split()[0] for day in list(hours_df.columns)]
-            dow = [
-                "Sunday",
-                "Monday",
-                "Tuesday",
-                "Wednesday",
-                "Thursday",
-                "Friday",
-                "Saturday",
-            ]
-            hours_df = hours_df[dow]
-            hours = [x + "_hours" for x in dow]
-            dow_hours = dict(zip(dow, hours))
-            hours_df.rename(columns=dow_hours, inplace=True)
-            return hours_df
+            return parse_open_hours(open_hours)
 
     def get_attributes(self, driver):
         """Retrieve location attributes"""
@@ -176,45 +158,22 @@ class GMS:
         ).click()
         time.sleep(0.5)
 
-        headers = []
-        list_attr = []
-
-        headers.append("Description")
         try:
             desc = driver.find_element(By.XPATH, '//span[@class = "HlvSq"]').text
-            list_attr.append(desc)
         except:
-            list_attr.append(None)
+            desc = None
 
+        regions = []
         eles = driver.find_elements(By.XPATH, '//div[contains(@role, "region")]')
         for x in eles:
-            attr = []
-            if "Available search" in x.get_attribute("aria-label"):
-                continue
-            headers.append(x.get_attribute("aria-label"))
             sub_eles = x.find_elements(By.XPATH, ".//span")
-            for s in sub_eles:
-                attr.append(s.get_attribute("aria-label"))
-            list_attr.append([attr])
-
-        attr_dict = dict(zip(headers, list_attr))
-        attr_cols = [
-            "Description",
-            "Accessibility",
-            "Activities",
-            "Amenities",
-            "Atmosphere",
-            "Crowd",
-            "Dining options",
-            "Highlights",
-            "Offerings",
-            "Offerings: languages spoken",
-            "Payments",
-            "Planning",
-            "Popular for",
-            "Service options",
-        ]
-        attr_df = pd.DataFrame(attr_dict, columns=attr_cols)
+            regions.append(
+                (
+                    x.get_attribute("aria-label"),
+                    [s.get_attribute("aria-label") for s in sub_eles],
+                )
+            )
+        attr_df = attributes_frame(desc, regions)
 
         driver.find_element(
             By.XPATH, '//button[contains(@jsaction, "pane.header.back")]'
@@ -222,154 +181,125 @@ class GMS:
         # time.sleep(0.3)
         return attr_df
 
-    def check_owner(self, driver):
-        eles = driver.find_elements(By.XPATH, "//span")
-        women_owned = "False"
-        for x in eles:
-            if "women-owned" in x.text:
-                women_owned = "Listed on Google"
-        return women_owned
+    def snapshot_place(self, driver, timeout=3):
+        """Place fields, coordinates and attributes from one in-page script call"""
+        driver.set_script_timeout(timeout + 5)
+        snapshot = driver.execute_async_script(snapshot_script(), int(timeout * 1000))
+        place, point, attr_df = parse_snapshot(snapshot)
+        if place["title"] is None:
+            logging.info("Script snapshot found no title, parsing page_source")
+            place, page_source = self.parse_place_source(driver, driver.page_source)
+            point = point or find_point(page_source)
+        return place, point, attr_df
+
+    def parse_place_source(self, driver, page_source):
+        """Parse place fields from page_source, re-snapshotting once if not yet rendered"""
+        place = parse_place(page_source)
+        if place["title"] is None:
+            try:
+                WebDriverWait(driver, 5).until(
+                    EC.presence_of_element_located(
+                        (By.XPATH, '//h1[@class = "DUwDvf fontHeadlineLarge"]')
+                    )
+                )
+                page_source = driver.page_source
+                place = parse_place(page_source)
+            except TimeoutException as exc:
+                logging.info("Place pane not rendered: %s", exc)
+        return place, page_source
+
+    def extract_booking(self, driver, link):
+        """Open the reservation pane and collect the booking providers"""
+        try:
+            driver.find_element(
+                By.XPATH, '//div[contains(@class, "m6QErb tLjsW UhIuC")]'
+            ).click()
+            book = []
+            bookings = WebDriverWait(driver, 5).until(
+                EC.presence_of_all_elements_located(
+                    (By.XPATH, '//div[@class = "NGLLDf"]')
+                )
+            )
+            for b in bookings:
+                book.append(b.text)
+            driver.find_element(
+                By.XPATH, '//button[contains(@aria-label, "Back")]'
+            ).click()
+            return book
+        except Exception as exc:
+            logging.warning(f"Failed to extract booking: URL: {link} Exception{exc}")
+            return None
+
+    def scrape_place(self, link):
+        """Place row, fetched without a browser when fetch mode finds every field"""
+        if self.fetch:
+            d = self.fetch_restaurant_data(link)
+            if d is not None:
+                return d
+        with self.driver_pool().borrow(images=True) as driver:
+            return self.extract_restaurant_data(driver, link)
+
+    def fetch_restaurant_data(self, link):
+        """Place row from the raw place page, or None when a required field is missing"""
+        place, point, missing = place_fetcher().place(link, self.fetch_required)
+        if missing:
+            logging.info("Fetch missing %s, using the browser: %s", missing, link)
+            return None
+        tmp = {}
+        tmp["lat"], tmp["long"] = point
+        tmp["link"] = link
+        tmp["title"] = place["title"]
+        tmp["rating"] = place["rating"]
+        tmp["num_reviews"] = place["num_reviews"]
+        tmp["booking"] = None
+        tmp["category"] = place["category"]
+        tmp["address"] = place["address"]
+        tmp["number"] = place["number"]
+        tmp["website"] = place["website"]
+        d = pd.DataFrame([tmp])
+        d["women_owned"] = place["women_owned"]
+        d["open_status"] = None
+        # hours, attributes and booking are not in the raw page, not absent
+        d["extraction"] = "fetch"
+        return self.fill_missing_columns(d)
 
     def extract_restaurant_data(self, driver, link):
         """Main method for extracting individual location information"""
+        self.block(driver, "details")
         driver.get(link)
         time.sleep(np.random.random(1)[0])
-        page_source = driver.page_source
+        if self.extraction == "script":
+            place, point, attr_df = self.snapshot_place(driver)
+        else:
+            place, page_source = self.parse_place_source(driver, driver.page_source)
+            point, attr_df = find_point(page_source), None
 
         # find coordinates
-        try:
-            lat, long = self.extract_point(page_source)
-        except Exception as exc:
-            driver.refresh()
-            logging.warning("Extract Point Exception: %s", exc)
-        try:
-            lat, long = self.extract_point(page_source)
-        except Exception as exc:
-            logging.warning("Input String as lat Convert Point Exception: %s", exc)
+        if point is None:
+            logging.warning("Extract Point Exception: no coordinates in %s", link)
             lat = "needs lat"
             long = "needs long"
+        else:
+            lat, long = point
         tmp = {}
         tmp["lat"] = lat
         tmp["long"] = long
         tmp["link"] = link
-        tmp["title"] = None
-        tmp["rating"] = None
-        tmp["num_reviews"] = None
+        tmp["title"] = place["title"]
+        tmp["rating"] = place["rating"]
+        tmp["num_reviews"] = place["num_reviews"]
         tmp["booking"] = None
-        tmp["category"] = None
-        tmp["address"] = None
-        tmp["number"] = None
-        tmp["website"] = None
+        tmp["category"] = place["category"]
+        tmp["address"] = place["address"]
+        tmp["number"] = place["number"]
+        tmp["website"] = place["website"]
 
-        # find title
-        try:
-            title = driver.find_element(
-                By.XPATH, '//h1[@class = "DUwDvf fontHeadlineLarge"]'
-            ).text
-            tmp["title"] = title
-        except:
-            tmp["title"] = None
-
-        # find category
-        try:
-            category = WebDriverWait(driver, 5).until(
-                EC.visibility_of_element_located(
-                    (By.XPATH, '//button[contains(@jsaction, "pane.rating.category")]')
-                )
-            )
-            cat_text = category.text
-            tmp.update({"category": cat_text})
-        except Exception as exc:
-            logging.info("Catgeory Extract and Dict Update Exception: %s", exc)
-
-        # find address
-        try:
-            address = driver.find_element(By.CSS_SELECTOR, "[data-item-id='address']")
-            address = address.get_attribute("aria-label")
-            address = address.split(" ", 1)[1]
-            tmp.update({"address": address})
-        except Exception as exc:
-            logging.info("Address Extract error: %s", exc)
-
-        # find phone number
-        try:
-            phone_number = driver.find_element(
-                By.CSS_SELECTOR, "[data-tooltip='Copy phone number']"
-            )
-            phone_number = phone_number.get_attribute("data-item-id")
-            phone_number = phone_number.split("+", 1)[1]
-            tmp.update({"number": phone_number})
-        except:
-            pass
-
-        # find website
-        try:
-            website = driver.find_element(By.CSS_SELECTOR, "[data-item-id='authority']")
-            website = website.get_attribute("aria-label")
-            website = website.split()[1]
-            tmp.update({"website": website})
-        except Exception as exc:
-            logging.info("Website Extract Error: %s", exc)
-
-        # find booking company
-        try:
-            reserve = driver.find_element(
-                By.XPATH, '//div[contains(@class, "m6QErb tLjsW UhIuC")]'
-            )
-            if reserve.text == "RESERVE A TABLE":
-                try:
-                    reserve.click()
-                    # time.sleep(0.5)
-                    book = []
-                    bookings = WebDriverWait(driver, 5).until(
-                        EC.presence_of_all_elements_located(
-                            (By.XPATH, '//div[@class = "NGLLDf"]')
-                        )
-                    )
-                    for b in bookings:
-                        book.append(b.text)
-                    tmp.update({"booking": book})
-                    driver.find_element(
-                        By.XPATH, '//button[contains(@aria-label, "Back")]'
-                    ).click()
-                    # time.sleep(0.5)
-                except Exception as exc:
-                    logging.warning(
-                        f"Failed to extract booking: URL: {link} Exception{exc}"
-                    )
-        except:
-            pass
-
-        # find rating and number of reviews
-        try:
-            ratings_and_num_reviews = (
-                WebDriverWait(driver, 5)
-                .until(
-                    EC.presence_of_element_located(
-                        (
-                            By.XPATH,
-                            "//div[contains(@jsaction, 'pane.rating.moreReviews')]",
-                        )
-                    )
-                )
-                .text
-            )
-            ratings_and_num_reviews = ratings_and_num_reviews.split("\n")
-        except:
-            pass
-        try:
-            rating = ratings_and_num_reviews[0]
-            tmp.update({"rating": rating})
-        except:
-            pass
-        try:
-            num_reviews = ratings_and_num_reviews[1].split(" ")[0]
-            tmp.update({"num_reviews": num_reviews})
-        except:
-            pass
+        # find booking company, the only detail field that needs the live page
+        if place["reservable"]:
+            tmp.update({"booking": self.extract_booking(driver, link)})
 
         d = pd.DataFrame([tmp])
-        d["women_owned"] = self.check_owner(driver)
+        d["women_owned"] = place["women_owned"]
 
         # find busy times
         # try:
@@ -379,10 +309,12 @@ class GMS:
         # except Exception as exc:
         #     logging.warning("Busy time and hour failed: %s", exc)
 
-        # find attributes
+        # find attributes, already in the snapshot when extraction is "script"
         try:
-            attr_df = self.get_attributes(driver)
-            attr_df = attr_df.astype(str)
+            if self.extraction != "script":
+                attr_df = self.get_attributes(driver)
+            if attr_df is None:
+                raise NoSuchElementException("No attributes pane")
             d = pd.concat([d, attr_df], axis=1)
         except Exception as exc:
             logging.warning("Attributes not found: %s", exc)
@@ -400,6 +332,12 @@ class GMS:
             d["open_status"] = None
             print("No business hours: %s", exc)
 
+        d = self.fill_missing_columns(d)
+        self.report_resources(driver, link)
+        return d
+
+    def fill_missing_columns(self, d):
+        """Add the busy time, hours and extraction columns a row did not get"""
         if "week_num" not in d.columns:
             d["week_num"] = None
             d["Sunday"] = None
@@ -417,51 +355,27 @@ class GMS:
             d["Friday_hours"] = None
             d["Saturday_hours"] = None
             d["Sunday_hours"] = None
+        if "extraction" not in d.columns:
+            d["extraction"] = "browser"
 
         d["search_term"] = self.search_term
-        d = d.astype(str)
         return d
 
     def check_eol(self, driver):
         """Check End of Results"""
-        get_source = driver.page_source
-        search_text = "You've reached the end of the list"
-        return search_text in get_source
+        return self.scroller.state(driver)["eol"]
 
     def scrape_links(self, search):
         """Collect urls from search page"""
         search = search.replace("'", "''")
-        driver = self.get_driver(images=False)
+        with self.driver_pool().borrow(images=False) as driver:
+            return self._scrape_links(driver, search)
+
+    def _scrape_links(self, driver, search):
+        """Scroll a search page to the end of its results and collect the place urls"""
+        self.block(driver, "links-only")
         driver.get(search)
-        eol = self.check_eol(driver)
-        count = 0
-        while not eol:
-            count += 1
-            try:
-                search_results_len = len(self.scroll_results(driver))
-            except:
-                search_results_len = 0
-            eol = self.check_eol(driver)
-            new_results_len = len(
-                driver.find_elements(
-                    By.XPATH, '//div[contains(@aria-label, "Results for")]/div/div[./a]'
-                )
-            )
-            if new_results_len == search_results_len:
-                time.sleep(2)
-                driver.find_elements(
-                    By.XPATH,
-                    '//div[contains(@aria-label, "Results for")]/div/div[./a]',
-                )[np.random.randint(new_results_len)].click()
-                time.sleep(1)
-            if count >= 300:
-                break
-        results = driver.find_elements(
-            By.XPATH, '//div[contains(@aria-label, "Results for")]/div/div[./a]'
-        )
-        total_list = []
-        for x in results:
-            e = x.find_element(By.XPATH, ".//*")
-            url = e.get_attribute("href")
-            total_list.append(url)
-        return total_list
+        self.scroller.run(driver)
+        links = self.scroller.links(driver)
+        self.report_resources(driver, search)
+        return links
@@ -0,0 +1,143 @@
+"""
+Known-link index for TMS searches, loaded once per run
+"""
+import csv
+import io
+import logging
+import time
+from collections import defaultdict
+from pathlib import Path
+from sqlalchemy import text
+
+# Cache lines counting the table rows the cache accounts for, one per write
+ROWS_MARKER = "#rows"
+
+
+class KnownLinks:
+    """In-memory search -> links index backed by a streaming query or a local cache file.
+
+    The cache file also records how many table rows it accounts for, so a cache
+    that no longer matches the table's row count (rows deleted, or written by
+    another machine) is reloaded from the table.
+    """
+
+    def __init__(self, engine, table, cache_path=None, chunk_size=10000):
+        self.engine = engine
+        self.table = table
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.chunk_size = chunk_size
+        self.links = defaultdict(set)
+        self.rows = 0
+        self.loaded = False
+
+    def __len__(self):
+        return sum(len(links) for links in self.links.values())
+
+    def load(self, refresh=False):
+        """Fill the index from the cache file, or stream it from the table and cache it"""
+        start = time.perf_counter()
+        fresh = False
+        if not refresh and self.cache_path is not None and self.cache_path.exists():
+            self.read_cache()
+            table_rows = self.count_rows()
+            fresh = table_rows == self.rows
+            if not fresh:
+                logging.warning(
+                    "Known links cache covers %s rows, %s has %s, reloading",
+                    self.rows,
+                    self.table,
+                    table_rows,
+                )
+        if fresh:
+            source = self.cache_path
+        else:
+            self.load_from_db()
+            self.write_cache()
+            source = self.table
+        self.loaded = True
+        logging.warning(
+            "Loaded %s known links from %s in %.1fs",
+            len(self),
+            source,
+            time.perf_counter() - start,
+        )
+        return self
+
+    def count_rows(self):
+        """Rows in the table right now"""
+        with self.engine.connect() as con:
+            return con.execute(text(f"SELECT COUNT(*) FROM {self.table}")).scalar()
+
+    def read_cache(self):
+        """Fill the index and row count from the cache file"""
+        self.links.clear()
+        self.rows = 0
+        with open(self.cache_path, newline="", encoding="utf-8") as f:
+            for search, link in csv.reader(f, delimiter="\t"):
+                if search == ROWS_MARKER:
+                    self.rows += int(link)
+                else:
+                    self.links[search].add(link)
+
+    def load_from_db(self):
+        """Stream every (search, link) pair in chunks instead of building a DataFrame"""
+        self.links.clear()
+        # counted first, rows written while streaming only make the cache look stale
+        self.rows = self.count_rows()
+        query = text(f"SELECT DISTINCT search, link FROM {self.table}")
+        with self.engine.connect() as con:
+            result = con.execution_options(stream_results=True).execute(query)
+            for rows in result.partitions(self.chunk_size):
+                for search, link in rows:
+                    self.links[search].add(link)
+
+    def write_cache(self):
+        """Write the whole index to the cache file"""
+        if self.cache_path is None:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, delimiter="\t")
+            writer.writerow((ROWS_MARKER, self.rows))
+            for search, links in self.links.items():
+                writer.writerows((search, link) for link in links)
+
+    def new_links(self, search, links):
+        """Links from a fresh scrape that are not stored for the search yet"""
+        known = self.links.get(search, ())
+        return list({link for link in links if link not in known})
+
+    def add(self, search, links, rows=0):
+        """Record links committed to the table in rows rows, appending them to the cache.
+
+        Call only once the rows are committed, a link in the index is never
+        scraped again.
+        """
+        known = self.links[search]
+        added = list(dict.fromkeys(link for link in links if link not in known))
+        known.update(added)
+        self.rows += rows
+        if self.cache_path is not None and self.cache_path.exists():
+            lines = io.StringIO()
+            writer = csv.writer(lines, delimiter="\t")
+            writer.writerows((search, link) for link in added)
+            writer.writerow((ROWS_MARKER, rows))
+            # one write per batch so appends from several workers do not interleave
+            with open(self.cache_path, "a", newline="", encoding="utf-8") as f:
+                f.write(lines.getvalue())
+        return added
+
+
+_known_links = None
+
+
+def known_links(engine, table, cache_path=None):
+    """KnownLinks loaded once per run, forked workers inherit the parent's copy.
+
+    Load it in the parent before starting a pool so workers never query the
+    table or rewrite the cache themselves.
+    """
+    global _known_links
+    if _known_links is None or _known_links.table != table:
+        _known_links = KnownLinks(engine, table, cache_path=cache_path).load()
+    return _known_links
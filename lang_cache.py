@@ -0,0 +1,204 @@
+"""
+Memoized language detection and batched translation for location fields
+"""
+import logging
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+import langid
+from db_writer import connect_sqlite
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lang_cache (
+    text TEXT PRIMARY KEY,
+    lang TEXT NOT NULL,
+    translation TEXT,
+    used_at REAL
+)
+"""
+USED_INDEX = "CREATE INDEX IF NOT EXISTS lang_cache_used ON lang_cache (used_at)"
+MISSING_TEXT = {"None", "nan"}
+
+
+def google_translate(text):
+    """ts.google, imported on first use so the module loads without translators"""
+    import translators as ts
+
+    return ts.google(text)
+
+
+class LangCache:
+    """Bounded, persistent memo of langid.classify and ts.google results per string"""
+
+    def __init__(
+        self,
+        db_path=None,
+        memory_size=20000,
+        max_entries=1000000,
+        translate=None,
+        separator="\n",
+    ):
+        self.db_path = Path(db_path or Path.cwd() / "db" / "lang_cache.sqlite")
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self.translate = translate or google_translate
+        self.separator = separator
+        self.memory = OrderedDict()
+        self.requests = 0
+        self.puts = 0
+        self._con = None
+        self._pid = None
+
+    @property
+    def con(self):
+        """SQLite connection opened lazily, and again in a forked child"""
+        if self._con is None or self._pid != os.getpid():
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._con = connect_sqlite(self.db_path)
+            self._pid = os.getpid()
+            with self._con:
+                self._con.execute(SCHEMA)
+                self._con.execute(USED_INDEX)
+        return self._con
+
+    def remember(self, text, entry):
+        self.memory[text] = entry
+        self.memory.move_to_end(text)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def lookup(self, text):
+        """(lang, translation) for a string seen before, or None"""
+        if text in self.memory:
+            self.memory.move_to_end(text)
+            return self.memory[text]
+        row = self.con.execute(
+            "SELECT lang, translation FROM lang_cache WHERE text = ?", (text,)
+        ).fetchone()
+        if row is not None:
+            self.remember(text, row)
+        return row
+
+    def store(self, entries):
+        """Persist {text: (lang, translation)} in one transaction"""
+        now = time.time()
+        for text, entry in entries.items():
+            self.remember(text, entry)
+        with self.con:
+            self.con.executemany(
+                "INSERT OR REPLACE INTO lang_cache VALUES (?, ?, ?, ?)",
+                [(text, lang, tr, now) for text, (lang, tr) in entries.items()],
+            )
+        self.puts += len(entries)
+        if self.puts >= 1000:
+            self.puts = 0
+            self.evict()
+
+    def evict(self):
+        """Drop the least recently stored rows above max_entries"""
+        with self.con:
+            (count,) = self.con.execute("SELECT COUNT(*) FROM lang_cache").fetchone()
+            extra = count - self.max_entries
+            if extra > 0:
+                self.con.execute(
+                    "DELETE FROM lang_cache WHERE rowid IN ("
+                    "SELECT rowid FROM lang_cache ORDER BY used_at LIMIT ?)",
+                    (extra,),
+                )
+
+    def translate_batch(self, texts):
+        """Translate many strings with one request, falling back to one request each"""
+        self.requests += 1
+        try:
+            joined = self.translate(self.separator.join(texts))
+            parts = [part.strip() for part in joined.split(self.separator)]
+            if len(parts) == len(texts):
+                return parts
+            logging.info("Batched translation split mismatch, translating singly")
+        except Exception as exc:
+            logging.warning("Batched translation failed: %s", exc)
+        results = []
+        for text in texts:
+            self.requests += 1
+            try:
+                results.append(self.translate(text))
+            except Exception as exc:
+                logging.warning("Translation failed for %s: %s", text, exc)
+                results.append(None)
+        return results
+
+    def localize(self, values):
+        """English {field: text}, translating unseen foreign strings in one batch"""
+        out = {}
+        pending = {}
+        new = {}
+        for field, text in values.items():
+            if not isinstance(text, str) or not text:
+                out[field] = text
+                continue
+            entry = self.lookup(text) or new.get(text)
+            if entry is None:
+                entry = (langid.classify(text)[0], None)
+                if entry[0] == "en":
+                    new[text] = entry
+            lang, translation = entry
+            if lang == "en":
+                out[field] = text
+            elif translation is not None:
+                out[field] = translation
+            else:
+                pending.setdefault(text, (lang, []))[1].append(field)
+        if pending:
+            texts = list(pending)
+            for text, translation in zip(texts, self.translate_batch(texts)):
+                lang, fields = pending[text]
+                for field in fields:
+                    out[field] = translation
+                if translation is not None:
+                    new[text] = (lang, translation)
+        if new:
+            self.store(new)
+        return out
+
+    def localize_frame(self, df, columns, batch_size=50):
+        """Copy of df with English columns, translating the unseen foreign strings of
+        every row together in batches of batch_size.
+
+        Text the SQL path wrote for missing values ("None", "nan") is left alone,
+        as is any string whose translation failed.
+        """
+        columns = [column for column in columns if column in df.columns]
+        texts = list(
+            dict.fromkeys(
+                value
+                for column in columns
+                for value in df[column]
+                if isinstance(value, str) and value and value not in MISSING_TEXT
+            )
+        )
+        english = {}
+        requests = self.requests
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start : start + batch_size]
+            english.update(self.localize(dict(zip(batch, batch))))
+        df = df.copy()
+        for column in columns:
+            df[column] = [english.get(value) or value for value in df[column]]
+        logging.info(
+            "Localized %s strings with %s translation requests",
+            len(texts),
+            self.requests - requests,
+        )
+        return df
+
+
+_lang_cache = None
+
+
+def lang_cache():
+    """LangCache shared by every place in this process"""
+    global _lang_cache
+    if _lang_cache is None:
+        _lang_cache = LangCache()
+    return _lang_cache
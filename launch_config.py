@@ -0,0 +1,184 @@
+"""
+Chrome launch configuration cached per process
+"""
+import copy
+import json
+import logging
+import os
+import time
+from multiprocessing.util import Finalize
+from pathlib import Path
+import numpy as np
+from selenium import webdriver
+from selenium.common.exceptions import SessionNotCreatedException
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+
+BASE_ARGUMENTS = (
+    "--start-maximized",
+    "--disable-gpu",
+    "disable-infobars",
+)
+
+NO_IMAGE_PREFS = {
+    "profile.default_content_settings.popups": 0,
+    "profile.default_content_setting_values": {"images": 2},
+    "profile.managed_default_content_setting_values": {"images": 2},
+}
+
+
+class LaunchConfig:
+    """Resolves chromedriver once and reuses a prebuilt ChromeOptions template per profile"""
+
+    def __init__(self, driver_path=None, manifest_path=None, implicit_wait=3):
+        """driver_path or $CHROMEDRIVER_PATH skips resolution, manifest_path caches it"""
+        self.explicit_path = driver_path or os.environ.get("CHROMEDRIVER_PATH")
+        self.manifest_path = Path(
+            manifest_path or Path.cwd() / "db" / "chromedriver.json"
+        )
+        self.implicit_wait = implicit_wait
+        self._driver_path = None
+        self._driver_source = None
+        self._templates = {}
+        self.startup_times = []
+        self._pid = None
+
+    def read_manifest(self):
+        """Return the cached chromedriver path if the manifest points at a real file"""
+        try:
+            manifest = json.loads(self.manifest_path.read_text())
+        except (OSError, ValueError):
+            return None
+        path = manifest.get("driver_path")
+        if path and Path(path).exists():
+            return path
+        return None
+
+    def write_manifest(self, path):
+        """Record a resolved chromedriver path for later processes"""
+        try:
+            self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            self.manifest_path.write_text(
+                json.dumps({"driver_path": path, "resolved_at": time.time()})
+            )
+        except OSError as exc:
+            logging.warning("Chromedriver manifest write failed: %s", exc)
+
+    @property
+    def driver_path(self):
+        """chromedriver path from the explicit path, the manifest, or a one-time install"""
+        if self._driver_path is None:
+            if self.explicit_path:
+                self._driver_path = str(self.explicit_path)
+                self._driver_source = "explicit"
+            else:
+                self._driver_path = self.read_manifest()
+                self._driver_source = "manifest"
+            if self._driver_path is None:
+                self._driver_path = ChromeDriverManager().install()
+                self._driver_source = "installed"
+                self.write_manifest(self._driver_path)
+        return self._driver_path
+
+    def invalidate_driver(self):
+        """Forget a cached chromedriver that no longer matches the installed Chrome"""
+        logging.warning("Chromedriver %s rejected, re-resolving", self._driver_path)
+        self._driver_path = None
+        try:
+            self.manifest_path.unlink()
+        except OSError:
+            pass
+
+    def options(self, images=True, headless=True, arguments=(), network_log=False):
+        """Copy of the prebuilt options template for the profile.
+
+        network_log turns on Chrome's performance log, which ResourcePolicy reads
+        to report what each page loaded and what blocking saved.
+        """
+        key = (images, headless, tuple(arguments), network_log)
+        template = self._templates.get(key)
+        if template is None:
+            template = webdriver.ChromeOptions()
+            if headless:
+                template.add_argument("--headless")
+            for argument in BASE_ARGUMENTS + tuple(arguments):
+                template.add_argument(argument)
+            if not images:
+                template.add_experimental_option("prefs", NO_IMAGE_PREFS)
+            template.add_experimental_option("excludeSwitches", ["enable-automation"])
+            template.add_experimental_option("useAutomationExtension", False)
+            if network_log:
+                template.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+            self._templates[key] = template
+        return copy.deepcopy(template)
+
+    def launch(self, images=True, headless=True, arguments=(), network_log=False):
+        """Start Chrome for the profile and record how long startup took"""
+        options = self.options(
+            images=images,
+            headless=headless,
+            arguments=arguments,
+            network_log=network_log,
+        )
+        if self._pid != os.getpid():
+            # a forked worker reports its own launches when it exits
+            self._pid = os.getpid()
+            self.startup_times = []
+            Finalize(self, self.report_startup, exitpriority=11)
+        start = time.perf_counter()
+        try:
+            driver = webdriver.Chrome(
+                service=Service(self.driver_path), options=options
+            )
+        except SessionNotCreatedException:
+            # a cached driver goes stale when Chrome auto-updates, resolve it once more
+            if self._driver_source != "manifest":
+                raise
+            self.invalidate_driver()
+            driver = webdriver.Chrome(
+                service=Service(self.driver_path), options=options
+            )
+        elapsed = time.perf_counter() - start
+        self.startup_times.append(elapsed)
+        logging.info("Chrome started in %.2fs (images=%s)", elapsed, images)
+        driver.implicitly_wait(self.implicit_wait)
+        return driver
+
+    def startup_stats(self):
+        """Summary of measured Chrome startup latency in seconds"""
+        if not self.startup_times:
+            return {"launches": 0, "mean": None, "p50": None, "p95": None, "max": None}
+        times = np.array(self.startup_times)
+        return {
+            "launches": len(times),
+            "mean": float(times.mean()),
+            "p50": float(np.percentile(times, 50)),
+            "p95": float(np.percentile(times, 95)),
+            "max": float(times.max()),
+        }
+
+    def report_startup(self):
+        """Log this process's Chrome startup latency summary"""
+        stats = self.startup_stats()
+        if stats["launches"]:
+            logging.warning(
+                "Chrome startup: %s launches, mean %.2fs, p50 %.2fs, p95 %.2fs, "
+                "max %.2fs",
+                stats["launches"],
+                stats["mean"],
+                stats["p50"],
+                stats["p95"],
+                stats["max"],
+            )
+        return stats
+
+
+_launch_config = None
+
+
+def launch_config():
+    """Process-wide LaunchConfig, inherited by forked pool workers once resolved"""
+    global _launch_config
+    if _launch_config is None:
+        _launch_config = LaunchConfig()
+    return _launch_config
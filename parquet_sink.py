@@ -0,0 +1,159 @@
+"""
+Typed place records and buffered Parquet writes partitioned by search term and date
+"""
+import ast
+import math
+import uuid
+from datetime import date
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from buffered_sink import BufferedSink, owned_sink
+from place_parser import ATTRIBUTE_COLUMNS
+
+FLOAT_COLUMNS = ["lat", "long", "rating"]
+INT_COLUMNS = ["num_reviews", "week_num"]
+LIST_COLUMNS = ["booking"] + ATTRIBUTE_COLUMNS[1:]
+TIMESTAMP_COLUMNS = ["scraped_dt"]
+PARTITION_COLUMNS = ["search_term", "date"]
+PARTITION_SCHEMA = pa.schema([(name, pa.string()) for name in PARTITION_COLUMNS])
+
+# Values the SQL path writes for missing fields once a row went through astype(str)
+MISSING = {"", "None", "nan", "NaN", "NaT", "<NA>", "needs lat", "needs long"}
+
+
+def column_type(name):
+    """Arrow type of a place column, string for anything not typed"""
+    if name in FLOAT_COLUMNS:
+        return pa.float64()
+    if name in INT_COLUMNS:
+        return pa.int64()
+    if name in LIST_COLUMNS:
+        return pa.list_(pa.string())
+    if name in TIMESTAMP_COLUMNS:
+        return pa.timestamp("us")
+    return pa.string()
+
+
+def place_schema(columns):
+    """Arrow schema for place rows with these columns"""
+    return pa.schema([pa.field(name, column_type(name)) for name in columns])
+
+
+def is_missing(value):
+    if value is None:
+        return True
+    if isinstance(value, float):
+        return math.isnan(value)
+    return isinstance(value, str) and value.strip() in MISSING
+
+
+def as_list(value):
+    """List of strings from a list cell or its str() form, None when missing"""
+    if isinstance(value, str) and not is_missing(value):
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return [value]
+    if isinstance(value, (list, tuple)) or hasattr(value, "tolist"):
+        return [str(v) for v in list(value) if not is_missing(v)]
+    return None if is_missing(value) else [str(value)]
+
+
+def typed_column(series, type_):
+    """Arrow array of one column, parsing the strings the SQL path produces"""
+    if pa.types.is_list(type_):
+        return pa.array([as_list(v) for v in series], type=type_)
+    if pa.types.is_timestamp(type_):
+        return pa.array(pd.to_datetime(series, errors="coerce"), type=type_)
+    if pa.types.is_floating(type_) or pa.types.is_integer(type_):
+        text = series.astype(str).str.replace(",", "", regex=False)
+        numbers = pd.to_numeric(text, errors="coerce")
+        if pa.types.is_integer(type_):
+            numbers = numbers.round().astype("Int64")
+        return pa.array(numbers, type=type_, from_pandas=True)
+    return pa.array([None if is_missing(v) else str(v) for v in series], type=type_)
+
+
+def place_table(df, date_column="scraped_dt"):
+    """Typed Arrow table of place rows with the search_term and date partition columns.
+
+    date is the day of date_column, or today for rows without one.
+    """
+    df = df.reset_index(drop=True)
+    if "search_term" not in df.columns:
+        df["search_term"] = None
+    day = pd.Series(date.today().isoformat(), index=df.index)
+    if date_column in df.columns:
+        stamps = pd.to_datetime(df[date_column], errors="coerce")
+        day = stamps.dt.strftime("%Y-%m-%d").where(stamps.notna(), day)
+    df["date"] = day
+    df["search_term"] = df["search_term"].where(
+        ~df["search_term"].map(is_missing), "unknown"
+    )
+    columns = [c for c in df.columns if c not in PARTITION_COLUMNS]
+    columns += PARTITION_COLUMNS
+    schema = place_schema(columns)
+    arrays = [typed_column(df[field.name], field.type) for field in schema]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class ParquetSink(BufferedSink):
+    """Writes buffered place rows as zstd Parquet files in batches.
+
+    Files land under root/search_term=<term>/date=<yyyy-mm-dd>/, each flush
+    writing one uniquely named file per partition, so workers and later runs
+    appending to the same dataset never overwrite each other. Rows that keep
+    failing are dead-lettered to root/_failed.jsonl, which dataset reads skip.
+    """
+
+    def __init__(
+        self, root, max_buffer=1000, flush_interval=60.0, compression="zstd", **kwargs
+    ):
+        kwargs.setdefault("dead_letter_path", Path(root) / "_failed.jsonl")
+        super().__init__(
+            str(root), max_buffer=max_buffer, flush_interval=flush_interval, **kwargs
+        )
+        self.root = str(root)
+        self.compression = compression
+
+    def write(self, df):
+        """Write a batch of place rows into the partitioned dataset"""
+        ds.write_dataset(
+            place_table(df),
+            self.root,
+            format="parquet",
+            partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive"),
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            file_options=ds.ParquetFileFormat().make_write_options(
+                compression=self.compression
+            ),
+        )
+
+
+def read_places(root, **kwargs):
+    """Every place row under a Parquet sink root as one typed DataFrame.
+
+    Place rows have no fixed column set, the attribute columns vary by place, so
+    the schema is the union of every file's schema rather than the first one's.
+    """
+    partitioning = ds.partitioning(PARTITION_SCHEMA, flavor="hive")
+    files = ds.dataset(str(root), format="parquet", partitioning=partitioning).files
+    schema = pa.unify_schemas(
+        [pq.read_schema(path) for path in files] + [PARTITION_SCHEMA]
+    )
+    dataset = ds.dataset(
+        str(root), schema=schema, format="parquet", partitioning=partitioning
+    )
+    return dataset.to_table(**kwargs).to_pandas()
+
+
+def process_parquet_sink(root, columns=None, **kwargs):
+    """ParquetSink owned by this process, flushed by a finalizer when the worker exits"""
+    return owned_sink(
+        ("parquet", str(root)),
+        lambda: ParquetSink(root, columns=columns, **kwargs),
+    )
@@ -0,0 +1,123 @@
+"""
+Two stage producer/consumer pipeline: link collection feeding detail scraping
+"""
+import logging
+import time
+from multiprocessing import Manager, Pool
+
+STOP = None
+
+
+def produce_tasks(produce, item, task_queue):
+    """Run one producer item, streaming its tasks into the bounded queue.
+
+    put blocks while the queue is full, which is what holds link collection back
+    when detail scraping falls behind.
+    """
+    count = 0
+    for task in produce(item) or ():
+        task_queue.put(task)
+        count += 1
+    return count
+
+
+def consume_tasks(consume, task_queue):
+    """Consume tasks until the stop sentinel, tuples are unpacked as arguments"""
+    done = failed = 0
+    while True:
+        task = task_queue.get()
+        if task is STOP:
+            return done, failed
+        try:
+            if isinstance(task, tuple):
+                consume(*task)
+            else:
+                consume(task)
+            done += 1
+        except Exception as exc:
+            failed += 1
+            logging.warning("Consumer task %s failed: %s", task, exc)
+
+
+class Pipeline:
+    """Producer pool and consumer pool joined by a bounded queue.
+
+    Consumers start before the first producer so details are scraped as soon as
+    links arrive. Once every producer has finished, one stop sentinel per
+    consumer is queued behind the remaining tasks, so both stages drain before
+    run returns.
+    """
+
+    def __init__(
+        self,
+        produce,
+        consume,
+        producers=2,
+        consumers=2,
+        maxsize=100,
+        initializer=None,
+        producer_initargs=(),
+        consumer_initargs=(),
+    ):
+        self.produce = produce
+        self.consume = consume
+        self.producers = producers
+        self.consumers = consumers
+        self.maxsize = maxsize
+        self.initializer = initializer
+        self.producer_initargs = producer_initargs
+        self.consumer_initargs = consumer_initargs
+
+    def error_handler(self, e):
+        """Producer Error Callback"""
+        logging.warning("Producer failed %s", e)
+
+    def run(self, items, tasks=()):
+        """Produce from every item, plus tasks left over from an earlier run.
+
+        Returns (tasks produced, tasks consumed, tasks failed).
+        """
+        started = time.monotonic()
+        with Manager() as manager:
+            task_queue = manager.Queue(self.maxsize)
+            with Pool(
+                self.consumers,
+                initializer=self.initializer,
+                initargs=self.consumer_initargs,
+            ) as consumer_pool, Pool(
+                self.producers,
+                initializer=self.initializer,
+                initargs=self.producer_initargs,
+            ) as producer_pool:
+                consumed = [
+                    consumer_pool.apply_async(consume_tasks, (self.consume, task_queue))
+                    for _ in range(self.consumers)
+                ]
+                produced = [
+                    producer_pool.apply_async(
+                        produce_tasks,
+                        (self.produce, item, task_queue),
+                        error_callback=self.error_handler,
+                    )
+                    for item in items
+                ]
+                producer_pool.close()
+                for task in tasks:
+                    task_queue.put(task)
+                producer_pool.join()
+                for _ in range(self.consumers):
+                    task_queue.put(STOP)
+                consumer_pool.close()
+                consumer_pool.join()
+                total = sum(r.get() for r in produced if r.successful())
+                results = [r.get() for r in consumed if r.successful()]
+        done = sum(d for d, _ in results)
+        failed = sum(f for _, f in results)
+        logging.warning(
+            "Pipeline produced %s tasks, consumed %s, failed %s in %.0fs",
+            total + len(tasks),
+            done,
+            failed,
+            time.monotonic() - started,
+        )
+        return total + len(tasks), done, failed
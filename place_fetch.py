@@ -0,0 +1,172 @@
+"""
+Browserless place page fetches over a pooled keep-alive HTTP client
+"""
+import asyncio
+import logging
+import os
+import re
+from multiprocessing.util import Finalize
+import aiohttp
+from lxml import etree
+from geo_point import find_point
+from place_parser import parse_tree, place_from_tree, build_place
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/105.0.0.0 Safari/537.36"
+    ),
+    "Accept-Language": "en-US,en;q=0.9",
+}
+REQUIRED_FIELDS = ("title", "address", "point")
+# The women-owned badge is usually rendered client side, so a raw page without it
+# cannot tell "not women-owned" from "not rendered". Only searches that depend on
+# the badge require it, paying for a browser render on most places.
+BADGE_FIELDS = REQUIRED_FIELDS + ("women_owned",)
+
+META_TITLE = etree.XPath(
+    'string((//meta[@property="og:title"] | //meta[@itemprop="name"])[1]/@content)',
+    smart_strings=False,
+)
+META_DESCRIPTION = etree.XPath(
+    'string((//meta[@property="og:description"] | //meta[@itemprop="description"])'
+    "[1]/@content)",
+    smart_strings=False,
+)
+PHONE_PATTERN = re.compile(r"tel:\+(\d{6,15})")
+RATING_PATTERN = re.compile(r"(\d\.\d)\s*\((\d[\d,]*)\)")
+WOMEN_OWNED_PATTERN = re.compile(r"women-owned", re.IGNORECASE)
+WOMEN_OWNED_SEARCH = re.compile(r"women[\s_-]*owned", re.IGNORECASE)
+FETCH_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, UnicodeDecodeError)
+
+
+def parse_fetched(page):
+    """(place, point) from a raw place page response.
+
+    Rendered markup is parsed with the same selectors as page_source, then the
+    meta tags and embedded page state fill what the raw response does not
+    render: "Name · Address" titles, "rating (reviews) · category" descriptions
+    and tel: links. women_owned is None (unknown) unless the badge text is
+    somewhere in the response.
+    """
+    try:
+        tree = parse_tree(page)
+    except (etree.ParserError, ValueError) as exc:
+        logging.warning("Fetched page parse failed: %s", exc)
+        return build_place({}), None
+    place = place_from_tree(tree)
+    parts = [part.strip() for part in META_TITLE(tree).split("·")]
+    if place["title"] is None and parts[0]:
+        place["title"] = parts[0]
+    if place["address"] is None and len(parts) > 1:
+        place["address"] = parts[-1]
+    description = [part.strip() for part in META_DESCRIPTION(tree).split("·")]
+    rating = RATING_PATTERN.search(description[0])
+    if place["rating"] is None and rating:
+        place["rating"] = rating.group(1)
+        place["num_reviews"] = rating.group(2).replace(",", "")
+    if place["category"] is None and len(description) > 1:
+        place["category"] = description[-1]
+    phone = PHONE_PATTERN.search(page)
+    if place["number"] is None and phone:
+        place["number"] = phone.group(1)
+    if place["women_owned"] == "False":
+        women_owned = WOMEN_OWNED_PATTERN.search(page)
+        place["women_owned"] = "Listed on Google" if women_owned else None
+    return place, find_point(page)
+
+
+def required_fields(search_term):
+    """Fields a fetched page must have for a search, the badge only when the
+    search is about it"""
+    if WOMEN_OWNED_SEARCH.search(search_term or ""):
+        return BADGE_FIELDS
+    return REQUIRED_FIELDS
+
+
+def missing_fields(place, point, required=REQUIRED_FIELDS):
+    """Required fields the fetched page did not have"""
+    return [
+        field
+        for field in required
+        if (point if field == "point" else place.get(field)) is None
+    ]
+
+
+class PlaceFetcher:
+    """Keep-alive aiohttp session on this process's own event loop.
+
+    fetch and fetch_many are synchronous so pool workers can call them like any
+    other task; the session and its connections live as long as the worker.
+    """
+
+    def __init__(self, concurrency=10, timeout=15.0, headers=None):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.headers = headers or HEADERS
+        self.loop = asyncio.new_event_loop()
+        self.session = None
+
+    async def _session(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(
+                    limit=self.concurrency, keepalive_timeout=60
+                ),
+            )
+        return self.session
+
+    async def _fetch(self, url):
+        session = await self._session()
+        async with session.get(url) as response:
+            response.raise_for_status()
+            return await response.text()
+
+    async def _fetch_many(self, urls):
+        async def fetch_or_none(url):
+            try:
+                return await self._fetch(url)
+            except FETCH_ERRORS as exc:
+                logging.warning("Fetch failed %s: %s", url, exc)
+                return None
+
+        return await asyncio.gather(*(fetch_or_none(url) for url in urls))
+
+    def fetch(self, url):
+        """Response text of one url, raising on HTTP and connection errors"""
+        return self.loop.run_until_complete(self._fetch(url))
+
+    def fetch_many(self, urls):
+        """Response texts of many urls fetched concurrently, None for each failure"""
+        return self.loop.run_until_complete(self._fetch_many(urls))
+
+    def place(self, url, required=REQUIRED_FIELDS):
+        """(place, point, missing fields) of a place page, all fields missing on error"""
+        try:
+            page = self.fetch(url)
+        except FETCH_ERRORS as exc:
+            logging.warning("Fetch failed %s: %s", url, exc)
+            return build_place({}), None, list(required)
+        place, point = parse_fetched(page)
+        return place, point, missing_fields(place, point, required)
+
+    def close(self):
+        if self.session is not None:
+            self.loop.run_until_complete(self.session.close())
+            self.session = None
+        self.loop.close()
+
+
+_fetchers = {}
+
+
+def place_fetcher(**kwargs):
+    """PlaceFetcher owned by this process, closed when the worker exits"""
+    fetcher = _fetchers.get(os.getpid())
+    if fetcher is None:
+        fetcher = PlaceFetcher(**kwargs)
+        Finalize(fetcher, fetcher.close, exitpriority=10)
+        _fetchers[os.getpid()] = fetcher
+    return fetcher
@@ -0,0 +1,231 @@
+"""
+Place detail extraction from a single Google Maps page_source or in-page script snapshot
+"""
+import json
+import logging
+import pandas as pd
+from lxml import etree, html
+from geo_point import PLACE_URL, POINT_PATTERN
+from enrichment import DAYS
+
+PATHS = {
+    "title": 'normalize-space(//h1[@class = "DUwDvf fontHeadlineLarge"])',
+    "category": 'normalize-space(//button[contains(@jsaction, "pane.rating.category")])',
+    "address": "string(//*[@data-item-id='address']/@aria-label)",
+    "phone": "string(//*[@data-tooltip='Copy phone number']/@data-item-id)",
+    "website": "string(//*[@data-item-id='authority']/@aria-label)",
+    "reserve": 'normalize-space(//div[contains(@class, "m6QErb tLjsW UhIuC")])',
+}
+RATING_PATH = "//div[contains(@jsaction, 'pane.rating.moreReviews')]"
+WOMEN_OWNED_PATH = 'boolean(//span[contains(., "women-owned")])'
+
+TITLE = etree.XPath(PATHS["title"], smart_strings=False)
+CATEGORY = etree.XPath(PATHS["category"], smart_strings=False)
+ADDRESS = etree.XPath(PATHS["address"], smart_strings=False)
+PHONE = etree.XPath(PATHS["phone"], smart_strings=False)
+WEBSITE = etree.XPath(PATHS["website"], smart_strings=False)
+RESERVE = etree.XPath(PATHS["reserve"], smart_strings=False)
+RATING = etree.XPath(RATING_PATH)
+WOMEN_OWNED = etree.XPath(WOMEN_OWNED_PATH)
+
+PLACE_FIELDS = [
+    "title",
+    "category",
+    "address",
+    "number",
+    "website",
+    "rating",
+    "num_reviews",
+    "reservable",
+    "women_owned",
+]
+
+ATTRIBUTE_COLUMNS = [
+    "Description",
+    "Accessibility",
+    "Activities",
+    "Amenities",
+    "Atmosphere",
+    "Crowd",
+    "Dining options",
+    "Highlights",
+    "Offerings",
+    "Offerings: languages spoken",
+    "Payments",
+    "Planning",
+    "Popular for",
+    "Service options",
+]
+
+# Runs the same XPaths as parse_place in the browser. arguments are the timeout
+# in ms for the attributes pane to open and the async callback.
+SNAPSHOT_JS = """
+const [timeout, done] = arguments;
+const paths = %(paths)s;
+const string = (path) => document.evaluate(
+    path, document, null, XPathResult.STRING_TYPE, null).stringValue;
+const node = (path) => document.evaluate(
+    path, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+const nodes = (path) => {
+    const found = document.evaluate(
+        path, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    return Array.from({length: found.snapshotLength}, (_, i) => found.snapshotItem(i));
+};
+const snapshot = {};
+for (const [name, path] of Object.entries(paths)) snapshot[name] = string(path);
+const rating = node(%(rating)s);
+snapshot.rating_lines = rating
+    ? rating.innerText.split("\\n").map(line => line.trim()).filter(Boolean) : [];
+snapshot.women_owned = document.evaluate(
+    %(women_owned)s, document, null, XPathResult.BOOLEAN_TYPE, null).booleanValue;
+const html = document.documentElement.innerHTML;
+const point = new RegExp(%(point)s).exec(
+    html.slice(Math.max(0, html.indexOf(%(place_url)s))));
+snapshot.point = point ? [point[1], point[2]] : null;
+snapshot.attributes = null;
+const expand = node('//button[contains(@jsaction, "pane.attributes.expand")]');
+if (!expand) { done(snapshot); return; }
+expand.click();
+const started = Date.now();
+const poll = () => {
+    const regions = nodes('//div[contains(@role, "region")]');
+    if (!regions.length && Date.now() - started < timeout) {
+        setTimeout(poll, 100);
+        return;
+    }
+    const description = node('//span[@class = "HlvSq"]');
+    snapshot.attributes = {
+        description: description ? description.innerText : null,
+        regions: regions.map(region => ({
+            label: region.getAttribute("aria-label") || "",
+            values: Array.from(region.querySelectorAll("span"))
+                .map(span => span.getAttribute("aria-label")),
+        })),
+    };
+    const back = node('//button[contains(@jsaction, "pane.header.back")]');
+    if (back) back.click();
+    done(snapshot);
+};
+poll();
+"""
+
+
+def parse_tree(page_source):
+    """Parse a page_source string once so every selector runs on the same tree"""
+    return html.fromstring(page_source)
+
+
+def element_lines(element):
+    """Non-empty text lines of an element, close to what WebElement.text returns"""
+    return [text.strip() for text in element.itertext() if text.strip()]
+
+
+def parse_place(page_source):
+    """Extract the place detail fields from a page_source snapshot without WebDriver calls"""
+    try:
+        tree = parse_tree(page_source)
+    except (etree.ParserError, ValueError) as exc:
+        logging.warning("Page source parse failed: %s", exc)
+        return build_place({})
+    return place_from_tree(tree)
+
+
+def place_from_tree(tree):
+    """Place fields from an already parsed page"""
+    return build_place(raw_from_tree(tree))
+
+
+def raw_from_tree(tree):
+    """Raw selector results of a parsed page, the shape snapshot_script returns"""
+    ratings = RATING(tree)
+    return {
+        "title": TITLE(tree),
+        "category": CATEGORY(tree),
+        "address": ADDRESS(tree),
+        "phone": PHONE(tree),
+        "website": WEBSITE(tree),
+        "reserve": RESERVE(tree),
+        "rating_lines": element_lines(ratings[0]) if ratings else [],
+        "women_owned": WOMEN_OWNED(tree),
+    }
+
+
+def build_place(raw):
+    """Place fields from the raw selector results of a page_source or script snapshot"""
+    place = dict.fromkeys(PLACE_FIELDS)
+    place["title"] = raw.get("title") or None
+    place["category"] = raw.get("category") or None
+
+    address = raw.get("address") or ""
+    if " " in address:
+        place["address"] = address.split(" ", 1)[1]
+
+    phone = raw.get("phone") or ""
+    if "+" in phone:
+        place["number"] = phone.split("+", 1)[1]
+
+    website = (raw.get("website") or "").split()
+    if len(website) > 1:
+        place["website"] = website[1]
+
+    place["reservable"] = (raw.get("reserve") or "").upper() == "RESERVE A TABLE"
+
+    lines = raw.get("rating_lines") or []
+    if lines:
+        place["rating"] = lines[0]
+    if len(lines) > 1:
+        place["num_reviews"] = lines[1].split(" ")[0]
+
+    place["women_owned"] = "Listed on Google" if raw.get("women_owned") else "False"
+    return place
+
+
+def parse_open_hours(label):
+    """One row of Sunday_hours..Saturday_hours from the 'Hide open hours for the
+    week' aria-label, e.g. 'Monday, 7AM to 5PM; Tuesday, ...'"""
+    open_hours = " ".join(label.replace(".", "").split()[:-6])
+    hours_dict = dict(hours.split(", ", 1) for hours in open_hours.split("; "))
+    hours_df = pd.DataFrame({day: [hours] for day, hours in hours_dict.items()})
+    hours_df.columns = [day.split()[0] for day in list(hours_df.columns)]
+    hours_df = hours_df[DAYS]
+    return hours_df.rename(columns={day: day + "_hours" for day in DAYS})
+
+
+def attributes_frame(description, regions):
+    """One row DataFrame of the attributes pane from its description and
+    (aria-label, [span aria-labels]) regions"""
+    headers = ["Description"]
+    values = [description]
+    for label, spans in regions:
+        if "Available search" in label:
+            continue
+        headers.append(label)
+        values.append([spans])
+    return pd.DataFrame(dict(zip(headers, values)), columns=ATTRIBUTE_COLUMNS)
+
+
+def snapshot_script():
+    """Async script returning every place field, the coordinates and, when the
+    place has an attributes pane, its description and regions in one call"""
+    return SNAPSHOT_JS % {
+        "paths": json.dumps(PATHS),
+        "rating": json.dumps(RATING_PATH),
+        "women_owned": json.dumps(WOMEN_OWNED_PATH),
+        "place_url": json.dumps(PLACE_URL),
+        "point": json.dumps(POINT_PATTERN.pattern),
+    }
+
+
+def parse_snapshot(snapshot):
+    """(place, point, attributes DataFrame or None) from snapshot_script's result"""
+    place = build_place(snapshot)
+    point = snapshot.get("point")
+    if point:
+        point = float(point[0]), float(point[1])
+    attributes = snapshot.get("attributes")
+    if attributes is not None:
+        attributes = attributes_frame(
+            attributes["description"],
+            [(region["label"], region["values"]) for region in attributes["regions"]],
+        )
+    return place, point or None, attributes
@@ -0,0 +1,317 @@
+"""
+Browser-free WebDriver that replays recorded Google Maps DOM snapshots
+"""
+import json
+import time
+from collections import Counter
+from pathlib import Path
+from lxml import etree, html
+from selenium.common.exceptions import (
+    InvalidSelectorException,
+    NoSuchElementException,
+)
+from selenium.webdriver.common.by import By
+from geo_point import find_point
+from place_parser import element_lines, raw_from_tree, snapshot_script
+from scroll_engine import END_OF_LIST, FEED_WAIT_JS, LINKS_JS, SCROLL_JS, STATE_JS
+
+FEED_XPATH = '//div[contains(@aria-label, "Results for")]'
+RESULT_ROWS = FEED_XPATH + "/div/div[./a]"
+FEED_CHILDREN = FEED_XPATH + "/*"
+
+# Locators answered by translating them to XPath, as the WebDriver spec does
+LOCATORS = {
+    By.ID: ".//*[@id = {0}]",
+    By.NAME: ".//*[@name = {0}]",
+    By.TAG_NAME: ".//*[local-name() = {0}]",
+    By.CLASS_NAME: './/*[contains(concat(" ", normalize-space(@class), " "), '
+    'concat(" ", {0}, " "))]',
+    By.LINK_TEXT: ".//a[normalize-space(.) = {0}]",
+    By.PARTIAL_LINK_TEXT: ".//a[contains(., {0})]",
+}
+
+# (attribute, substring, pane) rules deciding which recorded pane a click opens
+CLICKS = [
+    ("jsaction", "pane.attributes.expand", "attributes"),
+    ("jsaction", "pane.header.back", "page"),
+    ("aria-label", "Back", "page"),
+    ("data-item-id", "oh", "hours"),
+    ("jsaction", "pane.openhours", "hours"),
+    ("class", "m6QErb tLjsW UhIuC", "booking"),
+]
+
+
+def xpath_literal(text):
+    """XPath string literal for text, with concat() when it has both quote kinds"""
+    if '"' not in text:
+        return f'"{text}"'
+    if "'" not in text:
+        return f"'{text}'"
+    parts = text.split('"')
+    return "concat(" + ", '\"', ".join(f'"{part}"' for part in parts) + ")"
+
+
+class Recording:
+    """Recorded snapshots per url: the page, its panes and its search scrolls.
+
+    On disk a recording is a directory with manifest.json mapping each url to
+    {"page": file, "panes": {"attributes" | "hours" | "booking": file},
+    "scrolls": [file, ...]}, every file being a saved page_source.
+    """
+
+    def __init__(self, pages=None):
+        self.pages = pages or {}
+
+    @classmethod
+    def load(cls, path):
+        path = Path(path)
+        manifest = json.loads((path / "manifest.json").read_text())
+        read = lambda name: (path / name).read_text(encoding="utf-8")
+        pages = {}
+        for url, entry in manifest.items():
+            pages[url] = {
+                "page": read(entry["page"]),
+                "panes": {k: read(v) for k, v in entry.get("panes", {}).items()},
+                "scrolls": [read(name) for name in entry.get("scrolls", [])],
+            }
+        return cls(pages)
+
+    def add(self, url, page, panes=None, scrolls=None):
+        self.pages[url] = {
+            "page": page,
+            "panes": panes or {},
+            "scrolls": scrolls or [],
+        }
+        return self
+
+    def save(self, path):
+        """Write the recording as html files plus manifest.json"""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        manifest = {}
+        for i, (url, entry) in enumerate(self.pages.items()):
+            files = {"page": f"{i}_page.html", "panes": {}, "scrolls": []}
+            (path / files["page"]).write_text(entry["page"], encoding="utf-8")
+            for pane, source in entry["panes"].items():
+                files["panes"][pane] = f"{i}_{pane}.html"
+                (path / files["panes"][pane]).write_text(source, encoding="utf-8")
+            for j, source in enumerate(entry["scrolls"]):
+                files["scrolls"].append(f"{i}_scroll{j}.html")
+                (path / files["scrolls"][-1]).write_text(source, encoding="utf-8")
+            manifest[url] = files
+        (path / "manifest.json").write_text(json.dumps(manifest, indent=2))
+
+
+class ReplayElement:
+    """The subset of WebElement used by GMS/TMS, backed by an lxml element"""
+
+    def __init__(self, driver, element):
+        self._driver = driver
+        self._element = element
+
+    @property
+    def text(self):
+        self._driver.count("element.text")
+        return "\n".join(element_lines(self._element))
+
+    def get_attribute(self, name):
+        self._driver.count("element.get_attribute")
+        return self._element.get(name)
+
+    def click(self):
+        self._driver.count("element.click")
+        self._driver.click(self._element)
+
+    def is_displayed(self):
+        self._driver.count("element.is_displayed")
+        return True
+
+    def is_enabled(self):
+        self._driver.count("element.is_enabled")
+        return True
+
+    def find_element(self, by=By.XPATH, value=None):
+        self._driver.count("element.find_element")
+        return self._driver.first(self._driver.select(by, value, self._element))
+
+    def find_elements(self, by=By.XPATH, value=None):
+        self._driver.count("element.find_elements")
+        return self._driver.wrap(self._driver.select(by, value, self._element))
+
+
+class ReplayDriver:
+    """Fake WebDriver over a Recording that counts every call.
+
+    Clicks switch between the recorded panes, search scrolls step through the
+    recorded scroll snapshots, and the in-page scripts of ScrollEngine and
+    snapshot_script are answered from the snapshot with the same XPaths.
+    latency seconds are slept on every driver call.
+    """
+
+    def __init__(self, recording, latency=0.0):
+        self.recording = recording
+        self.latency = latency
+        self.calls = Counter()
+        self.current_url = "about:blank"
+        self._entry = None
+        self._pane = "page"
+        self._scroll = 0
+        self._tree = html.fromstring("<html></html>")
+        self._snapshot_script = snapshot_script()
+
+    def count(self, name):
+        self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _source(self):
+        if self._entry is None:
+            return "<html></html>"
+        if self._pane == "page" and self._scroll and self._entry["scrolls"]:
+            return self._entry["scrolls"][self._scroll - 1]
+        return self._entry["panes"].get(self._pane, self._entry["page"])
+
+    def _render(self):
+        self._tree = html.fromstring(self._source())
+
+    def get(self, url):
+        self.count("get")
+        self.current_url = url
+        self._entry = self.recording.pages.get(url)
+        self._pane = "page"
+        self._scroll = 0
+        self._render()
+
+    def refresh(self):
+        self.count("refresh")
+        self.get(self.current_url)
+
+    @property
+    def page_source(self):
+        self.count("page_source")
+        return self._source()
+
+    def select(self, by, value, root=None):
+        """Elements matching a locator, raising InvalidSelectorException like
+        WebDriver for a malformed one"""
+        root = self._tree if root is None else root
+        if by == By.CSS_SELECTOR:
+            try:
+                from lxml.cssselect import CSSSelector
+            except ImportError as exc:
+                raise InvalidSelectorException(
+                    "CSS selectors need the cssselect package"
+                ) from exc
+            try:
+                return CSSSelector(value)(root)
+            except Exception as exc:
+                raise InvalidSelectorException(f"Invalid CSS selector {value}") from exc
+        if by in LOCATORS:
+            value, by = LOCATORS[by].format(xpath_literal(value)), By.XPATH
+        if by != By.XPATH:
+            raise InvalidSelectorException(f"Unknown locator strategy {by}")
+        try:
+            return root.xpath(value)
+        except etree.XPathError as exc:
+            raise InvalidSelectorException(f"Invalid XPath {value}") from exc
+
+    def wrap(self, elements):
+        return [ReplayElement(self, e) for e in elements if hasattr(e, "tag")]
+
+    def first(self, elements):
+        found = self.wrap(elements)
+        if not found:
+            raise NoSuchElementException("No recorded element matches")
+        return found[0]
+
+    def find_element(self, by=By.XPATH, value=None):
+        self.count("find_element")
+        return self.first(self.select(by, value))
+
+    def find_elements(self, by=By.XPATH, value=None):
+        self.count("find_elements")
+        return self.wrap(self.select(by, value))
+
+    def click(self, element):
+        """Open the pane a recorded click leads to, if it was recorded"""
+        if self._entry is None:
+            return
+        for attribute, text, pane in CLICKS:
+            if text in (element.get(attribute) or ""):
+                if pane == "page" or pane in self._entry["panes"]:
+                    self._pane = pane
+                    self._render()
+                return
+
+    def feed_state(self):
+        children = self._tree.xpath(FEED_CHILDREN)[-3:]
+        return {
+            "feed": bool(self._tree.xpath(FEED_XPATH)),
+            "count": len(self._tree.xpath(RESULT_ROWS)),
+            "eol": any(END_OF_LIST in child.text_content() for child in children),
+        }
+
+    def place_snapshot(self):
+        snapshot = raw_from_tree(self._tree)
+        point = find_point(self._source())
+        snapshot["point"] = [str(point[0]), str(point[1])] if point else None
+        snapshot["attributes"] = None
+        if self._entry is not None and "attributes" in self._entry["panes"]:
+            pane = html.fromstring(self._entry["panes"]["attributes"])
+            description = pane.xpath('//span[@class = "HlvSq"]')
+            snapshot["attributes"] = {
+                "description": description[0].text_content() if description else None,
+                "regions": [
+                    {
+                        "label": region.get("aria-label") or "",
+                        "values": [
+                            span.get("aria-label") for span in region.iter("span")
+                        ],
+                    }
+                    for region in pane.xpath('//div[contains(@role, "region")]')
+                ],
+            }
+        return snapshot
+
+    def execute_script(self, script, *args):
+        self.count("execute_script")
+        if script == STATE_JS:
+            return self.feed_state()
+        if script == LINKS_JS:
+            return [
+                row.xpath("./a")[0].get("href") for row in self._tree.xpath(RESULT_ROWS)
+            ]
+        return None
+
+    def execute_async_script(self, script, *args):
+        self.count("execute_async_script")
+        if script == SCROLL_JS:
+            if self._entry is not None and self._scroll < len(self._entry["scrolls"]):
+                self._scroll += 1
+                self._render()
+            return self.feed_state()
+        if script == FEED_WAIT_JS:
+            return self.feed_state()["feed"]
+        if script == self._snapshot_script:
+            return self.place_snapshot()
+        return None
+
+    def execute_cdp_cmd(self, cmd, params):
+        self.count("execute_cdp_cmd")
+        return {}
+
+    def get_log(self, log_type):
+        self.count("get_log")
+        return []
+
+    def set_script_timeout(self, seconds):
+        self.count("set_script_timeout")
+
+    def implicitly_wait(self, seconds):
+        self.count("implicitly_wait")
+
+    def delete_all_cookies(self):
+        self.count("delete_all_cookies")
+
+    def quit(self):
+        self.count("quit")
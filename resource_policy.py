@@ -0,0 +1,146 @@
+"""
+Network level resource blocking profiles for search and place pages
+"""
+import json
+import logging
+import weakref
+from fnmatch import fnmatchcase
+
+# URL patterns per resource category, in Network.setBlockedURLs wildcard syntax
+CATEGORIES = {
+    "tiles": (
+        "*/maps/vt*",
+        "*/maps/vt/*",
+        "*/kh/v=*",
+        "*khms*.google.com*",
+        "*/maps/api/js/*Tile*",
+    ),
+    "photos": (
+        "*.googleusercontent.com/*",
+        "*/maps/photometa/*",
+        "*streetviewpixels-pa.googleapis.com*",
+    ),
+    "images": ("*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.ico*"),
+    "fonts": ("*.woff2*", "*.woff*", "*.ttf*", "*fonts.gstatic.com*"),
+    "analytics": (
+        "*google-analytics.com*",
+        "*googletagmanager.com*",
+        "*doubleclick.net*",
+        "*/gen_204*",
+        "*/log204*",
+        "*play.google.com/log*",
+    ),
+    "media": ("*.mp4*", "*.webm*", "*.m3u8*"),
+}
+
+PROFILES = {
+    "none": (),
+    "links-only": ("tiles", "photos", "images", "fonts", "analytics", "media"),
+    "details": ("tiles", "photos", "fonts", "analytics", "media"),
+}
+
+# Typical transfer size of one request per category, used to estimate the bytes
+# a blocked request would have cost since it never reports a size
+ESTIMATED_BYTES = {
+    "tiles": 20000,
+    "photos": 40000,
+    "images": 5000,
+    "fonts": 30000,
+    "analytics": 1000,
+    "media": 500000,
+}
+
+
+def category(url):
+    """Resource category of a url, or None if no blocklist covers it"""
+    for name, patterns in CATEGORIES.items():
+        if any(fnmatchcase(url, pattern) for pattern in patterns):
+            return name
+    return None
+
+
+def blocked_urls(profile):
+    """URL patterns blocked by a named profile"""
+    if profile not in PROFILES:
+        raise ValueError(f"Resource profile must be one of {', '.join(PROFILES)}")
+    return [pattern for name in PROFILES[profile] for pattern in CATEGORIES[name]]
+
+
+def page_stats(entries):
+    """Requests, bytes and blocked requests from Chrome performance log entries"""
+    urls = {}
+    stats = {"requests": 0, "bytes": 0, "blocked": 0, "saved_bytes": 0}
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, TypeError, ValueError):
+            continue
+        method = message.get("method")
+        params = message.get("params", {})
+        if method == "Network.requestWillBeSent":
+            urls[params.get("requestId")] = params.get("request", {}).get("url", "")
+            stats["requests"] += 1
+        elif method == "Network.loadingFinished":
+            stats["bytes"] += int(params.get("encodedDataLength", 0))
+        elif method == "Network.loadingFailed" and params.get("blockedReason"):
+            stats["blocked"] += 1
+            name = category(urls.get(params.get("requestId"), ""))
+            stats["saved_bytes"] += ESTIMATED_BYTES.get(name, 0)
+    return stats
+
+
+class ResourcePolicy:
+    """Applies blocking profiles to drivers and reports what each page saved.
+
+    Profiles are switched per page on the same session through CDP, so one
+    pooled driver can collect links and then scrape details. Reporting needs the
+    driver to be launched with the performance log enabled.
+    """
+
+    def __init__(self):
+        self.applied = weakref.WeakKeyDictionary()
+        self.totals = dict.fromkeys(
+            ["pages", "requests", "bytes", "blocked", "saved_bytes"], 0
+        )
+
+    def apply(self, driver, profile):
+        """Block the profile's urls on this driver, skipping the call if already set"""
+        if self.applied.get(driver) == profile:
+            return
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd(
+            "Network.setBlockedURLs", {"urls": blocked_urls(profile)}
+        )
+        self.applied[driver] = profile
+
+    def report(self, driver, page):
+        """Log the requests and bytes a page loaded and the ones blocking saved"""
+        try:
+            stats = page_stats(driver.get_log("performance"))
+        except Exception as exc:
+            logging.info("Performance log unavailable: %s", exc)
+            return None
+        self.totals["pages"] += 1
+        for key, value in stats.items():
+            self.totals[key] += value
+        logging.info(
+            "%s: %s requests, %.0f KB loaded, %s blocked, ~%.0f KB saved (%s)",
+            page,
+            stats["requests"],
+            stats["bytes"] / 1024,
+            stats["blocked"],
+            stats["saved_bytes"] / 1024,
+            self.applied.get(driver),
+        )
+        return stats
+
+
+_resource_policy = None
+
+
+def resource_policy():
+    """ResourcePolicy shared by every driver in this process"""
+    global _resource_policy
+    if _resource_policy is None:
+        _resource_policy = ResourcePolicy()
+    return _resource_policy
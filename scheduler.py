@@ -0,0 +1,201 @@
+"""
+Rate limited scheduler for search and place page work
+"""
+import logging
+import time
+from collections import deque
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, BrokenExecutor, wait
+from urllib.parse import urlparse
+
+SEARCH = "search"
+PLACE = "place"
+
+
+def origin(url):
+    """scheme://host of a url, the unit requests are rate limited by"""
+    parts = urlparse(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class TokenBucket:
+    """rate tokens per second, holding at most burst"""
+
+    def __init__(self, rate, burst=1, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+
+    def take(self):
+        """Take a token and return 0, or return the seconds until one is available"""
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # tolerance so a fake clock advanced by the returned delay always refills
+        if self.tokens >= 1 - 1e-9:
+            self.tokens = max(0.0, self.tokens - 1)
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class Scheduler:
+    """Submits search and place jobs to an executor without bursts.
+
+    Jobs alternate between searches and places so neither starves the other,
+    each origin has its own token bucket, and at most max_in_flight futures are
+    outstanding (or the limit of a ConcurrencyController, when one is given).
+    A finished search returns its (search, link) place tasks, which join the
+    place queue. clock and sleep can be swapped for a fake target.
+
+    A worker that dies (a browser killed for memory) breaks a process pool and
+    fails every job in flight. The pool is replaced by executor_factory up to
+    max_restarts times, otherwise the run stops with the jobs still queued.
+    """
+
+    def __init__(
+        self,
+        executor,
+        search_func,
+        place_func,
+        rate=0.5,
+        burst=2,
+        max_in_flight=10,
+        clock=time.monotonic,
+        sleep=time.sleep,
+        controller=None,
+        executor_factory=None,
+        max_restarts=3,
+    ):
+        self.executor = executor
+        self.executor_factory = executor_factory
+        self.max_restarts = max_restarts
+        self.restarts = 0
+        self.broken = False
+        self.funcs = {SEARCH: search_func, PLACE: place_func}
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.clock = clock
+        self.sleep = sleep
+        self.controller = controller
+        self.queues = {SEARCH: deque(), PLACE: deque()}
+        self.buckets = {}
+        self.in_flight = {}
+        self.turn = SEARCH
+        self.stats = {
+            SEARCH: {"done": 0, "failed": 0},
+            PLACE: {"done": 0, "failed": 0},
+        }
+
+    def add_searches(self, searches):
+        self.queues[SEARCH].extend((search,) for search in searches)
+
+    def add_places(self, tasks):
+        """Queue (search, link) place tasks"""
+        self.queues[PLACE].extend(tasks)
+
+    def bucket(self, url):
+        key = origin(url)
+        if key not in self.buckets:
+            self.buckets[key] = TokenBucket(self.rate, self.burst, self.clock)
+        return self.buckets[key]
+
+    def next_job(self):
+        """Next (kind, args) taking turns between kinds, or None when both are empty"""
+        for kind in (self.turn, PLACE if self.turn == SEARCH else SEARCH):
+            if self.queues[kind]:
+                self.turn = PLACE if kind == SEARCH else SEARCH
+                return kind, self.queues[kind].popleft()
+        return None
+
+    def url(self, kind, args):
+        """The url a job requests: the search itself or the place link"""
+        return args[0] if kind == SEARCH else args[-1]
+
+    def submit(self, kind, args):
+        """Wait for the origin's token, then submit the job"""
+        delay = self.bucket(self.url(kind, args)).take()
+        while delay > 0:
+            self.sleep(delay)
+            delay = self.bucket(self.url(kind, args)).take()
+        try:
+            future = self.executor.submit(self.funcs[kind], *args)
+        except BrokenExecutor:
+            self.queues[kind].appendleft(args)
+            self.broken = True
+            return None
+        self.in_flight[future] = (kind, args, self.clock())
+        return future
+
+    def collect(self, futures):
+        """Record finished futures, queueing the place tasks of finished searches"""
+        for future in futures:
+            kind, args, started = self.in_flight.pop(future)
+            try:
+                result = future.result()
+            except Exception as exc:
+                if self.controller is not None:
+                    self.controller.record(self.clock() - started, ok=False)
+                self.stats[kind]["failed"] += 1
+                self.broken = self.broken or isinstance(exc, BrokenExecutor)
+                logging.warning("%s job %s failed: %s", kind, args[-1], exc)
+                continue
+            self.stats[kind]["done"] += 1
+            if self.controller is not None:
+                self.controller.record(self.clock() - started)
+            if kind == SEARCH and result:
+                self.add_places(result)
+
+    def limit(self):
+        """Jobs allowed in flight right now"""
+        if self.controller is None:
+            return self.max_in_flight
+        return self.controller.adjust()
+
+    def restart(self):
+        """Replace a broken executor once its jobs are collected, False when the
+        run has to stop instead"""
+        done, _ = wait(list(self.in_flight), return_when=ALL_COMPLETED)
+        self.collect(done)
+        if self.executor_factory is None or self.restarts >= self.max_restarts:
+            return False
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = self.executor_factory()
+        self.restarts += 1
+        self.broken = False
+        logging.warning(
+            "Executor broke, replaced it (%s of %s)", self.restarts, self.max_restarts
+        )
+        return True
+
+    def run(self):
+        """Run until every queued job and every job it produced has finished"""
+        first = self.executor
+        try:
+            while True:
+                if self.broken and not self.restart():
+                    logging.warning(
+                        "Executor broke, stopping with %s searches and %s places queued",
+                        len(self.queues[SEARCH]),
+                        len(self.queues[PLACE]),
+                    )
+                    break
+                limit = self.limit()
+                while len(self.in_flight) < limit and not self.broken:
+                    job = self.next_job()
+                    if job is None:
+                        break
+                    self.submit(*job)
+                if self.broken:
+                    continue
+                if not self.in_flight:
+                    break
+                done, _ = wait(list(self.in_flight), return_when=FIRST_COMPLETED)
+                self.collect(done)
+        finally:
+            # replacements are owned here, the first executor by the caller
+            if self.executor is not first:
+                self.executor.shutdown(wait=True)
+        logging.warning("Scheduler finished: %s", self.stats)
+        return self.stats
@@ -0,0 +1,130 @@
+"""
+Event driven scrolling of a Google Maps results feed
+"""
+import logging
+
+FEED = 'div[aria-label*="Results for"]'
+END_OF_LIST = "You've reached the end of the list"
+
+# Shared by every script: the feed, its result rows and the end of list marker.
+# Only the last few children of the feed are read for the marker, never the page.
+FEED_STATE = """
+const feed = document.querySelector(%r);
+const rows = () => feed ? Array.from(feed.querySelectorAll(':scope > div > div'))
+    .filter(row => row.querySelector(':scope > a')) : [];
+const state = () => ({
+    feed: !!feed,
+    count: rows().length,
+    eol: !!feed && Array.from(feed.children).slice(-3)
+        .some(child => child.textContent.includes(%r)),
+});
+""" % (
+    FEED,
+    END_OF_LIST,
+)
+
+STATE_JS = FEED_STATE + "return state();"
+
+SCROLL_JS = (
+    FEED_STATE
+    + """
+const [last, timeout, nudge, done] = arguments;
+if (!feed) { done(state()); return; }
+let timer = null;
+const observer = new MutationObserver(() => {
+    const now = state();
+    if (now.count !== last || now.eol) finish();
+});
+const finish = () => { observer.disconnect(); clearTimeout(timer); done(state()); };
+observer.observe(feed, {childList: true, subtree: true});
+timer = setTimeout(finish, timeout);
+if (nudge) feed.scrollTop = Math.max(0, feed.scrollTop - 400);
+const items = rows();
+if (items.length) items[items.length - 1].scrollIntoView(true);
+feed.scrollTop = feed.scrollHeight;
+"""
+)
+
+# The feed renders after driver.get returns, so wait for it before scrolling
+FEED_WAIT_JS = """
+const [timeout, done] = arguments;
+const find = () => document.querySelector(%r);
+if (find()) { done(true); return; }
+let timer = null;
+const observer = new MutationObserver(() => { if (find()) finish(); });
+const finish = () => { observer.disconnect(); clearTimeout(timer); done(!!find()); };
+observer.observe(document, {childList: true, subtree: true});
+timer = setTimeout(finish, timeout);
+""" % (
+    FEED,
+)
+
+LINKS_JS = (
+    FEED_STATE + "return rows().map(row => row.querySelector(':scope > a').href);"
+)
+
+
+class ScrollEngine:
+    """Scrolls the results feed until the end of list or K scrolls without progress.
+
+    Each scroll is one execute_async_script call that returns as soon as a
+    MutationObserver sees the result count change or the end of list marker
+    appear, or after timeout seconds, so there are no fixed sleeps.
+    """
+
+    def __init__(self, timeout=3.0, max_stalls=3, max_scrolls=300):
+        self.timeout = timeout
+        self.max_stalls = max_stalls
+        self.max_scrolls = max_scrolls
+
+    def state(self, driver):
+        """{'feed': feed rendered, 'count': results loaded, 'eol': end of list reached}"""
+        return driver.execute_script(STATE_JS)
+
+    def wait_for_feed(self, driver):
+        """Wait up to timeout for the results feed to render, returning the state"""
+        driver.set_script_timeout(self.timeout + 5)
+        driver.execute_async_script(FEED_WAIT_JS, int(self.timeout * 1000))
+        return self.state(driver)
+
+    def scroll(self, driver, last, nudge=False):
+        """Scroll to the last result and wait for the feed to change"""
+        driver.set_script_timeout(self.timeout + 5)
+        return driver.execute_async_script(
+            SCROLL_JS, last, int(self.timeout * 1000), nudge
+        )
+
+    def run(self, driver):
+        """Scroll until the list ends, returning the final state and scroll count.
+
+        A feed that is not rendered is waited for rather than counted as a stall,
+        and ends the run only if it does not appear within timeout.
+        """
+        state = self.wait_for_feed(driver)
+        scrolls = stalls = 0
+        while (
+            state["feed"]
+            and not state["eol"]
+            and scrolls < self.max_scrolls
+            and stalls < self.max_stalls
+        ):
+            new_state = self.scroll(driver, state["count"], nudge=stalls > 0)
+            scrolls += 1
+            if not new_state["feed"]:
+                state = self.wait_for_feed(driver)
+                continue
+            stalls = 0 if new_state["count"] > state["count"] else stalls + 1
+            state = new_state
+        if not state["feed"]:
+            logging.warning("No results feed after %ss", self.timeout)
+        logging.info(
+            "Scrolled %s times, %s results, end of list: %s",
+            scrolls,
+            state["count"],
+            state["eol"],
+        )
+        return state, scrolls
+
+    def links(self, driver):
+        """Place urls of every loaded result in one script call"""
+        return driver.execute_script(LINKS_JS)
@@ -0,0 +1,67 @@
+"""
+Search planning over zip code centroids
+"""
+import logging
+import numpy as np
+from zip_index import zip_index
+from zip_lookup import find_zipcodes
+
+
+def zip_search_urls(zipcodes, search_term):
+    """Unique, sorted Google Maps search urls for zip codes and a search term"""
+    term = search_term.replace("_", "+").replace(" ", "+")
+    return np.unique(
+        [f"https://www.google.com/maps/search/{z}+{term}" for z in zipcodes]
+    )
+
+
+def place_search_urls(places, search_term):
+    """Unique, sorted search urls for (city, region) pairs and a search term"""
+    term = search_term.replace(" ", "+")
+    return np.unique(
+        [
+            f"https://www.google.com/maps/search/"
+            f"{city.replace(' ', '+')}+{region.replace(' ', '+')}+{term}"
+            for city, region in places
+        ]
+    )
+
+
+class SearchPlanner:
+    """Chooses the zip codes a job should search, by city, radius or polygon"""
+
+    def __init__(self, db_file_path, search_term):
+        self.db_file_path = str(db_file_path)
+        self.search_term = search_term
+
+    @property
+    def index(self):
+        return zip_index(self.db_file_path)
+
+    def city_center(self, city, state):
+        """Mean centroid of a city's zip codes, used when no center is given"""
+        zips = set(find_zipcodes(self.db_file_path, city, state))
+        rows = self.index.zips[self.index.zips.zipcode.isin(zips)]
+        if rows.empty:
+            raise ValueError(f"No zip codes found for {city}, {state}")
+        return float(rows.lat.mean()), float(rows.lng.mean())
+
+    def radius_zipcodes(self, lat, lng, miles):
+        """Zip codes with a centroid within miles of the point"""
+        return self.index.within_radius(lat, lng, miles).zipcode.tolist()
+
+    def polygon_zipcodes(self, polygon):
+        """Zip codes with a centroid inside a [(lat, lng), ...] polygon"""
+        return self.index.within_polygon(polygon).zipcode.tolist()
+
+    def radius_searches(self, lat, lng, miles):
+        """Search urls for every zip within miles of the point"""
+        zipcodes = self.radius_zipcodes(lat, lng, miles)
+        logging.warning("Planned %s zip searches within %s miles", len(zipcodes), miles)
+        return zip_search_urls(zipcodes, self.search_term)
+
+    def polygon_searches(self, polygon):
+        """Search urls for every zip inside the polygon"""
+        zipcodes = self.polygon_zipcodes(polygon)
+        logging.warning("Planned %s zip searches inside polygon", len(zipcodes))
+        return zip_search_urls(zipcodes, self.search_term)
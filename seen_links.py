@@ -0,0 +1,181 @@
+"""
+Cross-search link deduplication with a persisted Bloom filter and an exact SQLite set
+"""
+import hashlib
+import logging
+import math
+import os
+import time
+from multiprocessing.util import Finalize
+from pathlib import Path
+import numpy as np
+from db_writer import connect_sqlite
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen_links (
+    link TEXT PRIMARY KEY,
+    search TEXT,
+    first_seen REAL
+)
+"""
+STATS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen_link_stats (
+    search TEXT,
+    total INTEGER,
+    duplicates INTEGER,
+    checked_at REAL
+)
+"""
+
+
+class BloomFilter:
+    """Fixed size bit array with k hash positions per key from one blake2b digest"""
+
+    def __init__(self, capacity=5000000, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = int(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def positions(self, key):
+        """k bit positions by double hashing, h1 + i * h2 mod size"""
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return np.array(
+            [(h1 + i * h2) % self.size for i in range(self.hashes)], dtype=np.int64
+        )
+
+    def add(self, key):
+        pos = self.positions(key)
+        np.bitwise_or.at(self.bits, pos >> 3, (1 << (pos & 7)).astype(np.uint8))
+
+    def __contains__(self, key):
+        pos = self.positions(key)
+        return bool(np.all(self.bits[pos >> 3] & (1 << (pos & 7)).astype(np.uint8)))
+
+    def save(self, path):
+        """Merge into any filter already on disk and replace it atomically"""
+        path = Path(path)
+        bits = self.bits
+        if path.exists():
+            other = BloomFilter.load(path, self.capacity, self.error_rate)
+            if other is not None:
+                bits = bits | other.bits
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        np.savez(tmp, bits=bits)
+        os.replace(f"{tmp}.npz", path)
+
+    @classmethod
+    def load(cls, path, capacity=5000000, error_rate=0.001):
+        """Filter from disk, or None if it was built with other parameters"""
+        bloom = cls(capacity, error_rate)
+        with np.load(path) as data:
+            if data["bits"].shape != bloom.bits.shape:
+                logging.warning("Bloom filter at %s has other parameters", path)
+                return None
+            bloom.bits = data["bits"]
+        return bloom
+
+
+class SeenLinks:
+    """Memory-compact seen-link set: Bloom filter in memory, exact set on disk.
+
+    A Bloom miss means the link is new to this process and goes straight to an
+    INSERT OR IGNORE; a Bloom hit is confirmed against the exact set. The insert's
+    row count is the final word, so workers sharing the database never both claim
+    the same link.
+    """
+
+    def __init__(self, db_path, bloom_path=None, capacity=5000000, error_rate=0.001):
+        self.db_path = Path(db_path)
+        self.bloom_path = Path(bloom_path or self.db_path.with_suffix(".bloom"))
+        self.bloom = None
+        if self.bloom_path.exists():
+            self.bloom = BloomFilter.load(self.bloom_path, capacity, error_rate)
+        if self.bloom is None:
+            self.bloom = BloomFilter(capacity, error_rate)
+        self.stats = {}
+        self._con = None
+        self._pid = None
+
+    @property
+    def con(self):
+        """SQLite connection opened lazily, and again in a forked child"""
+        if self._con is None or self._pid != os.getpid():
+            self._con = connect_sqlite(self.db_path)
+            self._pid = os.getpid()
+            with self._con:
+                self._con.execute(SCHEMA)
+                self._con.execute(STATS_SCHEMA)
+        return self._con
+
+    def filter_new(self, search, links):
+        """Links not seen by any earlier search, recording them as seen"""
+        now = time.time()
+        new = []
+        candidates = list(dict.fromkeys(link for link in links if link))
+        with self.con:
+            for link in candidates:
+                if (
+                    link in self.bloom
+                    and self.con.execute(
+                        "SELECT 1 FROM seen_links WHERE link = ?", (link,)
+                    ).fetchone()
+                ):
+                    continue
+                cursor = self.con.execute(
+                    "INSERT OR IGNORE INTO seen_links VALUES (?, ?, ?)",
+                    (link, search, now),
+                )
+                self.bloom.add(link)
+                if cursor.rowcount:
+                    new.append(link)
+            duplicates = len(links) - len(new)
+            self.con.execute(
+                "INSERT INTO seen_link_stats VALUES (?, ?, ?, ?)",
+                (search, len(links), duplicates, now),
+            )
+        self.stats[search] = (len(links), duplicates)
+        logging.warning(
+            "Seen links %s: %s new of %s (%.0f%% duplicates)",
+            search,
+            len(new),
+            len(links),
+            100 * duplicates / len(links) if links else 0,
+        )
+        return new
+
+    def duplicate_ratio(self, search=None):
+        """Share of duplicate links for one search, or over all searches seen here"""
+        stats = [self.stats[search]] if search is not None else self.stats.values()
+        total = sum(t for t, _ in stats)
+        return sum(d for _, d in stats) / total if total else 0.0
+
+    def save(self):
+        self.bloom.save(self.bloom_path)
+
+
+_seen_links = {}
+
+
+def seen_links(db_path, **kwargs):
+    """SeenLinks for this process, its Bloom filter saved when the worker exits"""
+    key = (os.getpid(), str(db_path))
+    seen = _seen_links.get(key)
+    if seen is None:
+        seen = SeenLinks(db_path, **kwargs)
+        Finalize(seen, seen.save, exitpriority=5)
+        _seen_links[key] = seen
+    return seen
+
+
+def reset_seen_links(db_path, bloom_path=None):
+    """Forget every seen link, removing the exact set and its Bloom filter"""
+    db_path = Path(db_path)
+    _seen_links.pop((os.getpid(), str(db_path)), None)
+    paths = [db_path, Path(f"{db_path}-wal"), Path(f"{db_path}-shm")]
+    paths.append(Path(bloom_path or db_path.with_suffix(".bloom")))
+    for path in paths:
+        path.unlink(missing_ok=True)
@@ -0,0 +1,53 @@
+"""
+Process-wide SQLAlchemy engines and buffered bulk inserts for TMS results
+"""
+import os
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from buffered_sink import BufferedSink, owned_sink
+
+_engines = {}
+
+
+def cached_engine(url, fast_executemany=True, **kwargs):
+    """One engine and connection pool per url in each process.
+
+    Forked workers must not share pooled connections with their parent, so the
+    process id is part of the cache key. fast_executemany only applies to
+    mssql+pyodbc, any other SQLAlchemy url (e.g. sqlite) works as a stand-in.
+    """
+    key = (os.getpid(), str(url), fast_executemany, tuple(sorted(kwargs.items())))
+    engine = _engines.get(key)
+    if engine is None:
+        if make_url(url).get_backend_name() == "mssql":
+            kwargs["fast_executemany"] = fast_executemany
+        engine = create_engine(url, pool_pre_ping=True, **kwargs)
+        _engines[key] = engine
+    return engine
+
+
+class TableSink(BufferedSink):
+    """Bulk inserts buffered rows into one table"""
+
+    def __init__(self, engine, table, **kwargs):
+        super().__init__(table, **kwargs)
+        self.engine = engine
+        self.table = table
+
+    def write(self, df):
+        """Insert one batch in executemany chunks"""
+        df.to_sql(
+            self.table,
+            self.engine,
+            if_exists="append",
+            index=False,
+            chunksize=self.max_buffer,
+        )
+
+
+def process_sink(engine, table, columns=None, **kwargs):
+    """TableSink owned by this process, flushed by a finalizer when the worker exits"""
+    return owned_sink(
+        (str(engine.url), table),
+        lambda: TableSink(engine, table, columns=columns, **kwargs),
+    )
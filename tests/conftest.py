@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# modules live at the repo root, not in a package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+FIXTURES = Path(__file__).parent / "fixtures"
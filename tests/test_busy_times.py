@@ -0,0 +1,76 @@
+"""
+Busy time parsing and the compact 7x24 form, from the recorded place's bars
+"""
+import numpy as np
+import pytest
+from lxml import html
+from conftest import FIXTURES
+from busy_times import (
+    UNKNOWN,
+    UNKNOWN_BUSY,
+    busy_array,
+    decode_busy,
+    encode_busy,
+    mean_busy,
+    parse_busy_labels,
+)
+from enrichment import CURRENT_HOUR, DAYS
+
+SUNDAY, WEDNESDAY, SATURDAY = 0, 3, 6
+
+
+@pytest.fixture(scope="module")
+def labels():
+    tree = html.parse(str(FIXTURES / "replay" / "cafe_page.html"))
+    bars = tree.xpath('//div[@aria-label="Popular times"]//div[@role="img"]')
+    return [bar.get("aria-label") for bar in bars]
+
+
+def test_parse_busy_labels_keys_each_day_by_hour(labels):
+    days = parse_busy_labels(labels)
+    assert list(days) == DAYS
+    assert all(len(bars) == 18 for bars in days.values())
+    assert days["Sunday"][:2] == [{"6AM": "45%"}, {"7AM": "23%"}]
+    assert days["Sunday"][-1] == {"11PM": "12%"}
+    # the live bar is keyed by the placeholder enrich_places fills
+    assert days["Wednesday"][8] == {CURRENT_HOUR: "68%:92%"}
+    # Saturday has its own bars, not a copy of Friday's
+    assert days["Saturday"][:2] == [{"6AM": "15%"}, {"7AM": "38%"}]
+
+
+def test_busy_array_cells(labels):
+    array = busy_array(labels)
+    assert array.shape == (7, 24)
+    assert (array[:, :6] == UNKNOWN).all()
+    assert array[SUNDAY, 6:10].tolist() == [45, 23, 54, 87]
+    assert array[SUNDAY, 12] == 72
+    assert array[SUNDAY, 23] == 12
+    # the live bar follows 1 PM and stores the usual, not the current, percent
+    assert array[WEDNESDAY, 13:16].tolist() == [30, 92, 72]
+    assert array[SATURDAY, 6:8].tolist() == [15, 38]
+
+
+def test_encode_decode_round_trip(labels):
+    array = busy_array(labels)
+    text = encode_busy(array)
+    assert len(text) == 224
+    assert np.array_equal(decode_busy(text), array)
+    assert (decode_busy(UNKNOWN_BUSY) == UNKNOWN).all()
+    # missing and damaged values decode as unknown rather than failing
+    for value in (None, "", "not base64!", encode_busy(array[:3])):
+        assert (decode_busy(value) == UNKNOWN).all()
+
+
+def test_mean_busy_ignores_unknown_bars(labels):
+    array = busy_array(labels)
+    quieter = array.copy()
+    quieter[SUNDAY, 6] = 25
+    quieter[SUNDAY, 7] = UNKNOWN
+    values = [encode_busy(array), encode_busy(quieter), UNKNOWN_BUSY]
+    mean = mean_busy(values)
+    assert mean.loc["Sunday", 6] == 35
+    assert mean.loc["Sunday", 7] == 23
+    assert np.isnan(mean.loc["Sunday", 0])
+    by_category = mean_busy(values, by=["cafe", "bar", "bar"])
+    assert by_category.loc["cafe", ("Sunday", 6)] == 45
+    assert by_category.loc["bar", ("Sunday", 6)] == 25
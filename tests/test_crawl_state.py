@@ -0,0 +1,43 @@
+import sqlite3
+from crawl_state import FAILED, IN_PROGRESS, PENDING, CrawlState, add_links
+
+
+def add(db_path, links):
+    sql, rows = add_links(links)
+    with sqlite3.connect(db_path) as con:
+        con.executemany(sql, rows)
+
+
+def status(db_path, link):
+    with sqlite3.connect(db_path) as con:
+        return con.execute(
+            "SELECT status, attempts FROM link_state WHERE link = ?", (link,)
+        ).fetchone()
+
+
+def test_interrupted_link_fails_after_max_attempts(tmp_path):
+    db_path = str(tmp_path / "search.db")
+    state = CrawlState(db_path, max_attempts=2).sync()
+    add(db_path, ["a"])
+    assert state.claim() == ["a"]
+    state.sync()
+    assert status(db_path, "a") == (PENDING, 1)
+    assert state.claim() == ["a"]
+    assert status(db_path, "a") == (IN_PROGRESS, 2)
+    state.sync()
+    assert status(db_path, "a") == (FAILED, 2)
+    assert state.claim() == []
+
+
+def test_sync_adds_attempts_to_an_old_state_table(tmp_path):
+    db_path = str(tmp_path / "search.db")
+    with sqlite3.connect(db_path) as con:
+        con.execute(
+            "CREATE TABLE link_state (link TEXT PRIMARY KEY, status TEXT NOT NULL "
+            "DEFAULT 'pending', last_error TEXT, created_at REAL, updated_at REAL)"
+        )
+        con.execute(
+            "INSERT INTO link_state (link, status) VALUES ('a', ?)", (IN_PROGRESS,)
+        )
+    CrawlState(db_path).sync()
+    assert status(db_path, "a") == (PENDING, 0)
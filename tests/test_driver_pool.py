@@ -0,0 +1,76 @@
+import multiprocessing
+import queue
+import threading
+import time
+import pytest
+from driver_pool import DriverPool
+
+
+def failing_factory(images=True):
+    raise RuntimeError("chrome failed to start")
+
+
+failing_pool = DriverPool(failing_factory)
+
+
+def warm_failing_pool():
+    failing_pool.warm()
+
+
+def borrow_task():
+    with failing_pool.borrow():
+        return "scraped"
+
+
+def test_warm_logs_startup_failure_and_borrow_raises():
+    pool = DriverPool(failing_factory)
+    pool.warm()
+    assert pool._created == {True: 0, False: 0}
+    with pytest.raises(RuntimeError, match="chrome failed"):
+        with pool.borrow():
+            pass
+
+
+def test_failed_warm_in_initializer_reaches_the_task():
+    errors = []
+    context = multiprocessing.get_context("fork")
+    with context.Pool(1, initializer=warm_failing_pool) as workers:
+        result = workers.apply_async(borrow_task, (), error_callback=errors.append)
+        with pytest.raises(RuntimeError, match="chrome failed"):
+            result.get(timeout=10)
+    assert len(errors) == 1
+
+
+class FakeDriver:
+    def quit(self):
+        pass
+
+
+def fake_factory(images=True):
+    return FakeDriver()
+
+
+def test_acquire_launches_when_reap_frees_the_slot_it_waits_on():
+    pool = DriverPool(fake_factory, profiles=(True,), idle_timeout=60)
+    driver = pool.acquire()
+    pool._idle[True].put(driver)
+    # reap() has taken the idle driver off the queue but not discarded it yet
+    taken = pool._idle[True].get_nowait()
+    acquired = []
+    waiter = threading.Thread(
+        target=lambda: acquired.append(pool.acquire()), daemon=True
+    )
+    waiter.start()
+    time.sleep(0.1)
+    pool._discard(taken, True)
+    waiter.join(timeout=5)
+    assert not waiter.is_alive()
+    assert acquired and acquired[0] is not driver
+    assert pool._created[True] == 1
+
+
+def test_acquire_times_out_when_the_pool_stays_full():
+    pool = DriverPool(fake_factory, profiles=(True,))
+    pool.acquire()
+    with pytest.raises(queue.Empty):
+        pool.acquire(timeout=0.2)
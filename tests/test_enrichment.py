@@ -0,0 +1,21 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from enrichment import UNKNOWN_HOUR, enrich_places
+
+
+def test_enrich_fills_nan_week_and_clears_unknown_hours():
+    df = pd.DataFrame(
+        {
+            "lat": [34.1, np.nan],
+            "long": [-118.1, np.nan],
+            "week_num": [np.nan, np.nan],
+            "Monday": ["[{'{current_hour}': '1%'}]", "[{'{current_hour}': '5%'}]"],
+            "scraped_dt": [datetime(2026, 10, 17, 14)] * 2,
+        }
+    )
+    enriched = enrich_places(df)
+    assert enriched.loc[0, "week_num"] == "42"
+    assert pd.isna(enriched.loc[1, "week_num"])
+    assert "{current_hour}" not in "".join(enriched["Monday"])
+    assert enriched.loc[1, "Monday"] == f"[{{'{UNKNOWN_HOUR}': '5%'}}]"
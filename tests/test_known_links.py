@@ -0,0 +1,48 @@
+import pandas as pd
+from sqlalchemy import create_engine
+from known_links import ROWS_MARKER, KnownLinks
+
+
+def store(engine, rows):
+    pd.DataFrame(rows, columns=["search", "link"]).to_sql(
+        "places", engine, index=False, if_exists="append"
+    )
+
+
+def test_cache_is_used_while_it_matches_the_table(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'places.sqlite'}")
+    cache = tmp_path / "known_links.tsv"
+    store(engine, [("cafes", "a"), ("cafes", "b")])
+    KnownLinks(engine, "places", cache_path=cache).load()
+    assert cache.read_text().splitlines()[0] == f"{ROWS_MARKER}\t2"
+    # a cache that matches the row count is trusted, even with edits the table lacks
+    with open(cache, "a") as f:
+        f.write("cafes\tcached-only\n")
+    links = KnownLinks(engine, "places", cache_path=cache).load()
+    assert links.links["cafes"] == {"a", "b", "cached-only"}
+
+
+def test_stale_cache_is_reloaded_from_the_table(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'places.sqlite'}")
+    cache = tmp_path / "known_links.tsv"
+    store(engine, [("cafes", "a")])
+    KnownLinks(engine, "places", cache_path=cache).load()
+    # rows written by another machine never reached this cache
+    store(engine, [("cafes", "b"), ("bars", "c")])
+    links = KnownLinks(engine, "places", cache_path=cache).load()
+    assert links.rows == 3
+    assert links.links == {"cafes": {"a", "b"}, "bars": {"c"}}
+    assert KnownLinks(engine, "places", cache_path=cache).load().rows == 3
+
+
+def test_add_keeps_the_cache_count_in_step(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'places.sqlite'}")
+    cache = tmp_path / "known_links.tsv"
+    store(engine, [("cafes", "a")])
+    links = KnownLinks(engine, "places", cache_path=cache).load()
+    store(engine, [("cafes", "b"), ("cafes", "b")])
+    assert links.add("cafes", ["b", "b"], rows=2) == ["b"]
+    reloaded = KnownLinks(engine, "places", cache_path=cache)
+    reloaded.read_cache()
+    assert reloaded.rows == 3
+    assert reloaded.load().links["cafes"] == {"a", "b"}
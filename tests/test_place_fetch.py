@@ -0,0 +1,87 @@
+"""
+PlaceFetcher against a local HTTP server serving saved place pages
+"""
+import functools
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from conftest import FIXTURES
+from gms import GMS
+from place_fetch import BADGE_FIELDS, REQUIRED_FIELDS, PlaceFetcher, required_fields
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    handler = functools.partial(QuietHandler, directory=str(FIXTURES / "fetched"))
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def fetcher():
+    fetcher = PlaceFetcher(timeout=5)
+    yield fetcher
+    fetcher.close()
+
+
+def test_place_from_saved_page(server, fetcher):
+    place, point, missing = fetcher.place(f"{server}/women_owned.html")
+    assert missing == []
+    assert place["title"] == "Cafe X"
+    assert place["address"] == "1 Main St, Pasadena, CA 91101"
+    assert place["rating"] == "4.5"
+    assert place["num_reviews"] == "1204"
+    assert place["category"] == "Coffee shop"
+    assert place["number"] == "15551234567"
+    assert place["women_owned"] == "Listed on Google"
+    assert point == (34.1478, -118.1445)
+
+
+def test_missing_badge_is_unknown(server, fetcher):
+    place, point, missing = fetcher.place(f"{server}/no_badge.html")
+    assert place["title"] == "Bakery Y"
+    assert place["women_owned"] is None
+    assert missing == []
+    _, _, missing = fetcher.place(f"{server}/no_badge.html", BADGE_FIELDS)
+    assert missing == ["women_owned"]
+
+
+def test_badge_is_required_only_by_searches_about_it():
+    assert required_fields("women owned business") == BADGE_FIELDS
+    assert required_fields("women_owned_cafes") == BADGE_FIELDS
+    assert required_fields("coffee shops") == REQUIRED_FIELDS
+
+
+def test_fetched_rows_are_marked(server):
+    row = GMS("coffee shops", fetch=True).fetch_restaurant_data(
+        f"{server}/no_badge.html"
+    )
+    assert row.iloc[0]["extraction"] == "fetch"
+    assert row.iloc[0]["women_owned"] is None
+    assert row.iloc[0]["Monday_hours"] is None
+    badge_search = GMS("women owned business", fetch=True)
+    assert badge_search.fetch_restaurant_data(f"{server}/no_badge.html") is None
+
+
+def test_http_error_misses_every_field(server, fetcher):
+    place, point, missing = fetcher.place(f"{server}/gone.html")
+    assert point is None
+    assert missing == list(REQUIRED_FIELDS)
+
+
+def test_fetch_many_keeps_order_and_failures(server, fetcher):
+    pages = fetcher.fetch_many(
+        [f"{server}/no_badge.html", f"{server}/gone.html", f"{server}/women_owned.html"]
+    )
+    assert "Bakery Y" in pages[0]
+    assert pages[1] is None
+    assert "Cafe X" in pages[2]
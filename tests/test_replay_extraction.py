@@ -0,0 +1,84 @@
+"""
+GMS and TMS place extraction over a recorded place, without a browser
+"""
+import pytest
+from conftest import FIXTURES
+from busy_times import decode_busy
+from gms import GMS
+from tms import TMS
+from replay_driver import Recording, ReplayDriver
+
+LOCATION = {
+    "display_name": "1 Main St, Pasadena",
+    "address": {
+        "city": "Pasadena",
+        "country": "United States",
+        "state": "California",
+        "postcode": "91101",
+    },
+}
+
+
+@pytest.fixture(scope="module")
+def recording():
+    return Recording.load(FIXTURES / "replay")
+
+
+@pytest.fixture
+def url(recording):
+    return next(iter(recording.pages))
+
+
+def assert_place(row, url):
+    assert row["link"] == url
+    assert row["title"] == "Cafe X"
+    assert row["category"] == "Coffee shop"
+    assert row["address"] == "1 Main St, Pasadena, CA 91101"
+    assert row["rating"] == "4.5"
+    assert row["num_reviews"] == "1204"
+    assert row["website"] == "cafex.com"
+    assert (row["lat"], row["long"]) == (34.1478, -118.1445)
+    assert row["booking"] == ["OpenTable", "Resy"]
+    assert row["Description"] == "Neighborhood cafe with pastries"
+    assert row["Service options"] == ["Has outdoor seating", "Offers takeout"]
+    assert row["Sunday_hours"] == "Closed"
+    assert row["Thursday_hours"] == "7 AM to 9 PM"
+    assert row["open_status"] == "Open"
+
+
+@pytest.mark.parametrize("extraction", ["script", "source"])
+def test_gms_extract_restaurant_data(recording, url, extraction):
+    driver = ReplayDriver(recording)
+    gms = GMS("women owned business", extraction=extraction)
+    df = gms.extract_restaurant_data(driver, url)
+    assert len(df) == 1
+    row = df.iloc[0]
+    assert_place(row, url)
+    assert row["women_owned"] == "Listed on Google"
+    assert row["search_term"] == "women owned business"
+    assert row["extraction"] == "browser"
+
+
+@pytest.mark.parametrize("busy_times", ["text", "array"])
+def test_tms_extract_restaurant_data(recording, url, busy_times):
+    driver = ReplayDriver(recording)
+    tms = TMS("places", "restaurants", "us", busy_times=busy_times)
+    tms.reverse_geocode = lambda lat, long: LOCATION
+    df = tms.extract_restaurant_data(driver, url)
+    assert len(df) == 1
+    row = df.iloc[0]
+    assert_place(row, url)
+    assert (row["city"], row["state"], row["postcode"]) == (
+        "Pasadena",
+        "California",
+        "91101",
+    )
+    if busy_times == "array":
+        busy = decode_busy(row["busy"])
+        assert busy[0, 6:10].tolist() == [45, 23, 54, 87]
+        assert busy[1, 6] == 34
+    else:
+        assert "{'6AM': '34%'}" in str(row["Monday"])
+    assert set(tms.columns_order()) - {"search"} <= set(df.columns)
+    # one script call for the place fields instead of an element lookup each
+    assert driver.calls["execute_async_script"] == 1
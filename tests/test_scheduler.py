@@ -0,0 +1,170 @@
+"""
+Scheduler against a local fake target: a fake clock and a thread or process executor
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from scheduler import PLACE, SEARCH, Scheduler
+
+ORIGIN = "https://maps.example.com"
+
+
+class FakeClock:
+    """Clock that only moves when the scheduler sleeps"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class RecordingExecutor(ThreadPoolExecutor):
+    """Thread executor noting the fake time each job is submitted at"""
+
+    def __init__(self, workers, clock):
+        super().__init__(workers)
+        self.clock = clock
+        self.submitted = {}
+
+    def submit(self, func, *args):
+        self.submitted[args[-1]] = self.clock()
+        return super().submit(func, *args)
+
+
+class Target:
+    """Records each request's kind and url, and the peak concurrency"""
+
+    def __init__(self, places_per_search=0):
+        self.places_per_search = places_per_search
+        self.requests = []
+        self.active = self.peak = 0
+        self.lock = threading.Lock()
+        self.release = threading.Event()
+        self.release.set()
+
+    def request(self, kind, url):
+        with self.lock:
+            self.requests.append((kind, url))
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        self.release.wait(5)
+        with self.lock:
+            self.active -= 1
+        if "fail" in url:
+            raise RuntimeError("place page did not load")
+
+    def search(self, search):
+        self.request(SEARCH, search)
+        return [(search, f"{search}/place{i}") for i in range(self.places_per_search)]
+
+    def place(self, search, link):
+        self.request(PLACE, link)
+
+
+def scheduler(target, clock, workers=1, **kwargs):
+    kwargs.setdefault("rate", 1.0)
+    kwargs.setdefault("burst", 1)
+    executor = RecordingExecutor(workers, clock)
+    return executor, Scheduler(
+        executor,
+        target.search,
+        target.place,
+        clock=clock,
+        sleep=clock.sleep,
+        **kwargs,
+    )
+
+
+def test_each_origin_is_limited_to_its_token_rate():
+    clock = FakeClock()
+    target = Target()
+    executor, runner = scheduler(target, clock, rate=2.0)
+    with executor:
+        runner.add_places([(None, f"{ORIGIN}/place0")])
+        runner.add_places([(None, "https://other.example.com/place")])
+        runner.add_places((None, f"{ORIGIN}/place{i}") for i in range(1, 3))
+        runner.run()
+    times = executor.submitted
+    assert [times[f"{ORIGIN}/place{i}"] for i in range(3)] == [0.0, 0.5, 1.0]
+    # another origin has its own bucket and does not wait behind the first
+    assert times["https://other.example.com/place"] == 0.0
+
+
+def test_in_flight_jobs_are_capped():
+    clock = FakeClock()
+    target = Target()
+    target.release.clear()
+    executor, runner = scheduler(target, clock, workers=4, rate=4.0, max_in_flight=2)
+    with executor:
+        runner.add_places((None, f"{ORIGIN}/place{i}") for i in range(6))
+        threading.Timer(0.2, target.release.set).start()
+        stats = runner.run()
+    assert target.peak == 2
+    assert stats[PLACE] == {"done": 6, "failed": 0}
+
+
+def test_searches_and_places_take_turns():
+    clock = FakeClock()
+    target = Target(places_per_search=2)
+    executor, runner = scheduler(target, clock, rate=4.0, max_in_flight=1)
+    with executor:
+        runner.add_searches([f"{ORIGIN}/search{i}" for i in range(3)])
+        runner.run()
+    kinds = [kind for kind, _ in target.requests]
+    assert kinds[:5] == [SEARCH, PLACE, SEARCH, PLACE, SEARCH]
+    assert kinds.count(PLACE) == 6
+
+
+def test_failures_are_counted_per_kind():
+    clock = FakeClock()
+    target = Target()
+    executor, runner = scheduler(target, clock, rate=4.0)
+    with executor:
+        runner.add_places([(None, f"{ORIGIN}/ok"), (None, f"{ORIGIN}/fail")])
+        stats = runner.run()
+    assert stats == {
+        SEARCH: {"done": 0, "failed": 0},
+        PLACE: {"done": 1, "failed": 1},
+    }
+
+
+def search_nothing(search):
+    return []
+
+
+def place_or_die(search, link):
+    if link.endswith("crash"):
+        # a worker killed by the OOM killer, breaking the process pool
+        os._exit(1)
+    return link
+
+
+def process_scheduler(**kwargs):
+    make_executor = lambda: ProcessPoolExecutor(1)
+    executor = make_executor()
+    runner = Scheduler(
+        executor, search_nothing, place_or_die, rate=4.0, max_in_flight=1, **kwargs
+    )
+    runner.add_places((None, f"{ORIGIN}/{name}") for name in ["a", "crash", "b"])
+    return executor, make_executor, runner
+
+
+def test_broken_process_pool_is_replaced():
+    executor, make_executor, runner = process_scheduler()
+    runner.executor_factory = make_executor
+    with executor:
+        stats = runner.run()
+    assert stats[PLACE] == {"done": 2, "failed": 1}
+    assert runner.restarts == 1
+
+
+def test_broken_process_pool_stops_the_run_without_a_factory():
+    executor, _, runner = process_scheduler()
+    with executor:
+        stats = runner.run()
+    assert stats[PLACE] == {"done": 1, "failed": 1}
+    assert list(runner.queues[PLACE]) == [(None, f"{ORIGIN}/b")]
@@ -0,0 +1,75 @@
+"""
+Search scrolling and link collection over recorded search pages, without a browser
+"""
+import pytest
+from conftest import FIXTURES
+from gms import GMS
+from replay_driver import Recording, ReplayDriver
+from scroll_engine import FEED_WAIT_JS, ScrollEngine
+
+SEARCH = "https://www.google.com/maps/search/cafes+near+91101"
+STALLED_SEARCH = "https://www.google.com/maps/search/bakeries+near+91101"
+
+
+@pytest.fixture(scope="module")
+def recording():
+    return Recording.load(FIXTURES / "replay")
+
+
+class LateFeedDriver(ReplayDriver):
+    """Replays a search whose feed only renders after driver.get returns"""
+
+    rendered = False
+
+    def _source(self):
+        if not self.rendered:
+            return "<html><body></body></html>"
+        return super()._source()
+
+    def execute_async_script(self, script, *args):
+        if script == FEED_WAIT_JS:
+            self.rendered = True
+            self._render()
+        return super().execute_async_script(script, *args)
+
+
+def test_scrape_links_scrolls_to_end_of_list(recording):
+    driver = ReplayDriver(recording)
+    gms = GMS("cafes", block_resources=False)
+    links = gms._scrape_links(driver, SEARCH)
+    assert [link.split("/")[5] for link in links] == [
+        "Cafe+X",
+        "Bean+Bar",
+        "Lot+Coffee",
+        "Early+Bird",
+        "Tea+House",
+    ]
+    # the end of list marker stops scrolling as soon as it appears
+    assert driver.calls["execute_async_script"] == 1 + 2
+
+
+def test_run_stops_after_max_stalls(recording):
+    driver = ReplayDriver(recording)
+    driver.get(STALLED_SEARCH)
+    state, scrolls = ScrollEngine(max_stalls=3).run(driver)
+    assert state == {"feed": True, "count": 3, "eol": False}
+    # one scroll that loaded a row, then three that did not
+    assert scrolls == 4
+
+
+def test_run_waits_for_a_late_feed(recording):
+    driver = LateFeedDriver(recording)
+    driver.get(SEARCH)
+    assert not ScrollEngine().state(driver)["feed"]
+    state, scrolls = ScrollEngine().run(driver)
+    assert state == {"feed": True, "count": 5, "eol": True}
+    assert scrolls == 2
+
+
+def test_run_without_a_feed_does_not_scroll(recording):
+    driver = ReplayDriver(recording)
+    driver.get("https://www.google.com/maps/search/nothing")
+    state, scrolls = ScrollEngine().run(driver)
+    assert state == {"feed": False, "count": 0, "eol": False}
+    assert scrolls == 0
+    assert driver.calls["execute_async_script"] == 1
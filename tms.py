@@ -3,16 +3,13 @@ Trufl Map Scraper for Google Maps
 """
 import time
 from multiprocessing import Pool, cpu_count
-from collections import defaultdict
 from datetime import datetime
 import logging
 import os
+from pathlib import Path
 import random
 import pandas as pd
 import numpy as np
-from timezonefinder import TimezoneFinder
-import pytz
-from selenium import webdriver
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
@@ -21,14 +18,30 @@ from selenium.common.exceptions import (
     NoSuchElementException,
     TimeoutException,
 )
-from sqlalchemy import create_engine
 from sqlalchemy.engine import URL
-from webdriver_manager.chrome import ChromeDriverManager
-from geopy.geocoders import Nominatim
+from driver_pool import process_pool
+from launch_config import launch_config
+from geo_point import find_point
+from place_parser import (
+    parse_open_hours,
+    attributes_frame,
+    parse_place,
+    parse_snapshot,
+    snapshot_script,
+)
+from scroll_engine import ScrollEngine
+from resource_policy import resource_policy
+from sql_sink import cached_engine, process_sink
+from parquet_sink import process_parquet_sink
+from known_links import known_links
+from geocode_cache import geocode_cache, geolocator, offline_resolver
+from lang_cache import lang_cache
+from enrichment import clear_current_hour, enrich_places
+from busy_times import UNKNOWN_BUSY, busy_array, encode_busy, parse_busy_labels
+from seen_links import reset_seen_links, seen_links
+from search_planner import place_search_urls
 from geopy import Point
 from faker import Faker
-import langid
-import translators as ts
 
 logging.basicConfig(
     format="%(asctime)s | %(levelname)s: %(message)s",
@@ -38,6 +51,79 @@ logging.basicConfig(
 logger = logging.getLogger("tms")
 os.environ["WDM_LOG_LEVEL"] = "0"
 
+LOCATION_FIELDS = ["display_name", "city", "country", "state", "postcode"]
+
+COLUMNS_ORDER = [
+    "lat",
+    "long",
+    "link",
+    "rating",
+    "num_reviews",
+    "booking",
+    "category",
+    "address",
+    "number",
+    "website",
+    "display_name",
+    "city",
+    "country",
+    "state",
+    "postcode",
+    "week_num",
+    "Sunday",
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Description",
+    "Accessibility",
+    "Activities",
+    "Amenities",
+    "Atmosphere",
+    "Crowd",
+    "Dining options",
+    "Highlights",
+    "Offerings",
+    "Offerings: languages spoken",
+    "Payments",
+    "Planning",
+    "Popular for",
+    "Service options",
+    "title",
+    "search",
+    "Sunday_hours",
+    "Monday_hours",
+    "Tuesday_hours",
+    "Wednesday_hours",
+    "Thursday_hours",
+    "Friday_hours",
+    "Saturday_hours",
+    "open_status",
+    "search_term",
+]
+# busy_times="array" stores one fixed-width busy column instead of a text column per
+# day. Existing tables only have the day columns, so it is opt-in for tables that
+# have a busy column (ALTER TABLE <table> ADD busy VARCHAR(224)).
+_SUNDAY = COLUMNS_ORDER.index("Sunday")
+ARRAY_COLUMNS_ORDER = COLUMNS_ORDER[:_SUNDAY] + ["busy"] + COLUMNS_ORDER[_SUNDAY + 7 :]
+
+
+def prepare_places(df):
+    """Sink transform: translate the location fields of the whole batch at once,
+    then fill the time dependent fields. A failing step leaves the batch as it
+    was, except that the current-hour placeholder is never stored."""
+    try:
+        df = lang_cache().localize_frame(df, LOCATION_FIELDS)
+    except Exception as exc:
+        logging.warning("Batch localization failed, keeping original text: %s", exc)
+    try:
+        return enrich_places(df)
+    except Exception as exc:
+        logging.warning("Batch enrichment failed: %s", exc)
+        return clear_current_hour(df.copy())
+
 
 """Class Implementation for TMS with modules for scraping service """
 
@@ -50,52 +136,77 @@ class TMS:
         search_scope,
         num_bots=cpu_count(),
         headless=True,
+        drivers_per_profile=1,
+        extraction="script",
+        busy_times="text",
+        block_resources=True,
+        database_url=None,
+        sink_buffer=200,
+        sink_flush_interval=30.0,
+        known_links_path=None,
+        parquet_path=None,
+        driver_idle_timeout=None,
     ):
         """Create the headless information and initialize states data from csv"""
         self.headless = headless
+        self.drivers_per_profile = drivers_per_profile
+        self.extraction = extraction
+        self.block_resources = block_resources
+        self.scroller = ScrollEngine()
+        self.database_url = database_url
+        self.sink_buffer = sink_buffer
+        self.sink_flush_interval = sink_flush_interval
+        self.parquet_path = parquet_path
+        self.driver_idle_timeout = driver_idle_timeout
+        self.known_links_path = (
+            Path.cwd() / "db" / f"{database_table}_links.tsv"
+            if known_links_path is None
+            else known_links_path
+        )
         self.search_term = search_term
         self.database_table = database_table
         search_scopes = ["world", "us"]
         self.search_scope = search_scope
         if self.search_scope not in search_scopes:
             raise ValueError("Search term must be one of 'world', 'us'")
+        if busy_times not in ("array", "text"):
+            raise ValueError("Busy times must be one of 'array', 'text'")
+        self.busy_times = busy_times
         self.num_bots = num_bots
         self.fake = Faker()
 
     def get_driver(self, images=True):
         """Get the driver with parameters"""
-        options = webdriver.ChromeOptions()
-        if self.headless:
-            options.add_argument("--headless")
-        options.add_argument("--start-maximized")
-        # options.add_argument("--no-sandbox")
-        options.add_argument("--disable-gpu")
-        # options.add_argument("--no-default-browser-check")
-        # options.add_argument("--disable-extensions")
-        # options.add_argument("--disable-default-apps")
-        # added extra chrome options
-        # options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("disable-infobars")
-
-        if not images:
-            prefs = {
-                "profile.default_content_settings.popups": 0,
-                "profile.default_content_setting_values": {"images": 2},
-                "profile.managed_default_content_setting_values": {"images": 2},
-            }
-            options.add_experimental_option("prefs", prefs)
-
-        options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        options.add_experimental_option("useAutomationExtension", False)
-        driver = webdriver.Chrome(ChromeDriverManager().install(), options=options)
-
-        driver.implicitly_wait(3)
-        return driver
+        return launch_config().launch(
+            images=images, headless=self.headless, network_log=self.block_resources
+        )
+
+    def block(self, driver, profile):
+        """Switch the driver to a resource blocking profile before loading a page"""
+        if self.block_resources:
+            resource_policy().apply(driver, profile)
+
+    def report_resources(self, driver, page):
+        """Log requests and bytes loaded and saved on the page just scraped"""
+        if self.block_resources:
+            resource_policy().report(driver, page)
 
     def tear_down(self, driver):
         """Exit the browser and end the session"""
         driver.quit()
 
+    def driver_pool(self):
+        """Per-process pool of reusable drivers shared by every task in this worker"""
+        return process_pool(
+            self.get_driver,
+            size=self.drivers_per_profile,
+            idle_timeout=self.driver_idle_timeout,
+        )
+
+    def warm_drivers(self, images=None):
+        """Pool initializer that starts this worker's drivers before tasks arrive"""
+        self.driver_pool().warm(images=images)
+
     def connect_db(self, database="trufl-data-dev", fast_execute=True):
         """Method for connecting to Azure Hosted Database"""
         cnxn_str = (
@@ -107,54 +218,16 @@ class TMS:
         )
         connection_url = URL.create("mssql+pyodbc", query={"odbc_connect": cnxn_str})
 
-        if not fast_execute:
-            engine = create_engine(connection_url, fast_executemany=False)
-        else:
-            engine = create_engine(connection_url, fast_executemany=True)
-        return engine
+        if self.database_url is not None:
+            connection_url = self.database_url
+        return cached_engine(connection_url, fast_executemany=fast_execute)
 
-    # double check this process in the future, talk with Joseph afterwards
     def extract_point(self, page_source):
         """Extracts latitude and longitude from Google source html code on a location page"""
-        idx = page_source.find("https://www.google.com/maps/place/")
-        test = page_source[idx:]
-        lat = test.split("!3d")
-        lat = lat[1].split("!4d")
-        long = lat[1].split("!16")[0]
-        if len(long) > 20:
-            long = lat[1].split("\\u00")[0]
-        lat = lat[0]
-        try:
-            lat = float(lat)
-            long = float(long)
-        except Exception as exc:
-            logging.warning("lat float conversion failed, descend to step 2: %s", exc)
-            long = long[:12]
-            long = long.replace("!", "")
-            long = long.replace(r"\\", "")
-        if lat is None or lat == "":
-            lat = "need lat"
-        if long is None or long == "":
-            long = "need long"
-        return (lat, long)
-
-    def scroll_results(self, driver):
-        """Find all locations in search page, scroll to last listing"""
-        try:
-            results = driver.find_elements(
-                By.XPATH, '//div[contains(@aria-label, "Results for")]/div/div[./a]'
-            )
-            option = results[-1]
-
-            clickable = EC.element_to_be_clickable(option)
-            presence = EC.presence_of_element_located(option)
-
-            if clickable and presence:
-                driver.execute_script("arguments[0].scrollIntoView(true);", option)
-                time.sleep(2)
-            return results
-        except Exception as exc:
-            logging.warning("Scroll results exception: %s", exc)
+        point = find_point(page_source)
+        if point is None:
+            raise ValueError("No !3d/!4d coordinates found in page source")
+        return point
 
     def extract_times(self, driver):
         """Find all locations in search page, scroll to last listing"""
@@ -205,114 +278,33 @@ class TMS:
             )
             open_hours = divs.get_attribute("aria-label")
 
-            open_hours = " ".join(open_hours.replace(".", "").split()[:-6])
-            hours_dict = dict(hours.split(", ", 1) for hours in open_hours.split("; "))
-
-            for i in list(hours_dict.keys()):
-                hours_dict[i] = [hours_dict[i]]
-
-            hours_df = pd.DataFrame(hours_dict)
-
-            hours_df.columns = [day.split()[0] for day in list(hours_df.columns)]
-            dow = [
-                "Sunday",
-                "Monday",
-                "Tuesday",
-                "Wednesday",
-                "Thursday",
-                "Friday",
-                "Saturday",
-            ]
-            hours_df = hours_df[dow]
-            hours = [x + "_hours" for x in dow]
-            dow_hours = dict(zip(dow, hours))
-            hours_df.rename(columns=dow_hours, inplace=True)
-            return hours_df
+            return parse_open_hours(open_hours)
 
     def extract_busy_times(self, driver, link):
-        """Scrape busy time today from a Google Place"""
+        """Scrape busy time today from a Google Place.
+
+        With busy_times="array" the bars become one encode_busy column (a 7x24
+        uint8 array), otherwise a text column per day. The current hour and week
+        number depend on the place's timezone, they are filled in by
+        enrich_places when the row is flushed, not in the browser worker.
+        """
         # checkmark
         time.sleep(1)
         busy = driver.find_elements(By.XPATH, '//div[contains(@aria-label, "busy")]')
         times = []
         for x in busy:
             times.append(x.get_attribute("aria-label"))
-        point = self.extract_point(driver.page_source)
-        tf = TimezoneFinder()
-        lat = float(point[0])
-        long = float(point[1])
-        tz = tf.timezone_at(lng=long, lat=lat)
-        timezone = pytz.timezone(tz)
-        now = datetime.now(timezone)
-        this_week = datetime.today().isocalendar()[1]
-        hour = now.strftime("%#I %p")
-        hour = hour.replace(" ", "") + "."
-        hours = []
-        tod = []
-        for x in times:
-            idx = x.find("at")
-            if idx == -1:
-                idx2 = x.find("usually")
-                x = x.replace("usually", "")
-                t1 = x[idx2:]
-                t2 = x[:idx2]
-                t2 = t2.replace("Currently ", "")
-                final = t2 + t1
-                final = final.replace(" busy", "")
-                final = final.replace(", ", ":")
-                final = final.replace(".", "")
-                final = final.replace(" ", "")
-                hour = hour.replace(".", "")
-                hours.append(hour)
-                tod.append(final)
-            else:
-                busy = x[:idx]
-                busy = busy.replace("busy", "")
-                busy = busy.strip()
-                if busy == "%":
-                    busy = None
-                t = x[idx:]
-                t = t.replace("at", "")
-                t = t.replace(" ", "")
-                t = t.replace(".", "")
-                if t == "":
-                    t = "closed"
-                hours.append(t)
-                tod.append(busy)
-        indexes = []
-        for idx, x in enumerate(hours):
-            if x == "closed":
-                indexes.append(idx)
-            i = x.find("6AM")
-            if i != -1:
-                indexes.append(idx)
-        dow = [
-            "Sunday",
-            "Monday",
-            "Tuesday",
-            "Wednesday",
-            "Thursday",
-            "Friday",
-            "Saturday",
-        ]
-        data = defaultdict(list)
-        for num, day in enumerate(dow):
-            if indexes[num] == indexes[-1]:
-                h = hours[indexes[num - 1] : indexes[num]]
-                busy_times = tod[indexes[num - 1] : indexes[num]]
-                for i, x in enumerate(h):
-                    data[day].append({h[i]: busy_times[i]})
-            else:
-                h = hours[indexes[num] : indexes[num + 1]]
-                busy_times = tod[indexes[num] : indexes[num + 1]]
-                for i, x in enumerate(h):
-                    data[day].append({h[i]: busy_times[i]})
-        data.default_factory = None
-        new = dict(data)
-        df = pd.DataFrame(columns=new.keys(), data=[new.values()])
-        df["link"] = link
-        col = df.pop("link")
-        df.insert(0, col.name, col)
+        this_week = None
+        if self.busy_times == "array":
+            df = pd.DataFrame(
+                {"link": [link], "busy": [encode_busy(busy_array(times))]}
+            )
+        else:
+            new = parse_busy_labels(times)
+            df = pd.DataFrame(columns=new.keys(), data=[new.values()])
+            df["link"] = link
+            col = df.pop("link")
+            df.insert(0, col.name, col)
         df["week_num"] = this_week
         col = df.pop("week_num")
         df.insert(0, col.name, col)
@@ -321,12 +313,19 @@ class TMS:
         return df
 
     def reverse_geocode(self, lat, long):
-        """Async Method to reverse geocode locations"""
-        with Nominatim(
-            user_agent=self.fake.name(),
-            # adapter_factory=AioHTTPAdapter,
-        ) as geolocator:
-            location = geolocator.reverse(Point(lat, long))
+        """Reverse geocode from the cache, the offline zip resolver, then Nominatim"""
+        cache = geocode_cache()
+        raw = cache.get(lat, long)
+        if raw is not None:
+            return raw
+        if self.search_scope == "us":
+            resolver = offline_resolver()
+            raw = resolver.resolve(lat, long) if resolver is not None else None
+            if raw is not None:
+                cache.put(lat, long, raw, source="zipcode")
+                return raw
+        location = geolocator(self.fake.name()).reverse(Point(lat, long))
+        cache.put(lat, long, location.raw)
         return location.raw
 
     def get_attributes(self, driver):
@@ -337,45 +336,22 @@ class TMS:
         ).click()
         time.sleep(0.5)
 
-        headers = []
-        list_attr = []
-
-        headers.append("Description")
         try:
             desc = driver.find_element(By.XPATH, '//span[@class = "HlvSq"]').text
-            list_attr.append(desc)
         except:
-            list_attr.append(None)
+            desc = None
 
+        regions = []
         eles = driver.find_elements(By.XPATH, '//div[contains(@role, "region")]')
         for x in eles:
-            attr = []
-            if "Available search" in x.get_attribute("aria-label"):
-                continue
-            headers.append(x.get_attribute("aria-label"))
             sub_eles = x.find_elements(By.XPATH, ".//span")
-            for s in sub_eles:
-                attr.append(s.get_attribute("aria-label"))
-            list_attr.append([attr])
-
-        attr_dict = dict(zip(headers, list_attr))
-        attr_cols = [
-            "Description",
-            "Accessibility",
-            "Activities",
-            "Amenities",
-            "Atmosphere",
-            "Crowd",
-            "Dining options",
-            "Highlights",
-            "Offerings",
-            "Offerings: languages spoken",
-            "Payments",
-            "Planning",
-            "Popular for",
-            "Service options",
-        ]
-        attr_df = pd.DataFrame(attr_dict, columns=attr_cols)
+            regions.append(
+                (
+                    x.get_attribute("aria-label"),
+                    [s.get_attribute("aria-label") for s in sub_eles],
+                )
+            )
+        attr_df = attributes_frame(desc, regions)
 
         driver.find_element(
             By.XPATH, '//button[contains(@jsaction, "pane.header.back")]'
@@ -384,51 +360,88 @@ class TMS:
         return attr_df
 
     def loc_basic_info(self, loc_data, tmp, assign, info):
-        """Retrieving location basic information"""
-        if langid.classify(loc_data["address"][info])[0] != "en":
-            tmp[assign] = ts.google(loc_data["address"][info])
-        else:
-            tmp[assign] = loc_data["address"][info]
+        """Retrieving location basic information, translated per sink batch"""
+        tmp[assign] = loc_data["address"][info]
+
+    def snapshot_place(self, driver, timeout=3):
+        """Place fields, coordinates and attributes from one in-page script call"""
+        driver.set_script_timeout(timeout + 5)
+        snapshot = driver.execute_async_script(snapshot_script(), int(timeout * 1000))
+        place, point, attr_df = parse_snapshot(snapshot)
+        if place["title"] is None:
+            logging.info("Script snapshot found no title, parsing page_source")
+            place, page_source = self.parse_place_source(driver, driver.page_source)
+            point = point or find_point(page_source)
+        return place, point, attr_df
+
+    def parse_place_source(self, driver, page_source):
+        """Parse place fields from page_source, re-snapshotting once if not yet rendered"""
+        place = parse_place(page_source)
+        if place["title"] is None:
+            try:
+                WebDriverWait(driver, 5).until(
+                    EC.presence_of_element_located(
+                        (By.XPATH, '//h1[@class = "DUwDvf fontHeadlineLarge"]')
+                    )
+                )
+                page_source = driver.page_source
+                place = parse_place(page_source)
+            except TimeoutException as exc:
+                logging.info("Place pane not rendered: %s", exc)
+        return place, page_source
+
+    def extract_booking(self, driver, link):
+        """Open the reservation pane and collect the booking providers"""
+        try:
+            driver.find_element(
+                By.XPATH, '//div[contains(@class, "m6QErb tLjsW UhIuC")]'
+            ).click()
+            book = []
+            bookings = WebDriverWait(driver, 5).until(
+                EC.presence_of_all_elements_located(
+                    (By.XPATH, '//div[@class = "NGLLDf"]')
+                )
+            )
+            for b in bookings:
+                book.append(b.text)
+            driver.find_element(
+                By.XPATH, '//button[contains(@aria-label, "Back")]'
+            ).click()
+            return book
+        except Exception as exc:
+            logging.warning(f"Failed to extract booking: URL: {link} Exception{exc}")
+            return None
 
     def extract_restaurant_data(self, driver, link):
         """Main method for extracting individual location information"""
+        self.block(driver, "details")
         driver.get(link)
         time.sleep(np.random.random(1)[0])
-        page_source = driver.page_source
+        if self.extraction == "script":
+            place, point, attr_df = self.snapshot_place(driver)
+        else:
+            place, page_source = self.parse_place_source(driver, driver.page_source)
+            point, attr_df = find_point(page_source), None
 
         # find coordinates
-        try:
-            lat, long = self.extract_point(page_source)
-        except Exception as exc:
-            driver.refresh()
-            logging.warning("Extract Point Exception: %s", exc)
-        try:
-            lat, long = self.extract_point(page_source)
-        except Exception as exc:
-            logging.warning("Input String as lat Convert Point Exception: %s", exc)
+        if point is None:
+            logging.warning("Extract Point Exception: no coordinates in %s", link)
             lat = "needs lat"
             long = "needs long"
+        else:
+            lat, long = point
         tmp = {}
         tmp["lat"] = lat
         tmp["long"] = long
         tmp["link"] = link
-        tmp["title"] = None
-        tmp["rating"] = None
-        tmp["num_reviews"] = None
+        tmp["title"] = place["title"]
+        tmp["rating"] = place["rating"]
+        tmp["num_reviews"] = place["num_reviews"]
         tmp["booking"] = None
-        tmp["category"] = None
-        tmp["address"] = None
-        tmp["number"] = None
-        tmp["website"] = None
-
-        # find title
-        try:
-            title = driver.find_element(
-                By.XPATH, '//h1[@class = "DUwDvf fontHeadlineLarge"]'
-            ).text
-            tmp["title"] = title
-        except:
-            tmp["title"] = None
+        tmp["category"] = place["category"]
+        tmp["address"] = place["address"]
+        tmp["number"] = place["number"]
+        tmp["website"] = place["website"]
 
         try:
             loc_data = self.reverse_geocode(lat, long)
@@ -437,10 +450,7 @@ class TMS:
 
         # Display Name Parse
         try:
-            if langid.classify(loc_data["display_name"])[0] != "en":
-                tmp["display_name"] = ts.google(loc_data["display_name"])
-            else:
-                tmp["display_name"] = loc_data["display_name"]
+            tmp["display_name"] = loc_data["display_name"]
         except:
             tmp["display_name"] = None
 
@@ -475,103 +485,9 @@ class TMS:
         except:
             tmp["postcode"] = None
 
-        # find category
-        try:
-            category = WebDriverWait(driver, 5).until(
-                EC.visibility_of_element_located(
-                    (By.XPATH, '//button[contains(@jsaction, "pane.rating.category")]')
-                )
-            )
-            cat_text = category.text
-            tmp.update({"category": cat_text})
-        except Exception as exc:
-            logging.info("Catgeory Extract and Dict Update Exception: %s", exc)
-
-        # find address
-        try:
-            address = driver.find_element(By.CSS_SELECTOR, "[data-item-id='address']")
-            address = address.get_attribute("aria-label")
-            address = address.split(" ", 1)[1]
-            tmp.update({"address": address})
-        except Exception as exc:
-            logging.info("Address Extract error: %s", exc)
-
-        # find phone number
-        try:
-            phone_number = driver.find_element(
-                By.CSS_SELECTOR, "[data-tooltip='Copy phone number']"
-            )
-            phone_number = phone_number.get_attribute("data-item-id")
-            phone_number = phone_number.split("+", 1)[1]
-            tmp.update({"number": phone_number})
-        except:
-            pass
-
-        # find website
-        try:
-            website = driver.find_element(By.CSS_SELECTOR, "[data-item-id='authority']")
-            website = website.get_attribute("aria-label")
-            website = website.split()[1]
-            tmp.update({"website": website})
-        except Exception as exc:
-            logging.info("Website Extract Error: %s", exc)
-
-        # find booking company
-        try:
-            reserve = driver.find_element(
-                By.XPATH, '//div[contains(@class, "m6QErb tLjsW UhIuC")]'
-            )
-            if reserve.text == "RESERVE A TABLE":
-                try:
-                    reserve.click()
-                    # time.sleep(0.5)
-                    book = []
-                    bookings = WebDriverWait(driver, 5).until(
-                        EC.presence_of_all_elements_located(
-                            (By.XPATH, '//div[@class = "NGLLDf"]')
-                        )
-                    )
-                    for b in bookings:
-                        book.append(b.text)
-                    tmp.update({"booking": book})
-                    driver.find_element(
-                        By.XPATH, '//button[contains(@aria-label, "Back")]'
-                    ).click()
-                    # time.sleep(0.5)
-                except Exception as exc:
-                    logging.warning(
-                        f"Failed to extract booking: URL: {link} Exception{exc}"
-                    )
-        except:
-            pass
-
-        # find rating and number of reviews
-        try:
-            ratings_and_num_reviews = (
-                WebDriverWait(driver, 5)
-                .until(
-                    EC.presence_of_element_located(
-                        (
-                            By.XPATH,
-                            "//div[contains(@jsaction, 'pane.rating.moreReviews')]",
-                        )
-                    )
-                )
-                .text
-            )
-            ratings_and_num_reviews = ratings_and_num_reviews.split("\n")
-        except:
-            pass
-        try:
-            rating = ratings_and_num_reviews[0]
-            tmp.update({"rating": rating})
-        except:
-            pass
-        try:
-            num_reviews = ratings_and_num_reviews[1].split(" ")[0]
-            tmp.update({"num_reviews": num_reviews})
-        except:
-            pass
+        # find booking company, the only detail field that needs the live page
+        if place["reservable"]:
+            tmp.update({"booking": self.extract_booking(driver, link)})
 
         d = pd.DataFrame([tmp])
 
@@ -583,10 +499,12 @@ class TMS:
         except Exception as exc:
             logging.warning("Busy time and hour failed: %s", exc)
 
-        # find attributes
+        # find attributes, already in the snapshot when extraction is "script"
         try:
-            attr_df = self.get_attributes(driver)
-            attr_df = attr_df.astype(str)
+            if self.extraction != "script":
+                attr_df = self.get_attributes(driver)
+            if attr_df is None:
+                raise NoSuchElementException("No attributes pane")
             d = pd.concat([d, attr_df], axis=1)
         except Exception as exc:
             logging.warning("Attributes not found: %s", exc)
@@ -606,6 +524,7 @@ class TMS:
 
         if "week_num" not in d.columns:
             d["week_num"] = None
+            d["busy"] = UNKNOWN_BUSY
             d["Sunday"] = None
             d["Monday"] = None
             d["Tuesday"] = None
@@ -623,132 +542,99 @@ class TMS:
             d["Sunday_hours"] = None
 
         d["search_term"] = self.search_term
-        d = d.astype(str)
+        self.report_resources(driver, link)
         return d
 
     def check_eol(self, driver):
         """Check End of Results"""
-        get_source = driver.page_source
-        search_text = "You've reached the end of the list"
-        return search_text in get_source
+        return self.scroller.state(driver)["eol"]
 
     def scrape_links(self, search):
         """Collect urls from search page"""
         search = search.replace("'", "''")
-        driver = self.get_driver(images=True)
+        with self.driver_pool().borrow(images=True) as driver:
+            return self._scrape_links(driver, search)
+
+    def _scrape_links(self, driver, search):
+        """Scroll a search page to the end of its results and collect the place urls"""
+        self.block(driver, "links-only")
         driver.get(search)
-        eol = self.check_eol(driver)
-        count = 0
-        while not eol:
-            count += 1
-            try:
-                search_results_len = len(self.scroll_results(driver))
-            except:
-                search_results_len = 0
-            eol = self.check_eol(driver)
-            new_results_len = len(
-                driver.find_elements(
-                    By.XPATH, '//div[contains(@aria-label, "Results for")]/div/div[./a]'
-                )
-            )
-            if new_results_len == search_results_len:
-                time.sleep(2)
-                driver.find_elements(
-                    By.XPATH,
-                    '//div[contains(@aria-label, "Results for")]/div/div[./a]',
-                )[np.random.randint(new_results_len)].click()
-                time.sleep(1)
-            if count >= 300:
-                break
-        results = driver.find_elements(
-            By.XPATH, '//div[contains(@aria-label, "Results for")]/div/div[./a]'
-        )
-        total_list = []
-        for x in results:
-            e = x.find_element(By.XPATH, ".//*")
-            url = e.get_attribute("href")
-            total_list.append(url)
-        return total_list
-
-    def get_current_links(self, search: str) -> list:
-        list_of_links = pd.read_sql(
-            f"SELECT DISTINCT LINK from {self.database_table} where search = '{search}'",
-            self.connect_db(),
+        self.scroller.run(driver)
+        links = self.scroller.links(driver)
+        self.report_resources(driver, search)
+        return links
+
+    def known_links(self):
+        """Index of stored links per search, loaded once per run"""
+        return known_links(
+            self.connect_db(), self.database_table, cache_path=self.known_links_path
         )
-        return list_of_links["LINK"].values.tolist()
+
+    def seen_links(self):
+        """Links already queued by any search in this run, shared across workers"""
+        return seen_links(Path.cwd() / "db" / f"{self.database_table}_seen.sqlite")
+
+    def reset_seen_links(self):
+        """Start a run with nothing seen. Stored links are filtered by known_links,
+        so links whose scrape or insert failed in an earlier run are queued again"""
+        reset_seen_links(Path.cwd() / "db" / f"{self.database_table}_seen.sqlite")
 
     def get_web_results(self, search: str) -> list:
         new_list = self.scrape_links(search)
         print("New list: {}".format(len(new_list)))
-        old_list = self.get_current_links(search)
-        print("Old List: {}".format(len(old_list)))
-        new_links = list(set(new_list) - set(old_list))
+        new_links = self.known_links().new_links(search, new_list)
+        print("Old List: {}".format(len(new_list) - len(new_links)))
         logging.warning("Number Searches Remaining: %s", len(new_links))
         return new_links
 
     def add_table_data(self, search: str, link: str) -> None:
-        engine = self.connect_db()
-        driver = self.get_driver(images=True)
-        df = self.extract_restaurant_data(driver, link)
+        with self.driver_pool().borrow(images=True) as driver:
+            df = self.extract_restaurant_data(driver, link)
         df["search"] = search
-        columns_order = [
-            "lat",
-            "long",
-            "link",
-            "rating",
-            "num_reviews",
-            "booking",
-            "category",
-            "address",
-            "number",
-            "website",
-            "display_name",
-            "city",
-            "country",
-            "state",
-            "postcode",
-            "week_num",
-            "Sunday",
-            "Monday",
-            "Tuesday",
-            "Wednesday",
-            "Thursday",
-            "Friday",
-            "Saturday",
-            "Description",
-            "Accessibility",
-            "Activities",
-            "Amenities",
-            "Atmosphere",
-            "Crowd",
-            "Dining options",
-            "Highlights",
-            "Offerings",
-            "Offerings: languages spoken",
-            "Payments",
-            "Planning",
-            "Popular for",
-            "Service options",
-            "title",
-            "search",
-            "Sunday_hours",
-            "Monday_hours",
-            "Tuesday_hours",
-            "Wednesday_hours",
-            "Thursday_hours",
-            "Friday_hours",
-            "Saturday_hours",
-            "open_status",
-            "search_term",
-        ]
-        df = df[columns_order]
-        df = df.astype(str)
-        df["scraped_dt"] = datetime.now()
+        df = df[self.columns_order()].assign(scraped_dt=datetime.now())
+        rows = df.astype(str)
+        rows["scraped_dt"] = df["scraped_dt"]
+        # separate so a failing flush of one sink does not drop the other's row
         try:
-            df.to_sql(self.database_table, engine, if_exists="append", index=False)
-            logging.warning("Wrote to DB: %s", df)
+            self.table_sink().add(rows)
         except Exception as exc:
             logging.warning("Write to DB failed: %s", exc)
+        if self.parquet_path is not None:
+            try:
+                self.parquet_sink().add(df)
+            except Exception as exc:
+                logging.warning("Write to Parquet failed: %s", exc)
+
+    def columns_order(self):
+        """Stored columns, with the busy array in place of the day columns"""
+        if self.busy_times == "array":
+            return ARRAY_COLUMNS_ORDER
+        return COLUMNS_ORDER
+
+    def table_sink(self):
+        """Per-process buffered sink that bulk inserts rows into database_table"""
+        return process_sink(
+            self.connect_db(),
+            self.database_table,
+            columns=self.columns_order() + ["scraped_dt"],
+            max_buffer=self.sink_buffer,
+            flush_interval=self.sink_flush_interval,
+            transform=prepare_places,
+            on_flush=self.add_known_links,
+        )
+
+    def add_known_links(self, df):
+        """Mark the links of a committed batch as stored"""
+        for search, links in df.groupby("search")["link"]:
+            self.known_links().add(search, links.tolist(), rows=len(links))
+
+    def parquet_sink(self):
+        """Per-process sink writing typed rows as Parquet by search_term and date"""
+        return process_parquet_sink(
+            self.parquet_path,
+            columns=self.columns_order() + ["scraped_dt"],
+            transform=prepare_places,
+        )
 
     def update_table_master(self, search: str) -> None:
         new_links = self.get_web_results(search)
@@ -765,32 +651,20 @@ class TMS:
         cities_df = pd.read_csv(
             "https://raw.githubusercontent.com/joseph-davis-trufl/files/main/uscities.csv"
         )
-        searches = []
-        for city, state in cities_df[["city", "state_name"]].values:
-            city = city.replace(" ", "+")
-            state = state.replace(" ", "+")
-            search = (
-                f"https://www.google.com/maps/search/{city}+{state}+{self.search_term}"
-            )
-            search = search.replace(" ", "+")
-            searches.append(search)
-        search_list = np.unique(searches)
+        search_list = place_search_urls(
+            cities_df[["city", "state_name"]].values, self.search_term
+        )
         random.shuffle(search_list)
         return search_list
 
     def world_loop_searches(self):
-        """Method for creating google url search strings from cities and states"""
+        """Method for creating google url search strings from cities and countries"""
         world_df = pd.read_csv(
             "https://raw.githubusercontent.com/joseph-davis-trufl/files/main/worldcities.csv"
         )
-        searches = []
-        for city, country in world_df[["city", "country"]].values:
-            city = city.replace(" ", "+")
-            country = country.replace(" ", "+")
-            search = f"https://www.google.com/maps/search/{city}+{country}+{self.search_term}"
-            search = search.replace(" ", "+")
-            searches.append(search)
-        search_list = np.unique(searches)
+        search_list = place_search_urls(
+            world_df[["city", "country"]].values, self.search_term
+        )
         random.shuffle(search_list)
         return search_list
 
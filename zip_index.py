@@ -0,0 +1,112 @@
+"""
+Spatial index over uszipcode centroids
+"""
+import sqlite3
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_MILES = 3958.8
+ZIP_COLUMNS = ["zipcode", "major_city", "post_office_city", "county", "state"]
+
+
+def to_xyz(lat, lng):
+    """Unit sphere coordinates so euclidean KD-tree distances follow great circles"""
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lng = np.radians(np.asarray(lng, dtype=float))
+    return np.column_stack(
+        (np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat))
+    )
+
+
+def miles_to_chord(miles):
+    """Straight line distance on the unit sphere for a great circle distance in miles"""
+    return 2 * np.sin(np.asarray(miles, dtype=float) / (2 * EARTH_RADIUS_MILES))
+
+
+def chord_to_miles(chord):
+    """Great circle miles for a unit sphere chord length"""
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+
+class ZipIndex:
+    """KD-tree over zip code centroid lat/lng from the uszipcode simple_zipcode table"""
+
+    def __init__(self, db_file_path=None):
+        self.db_file_path = Path(db_file_path or Path.cwd() / "db" / "simple_db.sqlite")
+        con = sqlite3.connect(self.db_file_path)
+        try:
+            self.zips = pd.read_sql_query(
+                f"SELECT {', '.join(ZIP_COLUMNS)}, lat, lng FROM simple_zipcode "
+                "WHERE lat IS NOT NULL AND lng IS NOT NULL",
+                con,
+            )
+        finally:
+            con.close()
+        self.tree = cKDTree(to_xyz(self.zips.lat.values, self.zips.lng.values))
+
+    def nearest(self, lat, lng, max_miles=None):
+        """Closest zip centroid as a dict with distance_miles, or None past max_miles"""
+        bound = np.inf if max_miles is None else miles_to_chord(max_miles)
+        chord, idx = self.tree.query(to_xyz(lat, lng)[0], distance_upper_bound=bound)
+        if not np.isfinite(chord):
+            return None
+        row = self.zips.iloc[idx].to_dict()
+        row["distance_miles"] = float(chord_to_miles(chord))
+        return row
+
+    def within_radius(self, lat, lng, miles):
+        """Zip rows whose centroid is within miles of the point, nearest first"""
+        center = to_xyz(lat, lng)[0]
+        idx = self.tree.query_ball_point(center, miles_to_chord(miles))
+        rows = self.zips.iloc[idx].copy()
+        rows["distance_miles"] = chord_to_miles(
+            np.linalg.norm(self.tree.data[idx] - center, axis=1)
+        )
+        return rows.sort_values("distance_miles")
+
+    def within_polygon(self, polygon):
+        """Zip rows whose centroid lies inside a [(lat, lng), ...] polygon.
+
+        Candidates come from a ball query around the polygon's bounding circle,
+        then an even-odd ray casting test runs over just those centroids.
+        """
+        polygon = np.asarray(polygon, dtype=float)
+        center = polygon.mean(axis=0)
+        radius = chord_to_miles(
+            np.linalg.norm(
+                to_xyz(polygon[:, 0], polygon[:, 1]) - to_xyz(*center), axis=1
+            )
+        ).max()
+        candidates = self.within_radius(center[0], center[1], radius + 1)
+        inside = points_in_polygon(
+            candidates.lat.values, candidates.lng.values, polygon
+        )
+        return candidates[inside]
+
+
+def points_in_polygon(lat, lng, polygon):
+    """Vectorized even-odd rule for points against a lat/lng polygon"""
+    lat = np.asarray(lat, dtype=float)
+    lng = np.asarray(lng, dtype=float)
+    inside = np.zeros(len(lat), dtype=bool)
+    y1, x1 = polygon[-1]
+    for y2, x2 in polygon:
+        crosses = (y1 > lat) != (y2 > lat)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_at = x1 + (lat - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= crosses & (lng < x_at)
+        y1, x1 = y2, x2
+    return inside
+
+
+_zip_index = None
+
+
+def zip_index(db_file_path=None):
+    """ZipIndex built once per process"""
+    global _zip_index
+    if _zip_index is None:
+        _zip_index = ZipIndex(db_file_path)
+    return _zip_index
@@ -0,0 +1,50 @@
+"""
+Indexed zip code lookups against the uszipcode simple_zipcode table
+"""
+import os
+import sqlite3
+from functools import lru_cache
+
+CITY_STATE_INDEX = (
+    "CREATE INDEX IF NOT EXISTS simple_zipcode_state_city "
+    "ON simple_zipcode (state, post_office_city)"
+)
+
+_connections = {}
+
+
+def zip_connection(db_file_path):
+    """Connection to the zip DB opened on first use, one per process and path"""
+    key = (os.getpid(), str(db_file_path))
+    con = _connections.get(key)
+    if con is None:
+        con = sqlite3.connect(db_file_path, check_same_thread=False)
+        with con:
+            con.execute(CITY_STATE_INDEX)
+        _connections[key] = con
+    return con
+
+
+@lru_cache(maxsize=4096)
+def find_zipcodes(db_file_path, city, state, match="exact"):
+    """Sorted zip codes whose post_office_city equals (or starts with) city in state.
+
+    Prefix matching is a range scan on the (state, post_office_city) index, so
+    neither mode reads the whole table. Results are cached per (city, state).
+    """
+    con = zip_connection(db_file_path)
+    if match == "exact":
+        rows = con.execute(
+            "SELECT zipcode FROM simple_zipcode "
+            "WHERE state = ? AND post_office_city = ? ORDER BY zipcode",
+            (state, city),
+        )
+    elif match == "prefix":
+        rows = con.execute(
+            "SELECT zipcode FROM simple_zipcode WHERE state = ? "
+            "AND post_office_city >= ? AND post_office_city < ? ORDER BY zipcode",
+            (state, city, city + "\uffff"),
+        )
+    else:
+        raise ValueError("match must be one of 'exact', 'prefix'")
+    return tuple(row[0] for row in rows)